@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""Wall time of the Python and apt_pkg.TagFile Metadata parsers.
+
+Usage: python3 -m benchmarks.bench_backends [--size-mb 100] [--repeat 3] [FILE]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic import write_packages
+from predose.predose import Metadata, has_tagfile
+
+
+def _best_time(path: str, parser: str, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        meta = Metadata.from_file(path, parser=parser)
+        best = min(best, time.perf_counter() - start)
+    print(f'{parser:>7}: {len(meta.packages)} packages, best of {repeat}: {best:.2f} s')
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark predose metadata parsers')
+    parser.add_argument('--size-mb', type=int, default=100, help='synthetic Packages size (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per parser (default: %(default)s)')
+    parser.add_argument('path', nargs='?', help='existing Packages/Sources file to parse')
+    args = parser.parse_args()
+
+    path = args.path or os.path.join(tempfile.mkdtemp(), 'synthetic_Packages')
+    if not args.path:
+        count = write_packages(path, args.size_mb)
+        print(f'Generated {count} stanzas, {os.path.getsize(path) / 2**20:.0f} MB: {path}')
+    try:
+        python_time = _best_time(path, 'python', args.repeat)
+        if has_tagfile():
+            apt_time = _best_time(path, 'apt', args.repeat)
+            print(f'apt_pkg.TagFile speedup: {python_time / apt_time:.1f}x')
+        else:
+            print('apt_pkg.TagFile is not available')
+    finally:
+        if not args.path:
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Wall time of the Python backport driver and the backport.sh loop.
+
+Both implementations run in their own scratch directory on copies of the
+same metadata, dose-debcheck and dose-builddebcheck must be installed.
+The gnome example from docs/predose:
+
+    python3 -m benchmarks.bench_backport --input gnome.list stable t202501
+
+Usage: python3 -m benchmarks.bench_backport [--input LIST] [--option OPT ...] NEWERPREFIX OLDERPREFIX
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run(mode: str, args: argparse.Namespace, input_data: bytes) -> float:
+    workdir = tempfile.mkdtemp(prefix=f'bench-backport-{mode}-')
+    for prefix in (args.newer, args.older):
+        for path in glob.glob(f'{prefix}_Packages*') + glob.glob(f'{prefix}_Sources*'):
+            if not path.endswith('.predose'):
+                shutil.copy(path, workdir)
+    cmd: List[str] = [sys.executable, '-m', 'predose.backport']
+    if mode == 'shell':
+        cmd.append('--shell')
+    cmd += args.option + ['bench', args.newer, args.older]
+    env = os.environ.copy()
+    env['PYTHONPATH'] = os.pathsep.join(p for p in (ROOT, env.get('PYTHONPATH')) if p)
+    start = time.perf_counter()
+    result = subprocess.run(cmd, input=input_data, cwd=workdir, env=env, stdout=subprocess.PIPE)
+    elapsed = time.perf_counter() - start
+    iterations = len(glob.glob(os.path.join(workdir, 'bench.[0-9]*.bin'))) - 1
+    print(f'{mode:>6}: {elapsed:.1f} s, {iterations} iterations, exit code {result.returncode}')
+    print(result.stdout.decode().rstrip())
+    if not args.keep:
+        shutil.rmtree(workdir)
+    else:
+        print(f'Output kept in {workdir}')
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the Python backport driver against backport.sh')
+    parser.add_argument('newer', metavar='NEWERPREFIX', help='newer metadata prefix in the current directory')
+    parser.add_argument('older', metavar='OLDERPREFIX', help='older metadata prefix in the current directory')
+    parser.add_argument('--input', help='package list (default: gnome-core)')
+    parser.add_argument('--option', action='append', default=[],
+                        help='backport option passed to both implementations, e.g. --option=--oneshot')
+    parser.add_argument('--keep', action='store_true', help='keep the scratch directories')
+    args = parser.parse_args()
+
+    input_data = open(args.input, 'rb').read() if args.input else b'gnome-core\n'
+    shell_time = _run('shell', args, input_data)
+    python_time = _run('python', args, input_data)
+    print(f'Python driver speedup: {shell_time / python_time:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
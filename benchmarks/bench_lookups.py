@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Wall time of per-line Metadata lookups over every package of a file.
+
+Usage: python3 -m benchmarks.bench_lookups [--size-mb 20] [FILE]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic import write_packages
+from predose.predose import Metadata, PkgKey
+
+
+def _time_lookups(meta: Metadata) -> None:
+    names = list(meta.latest_index)
+    start = time.perf_counter()
+    for name in names:
+        meta.resolve_group(PkgKey(name, ''))
+    elapsed = time.perf_counter() - start
+    print(f'resolve_group: {len(names)} lookups, {elapsed:.2f} s, {elapsed / len(names) * 1e6:.1f} us each')
+
+    start = time.perf_counter()
+    for name in names:
+        meta.add_version(name)
+    elapsed = time.perf_counter() - start
+    print(f'add_version: {len(names)} lookups, {elapsed:.2f} s, {elapsed / len(names) * 1e6:.1f} us each')
+
+    sample = names[:100]
+    start = time.perf_counter()
+    for name in sample:
+        meta.depends(PkgKey(name, ''), 50)
+    elapsed = time.perf_counter() - start
+    print(f'depends: {len(sample)} closures of depth 50, {elapsed:.2f} s, {elapsed / len(sample) * 1e3:.1f} ms each')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark predose per-line lookups')
+    parser.add_argument('--size-mb', type=int, default=20, help='synthetic Packages size (default: %(default)s)')
+    parser.add_argument('path', nargs='?', help='existing Packages file to query')
+    args = parser.parse_args()
+
+    path = args.path or os.path.join(tempfile.mkdtemp(), 'synthetic_Packages')
+    if not args.path:
+        count = write_packages(path, args.size_mb)
+        print(f'Generated {count} stanzas, {os.path.getsize(path) / 2**20:.0f} MB: {path}')
+    try:
+        _time_lookups(Metadata.from_file(path))
+    finally:
+        if not args.path:
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
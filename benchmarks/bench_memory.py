@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Retained memory of parsed Metadata: compact entries versus the former dataclass.
+
+Usage: python3 -m benchmarks.bench_memory [--size-mb 150] [--keep FILE] [FILE]
+
+Pass a real archive (e.g. sid main Packages) as FILE, otherwise a synthetic
+one is generated. Stanza text is not kept in either run, so the numbers
+show the per-entry object overhead. The "dataclass" run parses the file
+separately, the way the parser used to: a plain dataclass per entry, a
+fresh string per name and a list of dependency names, with its own
+src_dict, bin_dict, prov_dict and latest indexes. Nothing is interned and
+predose.Metadata is not involved, so the name table is not shared.
+
+The compact run also keeps the parsed relations of every entry (rel_ids,
+three ints per alternative) and the bounded relation parse caches; the
+latter are reported separately.
+"""
+
+import argparse
+import gc
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.synthetic import write_packages
+
+
+@dataclass
+class LegacyPackageEntry:
+    package: str
+    version: str
+    block: Optional[str]
+    depends: List[str]
+    source: str
+    source_version: str
+
+
+class LegacyMetadata:
+    """The indexes the former parser built, filled with non-interned strings."""
+
+    def __init__(self) -> None:
+        self.packages: Dict[Tuple[str, str], LegacyPackageEntry] = {}
+        self.src_dict: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        self.bin_dict: Dict[Tuple[str, str], List[Tuple[str, str]]] = {}
+        self.prov_dict: Dict[str, str] = {}
+        self.latest_index: Dict[str, Tuple[str, str]] = {}
+        self.latest_src: Dict[str, Tuple[str, str]] = {}
+
+
+def _legacy_parse(path: str) -> LegacyMetadata:
+    import apt_pkg
+
+    from predose.predose import iter_stanzas, open_metadata, split_fields
+
+    apt_pkg.init_system()
+    meta = LegacyMetadata()
+    is_bin = True
+    with open_metadata(path) as f:
+        for block in iter_stanzas(f):
+            fields = split_fields(block)
+            package = fields.get('Package', '')
+            version = fields.get('Version', '')
+            if not package:
+                continue
+            bin_pkgs = []
+            if 'Binary' in fields:
+                is_bin = False
+                bin_pkgs = [(p.strip(), '') for p in fields['Binary'].split(',')]
+            source, _, source_version = fields.get('Source', '').partition(' ')
+            source = source or package
+            source_version = source_version.strip(' ()') or version
+            for p in fields.get('Provides', '').split(','):
+                if p.strip():
+                    meta.prov_dict[p.split()[0]] = package
+            depends = []
+            for name in ('Build-Depends', 'Build-Depends-Indep', 'Build-Depends-Arch', 'Depends', 'Pre-Depends'):
+                for p in fields.get(name, '').split(','):
+                    if p.strip():
+                        depends.append(p.split()[0].split(':')[0])
+            pkg_key = (package, version)
+            src_key = (source, source_version)
+            if is_bin:
+                bin_pkgs = [pkg_key]
+            meta.bin_dict.setdefault(src_key, []).extend(bin_pkgs)
+            for p in bin_pkgs:
+                meta.src_dict[p] = src_key
+            meta.packages[pkg_key] = LegacyPackageEntry(package, version, None, depends, source, source_version)
+            latest = meta.latest_index.get(package)
+            if latest is None or apt_pkg.version_compare(version, latest[1]) > 0:
+                meta.latest_index[package] = pkg_key
+            latest = meta.latest_src.get(source)
+            if latest is None or apt_pkg.version_compare(source_version, latest[1]) > 0:
+                meta.latest_src[source] = src_key
+    return meta
+
+
+def _run_mode(mode: str, path: str) -> None:
+    from predose.predose import Metadata, _parse_alternative, _parse_group
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    if mode == 'dataclass':
+        meta = _legacy_parse(path)
+    else:
+        meta = Metadata.from_file(path, offsets=True)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    _parse_alternative.cache_clear()
+    _parse_group.cache_clear()
+    gc.collect()
+    uncached, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'{mode:>10}: {len(meta.packages)} packages, {elapsed:.2f} s, '
+          f'retained {current / 2**20:.0f} MB ({uncached / 2**20:.0f} MB without relation caches), '
+          f'peak RSS {peak_mb:.0f} MB')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark predose entry memory')
+    parser.add_argument('--size-mb', type=int, default=150, help='synthetic Packages size (default: %(default)s)')
+    parser.add_argument('--keep', metavar='FILE', help='write the synthetic file here and keep it')
+    parser.add_argument('--mode', choices=['dataclass', 'compact'], help=argparse.SUPPRESS)
+    parser.add_argument('path', nargs='?', help='existing Packages file to measure')
+    args = parser.parse_args()
+
+    if args.mode:
+        _run_mode(args.mode, args.path)
+        return
+
+    path = args.path or args.keep or os.path.join(tempfile.mkdtemp(), 'synthetic_Packages')
+    generated = not os.path.exists(path)
+    if generated:
+        count = write_packages(path, args.size_mb)
+        print(f'Generated {count} stanzas, {os.path.getsize(path) / 2**20:.0f} MB: {path}')
+    try:
+        for mode in ('dataclass', 'compact'):
+            subprocess.run([sys.executable, '-m', 'benchmarks.bench_memory', '--mode', mode, path], check=True)
+    finally:
+        if generated and not args.keep:
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
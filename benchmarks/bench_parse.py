@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Peak memory and wall time of Metadata parsing on a synthetic Packages file.
+
+Usage: python3 -m benchmarks.bench_parse [--size-mb 300] [--keep FILE]
+
+Each mode runs in a separate process, so ru_maxrss reflects only that mode.
+The "slurp" mode reproduces the former f.read() + re.split() parser input,
+"offsets" keeps stanza positions instead of text (pre-dose --mmap).
+On 40 MB it peaks at 92 MB against 126 MB for "stream": the parsed
+relations and indexes stay resident, only the stanza text is saved.
+"""
+
+import argparse
+import os
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import write_packages
+
+
+def _run_mode(mode: str, path: str) -> None:
+    from predose.predose import Metadata
+
+    start = time.perf_counter()
+    meta = Metadata()
+    if mode == 'slurp':
+        meta.filepath = path
+        with open(path, 'rt', encoding='utf-8') as f:
+            blocks = re.split(r'\n\n+', f.read().strip())
+        for block in blocks:
+            meta._add_block(block)
+    else:
+        meta.offsets = mode == 'offsets'
+        meta._parse(path)
+    elapsed = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'{mode:>10}: {len(meta.packages)} packages, {elapsed:.2f} s, peak RSS {peak_mb:.0f} MB')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark predose metadata parsing')
+    parser.add_argument('--size-mb', type=int, default=300, help='synthetic Packages size (default: %(default)s)')
+    parser.add_argument('--keep', metavar='FILE', help='write the synthetic file here and keep it')
+    parser.add_argument('--mode', choices=['slurp', 'stream', 'offsets'], help=argparse.SUPPRESS)
+    parser.add_argument('path', nargs='?', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        _run_mode(args.mode, args.path)
+        return
+
+    path = args.keep or os.path.join(tempfile.mkdtemp(), 'synthetic_Packages')
+    if not os.path.exists(path):
+        count = write_packages(path, args.size_mb)
+        print(f'Generated {count} stanzas, {os.path.getsize(path) / 2**20:.0f} MB: {path}')
+    try:
+        for mode in ('slurp', 'stream', 'offsets'):
+            subprocess.run([sys.executable, '-m', 'benchmarks.bench_parse', '--mode', mode, path], check=True)
+    finally:
+        if not args.keep:
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""Wall time of StableTopoSort on Node objects and on CSR arrays.
+
+The random graph has the size of the sid build-dependency graph, about 35k
+sources and 500k edges. Node construction is timed separately, it is part
+of the cost the CSR entry point avoids.
+
+Usage: python3 -m benchmarks.bench_toposort [--nodes 35000] [--edges 500000] [--seed 1]
+"""
+
+import argparse
+import random
+import time
+from array import array
+
+from toposort import Node, StableTopoSort
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark StableTopoSort entry points')
+    parser.add_argument('--nodes', type=int, default=35000, help='number of nodes (default: %(default)s)')
+    parser.add_argument('--edges', type=int, default=500000, help='number of edges (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=1, help='random seed (default: %(default)s)')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    offsets = array('i', [0])
+    targets = array('i')
+    per_node = 2 * args.edges // args.nodes
+    for _ in range(args.nodes):
+        targets.extend(rng.randrange(args.nodes) for _ in range(rng.randint(0, per_node)))
+        offsets.append(len(targets))
+    print(f'{args.nodes} nodes, {len(targets)} edges')
+
+    start = time.perf_counter()
+    nodes = [Node(i) for i in range(args.nodes)]
+    for i, node in enumerate(nodes):
+        node.edges = [nodes[j] for j in targets[offsets[i]:offsets[i + 1]]]
+    built = time.perf_counter()
+    node_result = StableTopoSort.stable_topo_sort(nodes)
+    done = time.perf_counter()
+    print(f'  nodes: {built - start:.2f} s building, {done - built:.2f} s sorting')
+
+    start = time.perf_counter()
+    csr_result = StableTopoSort.stable_topo_sort_csr(offsets, targets)
+    print(f'    csr: {time.perf_counter() - start:.2f} s sorting')
+
+    assert [(level, node.name) for level, node in node_result] == csr_result
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Synthetic Debian metadata generators for the benchmarks."""
+
+import random
+
+
+def _packages_stanza(i: int, rng: random.Random, num_packages: int) -> str:
+    name = f'pkg{i:06d}'
+    source = f'src{i // 4:06d}'
+    deps = ', '.join(
+        f'pkg{rng.randrange(num_packages):06d} (>= 1.{rng.randrange(10)})'
+        for _ in range(rng.randrange(1, 12))
+    )
+    return (
+        f'Package: {name}\n'
+        f'Source: {source} (1.{i % 7}-1)\n'
+        f'Version: 1.{i % 7}-1+b1\n'
+        f'Installed-Size: {rng.randrange(10, 100000)}\n'
+        f'Maintainer: Synthetic Maintainers <synthetic@example.org>\n'
+        f'Architecture: amd64\n'
+        f'Provides: virtual-{i % 5000}\n'
+        f'Depends: {deps}\n'
+        f'Pre-Depends: dpkg (>= 1.15.6~)\n'
+        f'Description: synthetic package {i}\n'
+        f'Description-md5: {rng.getrandbits(128):032x}\n'
+        f'Tag: role::program, implemented-in::c,\n'
+        f' interface::commandline, use::synthetic\n'
+        f'Section: misc\n'
+        f'Priority: optional\n'
+        f'Filename: pool/main/s/{source}/{name}_1.{i % 7}-1+b1_amd64.deb\n'
+        f'Size: {rng.randrange(1000, 10000000)}\n'
+        f'MD5sum: {rng.getrandbits(128):032x}\n'
+        f'SHA256: {rng.getrandbits(256):064x}\n'
+        f'\n'
+    )
+
+
+def write_packages(path: str, size_mb: int, seed: int = 0) -> int:
+    """Write a synthetic Packages file of roughly size_mb megabytes."""
+    rng = random.Random(seed)
+    target = size_mb * 1024 * 1024
+    # A stanza is about 900 bytes, size the name space accordingly
+    num_packages = max(1, target // 900)
+    written = 0
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        while written < target:
+            stanza = _packages_stanza(count, rng, num_packages)
+            f.write(stanza)
+            written += len(stanza)
+            count += 1
+    return count
@@ -20,6 +20,7 @@ config = {
     "min_version": "0~~",
     "briefly_keys": ['package', 'version', 'dist', 'build', 'source'],
     "consistency": True,
+    "parser": "python",
     'timestamp': str(time.time())
 }
 
@@ -50,6 +51,54 @@ def write_metadata_index(filename, data_list):
     except IOError as e:
         logging.error(f"Error writing to file: {e}")
 
+def iter_metadata_fields(packagefile):
+    """Yield (fields, block) for each stanza, field names are title-cased."""
+    if config["parser"] == "apt" or (config["parser"] == "auto" and hasattr(apt_pkg, 'TagFile')):
+        if hasattr(apt_pkg, 'TagFile'):
+            yield from _iter_fields_tagfile(packagefile)
+            return
+        logging.warning('apt_pkg.TagFile is not available, using the Python parser')
+    yield from _iter_fields_python(packagefile)
+
+def _iter_fields_tagfile(packagefile):
+    for section in apt_pkg.TagFile(packagefile):
+        # TagFile folds a line without a colon into the next field name, parse such a stanza in Python
+        if any('\n' in key for key in section.keys()):
+            yield _block_fields(str(section).rstrip('\n')), str(section)
+            continue
+        fields = {}
+        for key in section.keys():
+            # Same shape as the Python parser: leading space, folded continuation lines
+            fields[key.title()] = ' ' + section[key].replace('\n', '')
+        yield fields, str(section)
+
+def _iter_fields_python(packagefile):
+    with open(packagefile, 'rt', encoding='utf-8') as f:
+        content = f.read()
+    # Split into individual package blocks
+    package_blocks = re.split(r'\n\n+', content.strip())
+    for block in package_blocks:
+        yield _block_fields(block), block
+
+def _block_fields(block):
+    fields = {}
+    block_list = []
+    for line in block.splitlines():
+        if len(block_list) > 0 and block_list[-1][-1] == ',' and line[0].isspace():
+            block_list[-1] += line.rstrip()
+        else:
+            if line:
+                block_list.append(line.rstrip())
+    for line in block_list:
+        if not line or line[0].isspace(): continue
+        if ':' in line:
+            key, value = line.split(':', 1)
+            key = key.title()
+            if key == 'Package' and key in fields:
+                logging.error(f'Duplicate stanza key: {key}: {value.strip()}')
+            fields[key] = value
+    return fields
+
 def update_metadata_index(packagefile, data_list, dist, comp, build, dry_run = False):
 
     packages = []
@@ -65,63 +114,46 @@ def update_metadata_index(packagefile, data_list, dist, comp, build, dry_run = F
         logging.debug(f"Packagefile does not exist: {packagefile}")
         return data_list
 
-    with open(packagefile, 'rt', encoding='utf-8') as f:
-        content = f.read()
-        # Split into individual package blocks
-        package_blocks = re.split(r'\n\n+', content.strip())
-        for block in package_blocks:
-            pkg_name = version = arch = filename = directory = source = source_version = None
-            depends = []
-            block_list = []
-            for line in block.splitlines():
-                if len(block_list) > 0 and block_list[-1][-1] == ',' and line[0].isspace():
-                    block_list[-1] += line.rstrip()
-                else:
-                    if line:
-                        block_list.append(line.rstrip())
-            for line in block_list:
-                if not line or line[0].isspace(): continue
-                if ':' in line:
-                    key, value = line.split(':', 1)
-                    key = key.title()
-                    # Extract package name
-                    if key == 'Package':
-                        if pkg_name is not None:
-                            logging.error(f'Duplicate stanza key: {key}: {value.strip()}')
-                        pkg_name = value.strip()
-                    # Build binary-to-source mapping for binary metadata if requested
-                    if key == 'Source':
-                        source_line = value.strip().split()
-                        if len(source_line) > 0:
-                            source = source_line[0]
-                            if len(source_line) > 1: source_version = re.findall(r'\((.*?)\)', source_line[1])[0]
-                   # Extract version
-                    if key == 'Version':
-                        version = value.strip()
-                   # Extract architecture
-                    if key == 'Architecture':
-                        arch = value.strip()
-                   # Extract filename
-                    if key == 'Filename':
-                        filename = value.strip()
-                   # Extract directory
-                    if key == 'Directory':
-                        directory = value.strip()
-                    # Collect dependencies
-                    if key in ('Build-Depends', 'Build-Depends-Indep', 'Build-Depends-Arch', 'Depends', 'Pre-Depends'):
-                        depends.append(value)
-            # Store package metadata if valid
-            if pkg_name is not None and (filename is not None or (directory is not None and version is not None)):
-                if source is None: source = pkg_name
-                if source_version is None: source_version = version
-                packages.append({ \
-                    'package': pkg_name, 'version': version, 'dist': dist, 'comp': comp, 'build': build, 'arch': arch, \
-                    'depends': hashlib.md5(",".join(depends).encode()).hexdigest()[:8], \
-                    'source': source, 'source_version': source_version, \
-                    'filename': filename if filename else directory + "/" + pkg_name + "_" + version.split(":")[-1] + ".dsc" })
-            else:
-                if block.strip():
-                    logging.error(f'Invalid metadata detected: {block}')
+    for fields, block in iter_metadata_fields(packagefile):
+        pkg_name = version = arch = filename = directory = source = source_version = None
+        depends = []
+        for key, value in fields.items():
+            # Extract package name
+            if key == 'Package':
+                pkg_name = value.strip()
+            # Build binary-to-source mapping for binary metadata if requested
+            if key == 'Source':
+                source_line = value.strip().split()
+                if len(source_line) > 0:
+                    source = source_line[0]
+                    if len(source_line) > 1: source_version = re.findall(r'\((.*?)\)', source_line[1])[0]
+           # Extract version
+            if key == 'Version':
+                version = value.strip()
+           # Extract architecture
+            if key == 'Architecture':
+                arch = value.strip()
+           # Extract filename
+            if key == 'Filename':
+                filename = value.strip()
+           # Extract directory
+            if key == 'Directory':
+                directory = value.strip()
+            # Collect dependencies
+            if key in ('Build-Depends', 'Build-Depends-Indep', 'Build-Depends-Arch', 'Depends', 'Pre-Depends'):
+                depends.append(value)
+        # Store package metadata if valid
+        if pkg_name is not None and (filename is not None or (directory is not None and version is not None)):
+            if source is None: source = pkg_name
+            if source_version is None: source_version = version
+            packages.append({ \
+                'package': pkg_name, 'version': version, 'dist': dist, 'comp': comp, 'build': build, 'arch': arch, \
+                'depends': hashlib.md5(",".join(depends).encode()).hexdigest()[:8], \
+                'source': source, 'source_version': source_version, \
+                'filename': filename if filename else directory + "/" + pkg_name + "_" + version.split(":")[-1] + ".dsc" })
+        else:
+            if block.strip():
+                logging.error(f'Invalid metadata detected: {block}')
     logging.debug(f'In the file {packagefile} processed packets: {len(packages)}')
 
     logging.debug(f'Save component index: {packagefile_index}')
@@ -558,6 +590,8 @@ def main():
     parser.add_argument("-s", "--source", action="store_true", help="Use the Source field for searching, not the Package field")
     parser.add_argument("-y", "--briefly", action="store_true", help="Display only basic fields")
     parser.add_argument("-a", "--all", action="store_true", help="Process all records instead of reading conditions from stdin")
+    parser.add_argument("-P", "--parser", default=config["parser"], choices=['auto', 'python', 'apt'], \
+        help='Metadata parser, auto uses apt_pkg.TagFile when available (default: %(default)s)')
     parser.add_argument("-l", "--log-level", default=config["loglevel"], choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'], \
         help='Set the logging level (default: %(default)s)')
 
@@ -603,6 +637,8 @@ def main():
     if args.local_dir:
         config["local_dir"] = args.local_dir
 
+    config["parser"] = args.parser
+
     if not args.dist:
         args.dist = None
     else:
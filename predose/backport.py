@@ -1,24 +1,623 @@
-"""Wrapper for the backport.sh script."""
+"""Backport driver: iterate pre-dose and dose checks until the package lists converge.
 
+The origin and target metadata stay in memory for the whole run, only the
+target Packages/Sources files that dose reads are written out per iteration.
+`backport --shell ...` runs the original backport.sh loop instead.
+"""
+
+import argparse
+import logging
 import os
+import re
+import shutil
 import subprocess
 import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from predose.predose import Metadata, open_metadata, parse_package_line
+from predose.solver import Checker, report_lines
+
+COMPRESSED_EXTENSIONS = ('', '.xz', '.gz', '.bz2', '.zst')
+MAX_ITERATIONS = 999
+# Linux limits a single argument to 128 KiB, larger --checkonly lists fall back to a full check
+MAX_CHECKONLY_LENGTH = 100000
+# Smallest --checkonly shard worth its own dose process, each one parses the whole repository
+MIN_SHARD_SIZE = 200
+
+_PKG_LINE = re.compile(r'^\s{5}pkg1?:')
+_UNSAT_LINE = re.compile(r'^\s{6}(unsat-|package:)')
+_SUMMARY_LINE = re.compile(r'^[a-z]+-packages:')
+_ROOT_LINE = re.compile(r'^\s{2}package:\s*(\S+)')
+
 
-def main():
+def run_shell(argv: Sequence[str]) -> int:
     """Execute the backport.sh script."""
     script_path = Path(__file__).parent / "backport.sh"
 
     if not script_path.exists():
         print(f"Error: backport.sh not found at {script_path}")
-        sys.exit(1)
+        return 1
 
     # Make sure the script is executable
     script_path.chmod(0o755)
 
     # Execute the shell script with all arguments
-    result = subprocess.run([str(script_path)] + sys.argv[1:])
-    sys.exit(result.returncode)
+    return subprocess.run([str(script_path)] + list(argv)).returncode
+
+
+def unsat_pairs(report: Iterable[str]) -> List[str]:
+    """'package: ...<TAB>unsat-...: ...' lines for every broken package in a dose report.
+
+    Same selection as `grep -A 5 pkg: | grep unsat-|package: | paste - -` in backport.sh.
+    """
+    lines = list(report)
+    selected = []
+    last = -1
+    for i, line in enumerate(lines):
+        if _PKG_LINE.match(line):
+            for j in range(max(i, last + 1), min(i + 6, len(lines))):
+                if _UNSAT_LINE.match(lines[j]):
+                    selected.append(lines[j].rstrip('\n'))
+            last = max(last, i + 5)
+    return ['\t'.join(selected[i:i + 2]) for i in range(0, len(selected), 2)]
+
+
+def split_report(report: Iterable[str]) -> Dict[str, List[str]]:
+    """Report lines of every checked package, keyed by its name."""
+    chunks: Dict[str, List[str]] = {}
+    current: Optional[List[str]] = None
+    for line in report:
+        m = _ROOT_LINE.match(line)
+        if m:
+            name = m.group(1)
+            if name.startswith('src:'):
+                name = name[4:]
+            current = chunks.setdefault(name.split(':')[0], [])
+        elif not line.startswith(' '):
+            current = None
+        if current is not None:
+            current.append(line)
+    return chunks
+
+
+def _dep_name(dep: str) -> str:
+    return re.split(r'[:\s]', dep.strip(), maxsplit=1)[0]
+
+
+def unsat_names(pairs: Iterable[str], removeonly: bool = False) -> Set[str]:
+    """Package names to handle in the next iteration, see awkunsat in backport.sh."""
+    names: Set[str] = set()
+    for line in pairs:
+        fields = line.split()
+        if len(fields) < 2:
+            continue
+        pkg = fields[1]
+        if removeonly:
+            if 'unsat-conflict:' in line:
+                names.update(_dep_name(d) for d in line.split('unsat-conflict: ', 1)[1].split(' | '))
+            else:
+                names.add(pkg)
+            continue
+        if 'unsat-dependency:' in line:
+            deps = line.split('unsat-dependency: ', 1)[1]
+            # Versioned dependency: the package itself may need a newer build
+            if re.search(r'\([<=]', deps):
+                names.add(pkg)
+            names.update(_dep_name(d) for d in deps.split(' | '))
+    names.discard('')
+    return names
+
+
+def dependent_on_missing(pairs: Iterable[str], origin_names: Set[str]) -> Set[str]:
+    """Packages whose unsatisfied dependency is not in the origin repository at all."""
+    names = set()
+    for line in pairs:
+        fields = line.split()
+        if len(fields) >= 4 and _dep_name(fields[3]) not in origin_names:
+            names.add(fields[1])
+    return names
+
+
+def shard(names: Iterable[str], count: int) -> List[List[str]]:
+    """Split names round-robin into at most count shards of at least MIN_SHARD_SIZE names."""
+    ordered = sorted(names)
+    count = max(1, min(count, len(ordered) // MIN_SHARD_SIZE))
+    return [ordered[i::count] for i in range(count)]
+
+
+def merge_reports(reports: Sequence[List[str]]) -> List[str]:
+    """Merge the YAML reports of dose runs on shards of one repository.
+
+    Header lines are taken once, duplicate package records are dropped and the
+    summary counters are recomputed: totals are shared, broken-packages is the
+    number of merged records, other counters are summed.
+    """
+    if len(reports) == 1:
+        return list(reports[0])
+    head: Dict[str, None] = {}
+    records: Dict[str, None] = {}
+    counters: Dict[str, int] = {}
+    for report in reports:
+        record: List[str] = []
+        for line in report:
+            if line.startswith(' '):
+                if line.rstrip('\n') == ' -' and record:
+                    records[''.join(record)] = None
+                    record = []
+                record.append(line)
+                continue
+            if record:
+                records[''.join(record)] = None
+                record = []
+            if _SUMMARY_LINE.match(line):
+                name, value = line.split(':', 1)
+                if name == 'total-packages':
+                    counters[name] = max(counters.get(name, 0), int(value))
+                else:
+                    counters[name] = counters.get(name, 0) + int(value)
+            else:
+                head[line] = None
+        if record:
+            records[''.join(record)] = None
+    if 'broken-packages' in counters:
+        counters['broken-packages'] = sum('  status: broken\n' in r for r in records)
+    if 'background-packages' in counters and 'foreground-packages' in counters:
+        counters['background-packages'] = counters.get('total-packages', 0) - counters['foreground-packages']
+    lines = list(head)
+    for record in records:
+        lines.extend(record.splitlines(True))
+    lines.extend(f'{name}: {value}\n' for name, value in counters.items())
+    return lines
+
+
+def summary(report: Iterable[str]) -> str:
+    return '\t'.join(line.strip().replace('-packages', '') for line in report if _SUMMARY_LINE.match(line))
+
+
+def count_unsat(report: Iterable[str], n: int = 10) -> str:
+    """Most frequent unsatisfied relations, see countgrepunsat and showhead in backport.sh."""
+    # Ties in reverse order like `sort | uniq -c | sort -nr`
+    counts = sorted(Counter(unsat_pairs(report)).items(), key=lambda c: (c[1], c[0]), reverse=True)
+    lines = [f'{c:7d} {pair}' for pair, c in counts[:n]]
+    if not counts:
+        lines.append('No lines to display')
+    elif len(counts) <= n:
+        lines.append(f'Displaying all {len(counts)} lines')
+    else:
+        lines.append(f'Displaying first {n} of {len(counts)} total lines')
+    return '\n'.join(lines)
+
+
+def metadata_for_prefix(base: str) -> str:
+    """Metadata file for a prefix, e.g. testing_Packages or testing_Packages.xz."""
+    for ext in COMPRESSED_EXTENSIONS:
+        if os.path.isfile(base + ext):
+            return base + ext
+    return base
+
+
+def find_metadata_files(directory: str, name: str) -> List[str]:
+    """All files under directory whose path ends with name, compressed ones as fallback."""
+    found: Dict[str, List[str]] = {ext: [] for ext in ('', '.xz', '.gz', '.bz2', '.zst')}
+    for root, _, files in os.walk(directory):
+        for f in files:
+            path = os.path.join(root, f)
+            for ext in found:
+                if path.endswith(f'/{name}{ext}'):
+                    found[ext].append(path)
+    if found['']:
+        return sorted(found[''])
+    return sorted(path for ext, paths in found.items() if ext for path in paths)
+
+
+def write_plain(paths: Sequence[str], dest: str) -> None:
+    """Concatenate (compressed) metadata files into one plain file for dose."""
+    with open(dest, 'w', encoding='utf-8') as out:
+        for path in paths:
+            with open_metadata(path) as f:
+                shutil.copyfileobj(f, out)
+            out.write('\n')
+
+
+class BackportDriver:
+    """In-memory version of the backport.sh iteration loop."""
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.base_name: str = args.base_name
+        self.newer_packages = [metadata_for_prefix(f'{args.newer}_Packages')]
+        self.newer_sources = [metadata_for_prefix(f'{args.newer}_Sources')]
+        self.older_packages = [metadata_for_prefix(f'{args.older}_Packages')]
+        self.older_sources = [metadata_for_prefix(f'{args.older}_Sources')]
+        self.packages_file = f'{self.base_name}_Packages'
+        self.sources_file = f'{self.base_name}_Sources'
+        # Last known report of every broken package, refreshed by each check
+        self.bin_reports: Dict[str, List[str]] = {}
+        self.src_reports: Dict[str, List[str]] = {}
+
+    def _suite_metadata(self, suite: str) -> Tuple[List[str], List[str]]:
+        suite_dir = os.path.join(self.args.metadata, 'dists', suite)
+        if not os.path.isdir(suite_dir):
+            print(f"Error: Suite directory '{suite_dir}' not found in metadata folder")
+        result = []
+        for name, kind in (('binary-amd64/Packages', 'Packages'), ('source/Sources', 'Sources')):
+            files = find_metadata_files(suite_dir, name)
+            if not files:
+                print(f"Warning: No {kind} files found for suite '{suite}' under {suite_dir}")
+                Path(f'{suite}_{kind}').touch()
+                files = [f'{suite}_{kind}']
+            result.append(files)
+        return result[0], result[1]
+
+    def prepare_metadata(self) -> None:
+        if not self.args.metadata:
+            return
+        if not os.path.isdir(self.args.metadata):
+            print(f"Error: Metadata folder '{self.args.metadata}' does not exist")
+            sys.exit(1)
+        subprocess.run(['distrotracker', '--local-dir', self.args.metadata,
+                        '--dist', self.args.newer, self.args.older], check=True)
+        self.newer_packages, self.newer_sources = self._suite_metadata(self.args.newer)
+        self.older_packages, self.older_sources = self._suite_metadata(self.args.older)
+
+    def load(self) -> None:
+        def load_latest(paths: List[str]) -> Metadata:
+            meta = Metadata.from_file(paths, offsets=True, snapshot=True)
+            meta.keep_latest()
+            return meta
+
+        self.newer_pkgs = load_latest(self.newer_packages)
+        self.older_pkgs = load_latest(self.older_packages)
+        self.newer_srcs = load_latest(self.newer_sources)
+        self.target_pkgs = load_latest(self.older_packages)
+        self.target_srcs = load_latest(self.older_sources)
+        self.origin_names = set(self.newer_pkgs.latest_index)
+
+    @staticmethod
+    def resolve(meta: Metadata, method: str, names: Iterable[str]) -> Set[str]:
+        out: Set[str] = set()
+        for name in names:
+            key = parse_package_line(name)
+            if key is not None:
+                out.update(line for line in getattr(meta, method)(key).split('\n') if line)
+        return out
+
+    @staticmethod
+    def remove(meta: Metadata, names: Iterable[str]) -> Set[str]:
+        changed = set()
+        for name in sorted(names):
+            key = parse_package_line(name)
+            if key is not None and meta.remove(key):
+                changed.add(key.package)
+        meta.keep_latest()
+        return changed
+
+    @staticmethod
+    def backport(origin: Metadata, target: Metadata, names: Iterable[str]) -> Set[str]:
+        changed = set()
+        for name in sorted(names):
+            key = parse_package_line(name)
+            if key is not None and origin.backport(key, target):
+                changed.add(key.package)
+        target.keep_latest()
+        return changed
+
+    def apply(self, bins: Set[str], srcs: Set[str]) -> Tuple[Set[str], Set[str]]:
+        """Remove the packages from the target and implant them from the origin.
+
+        Returns the names of the binary and source packages that changed.
+        """
+        args = self.args
+        changed_bins: Set[str] = set()
+        changed_srcs: Set[str] = set()
+        if not args.binonly:
+            changed_bins |= self.remove(self.target_pkgs, self.resolve(self.target_pkgs, 'resolve_bin', srcs))
+        changed_bins |= self.remove(self.target_pkgs, bins)
+        if not args.binonly:
+            changed_srcs |= self.remove(self.target_srcs, srcs)
+        if args.removeonly:
+            return changed_bins, changed_srcs
+        changed_bins |= self.backport(self.newer_pkgs, self.target_pkgs, bins)
+        if not args.onlyunsat:
+            changed_bins |= self.backport(self.newer_pkgs, self.target_pkgs,
+                                          self.resolve(self.newer_pkgs, 'resolve_bin', srcs))
+        if not args.binonly:
+            changed_srcs |= self.backport(self.newer_srcs, self.target_srcs, srcs)
+        return changed_bins, changed_srcs
+
+    def check_scope(self, changed_bins: Set[str],
+                    changed_srcs: Set[str]) -> Tuple[Optional[Set[str]], Optional[Set[str]]]:
+        """Packages whose installability may have changed, None for a full check.
+
+        Binary scope: changed binaries and everything that (transitively)
+        depends on them or on a name they provide. Source scope: changed
+        sources and sources build-depending on the binary scope.
+        Conflicts and Breaks are not followed, the periodic full check covers them.
+        """
+        provides: Dict[str, List[str]] = {}
+        for virtual, provider in self.target_pkgs.prov_dict.items():
+            if provider:
+                provides.setdefault(provider, []).append(virtual)
+        roots = set(changed_bins)
+        for name in changed_bins:
+            roots.update(provides.get(name, []))
+        bin_scope = set(changed_bins)
+        bin_scope.update(self.target_pkgs.rdepends_closure(roots, len(self.target_pkgs.packages) + 1))
+        src_scope = set(changed_srcs)
+        for name in bin_scope:
+            src_scope.update(p for p in self.target_srcs.rdepends(name).split('\n') if p)
+        if max(len(','.join(bin_scope)) * 2, len(','.join(src_scope))) > MAX_CHECKONLY_LENGTH:
+            logging.info(f'Changed set is too large for --checkonly: {len(bin_scope)} binaries, '
+                         f'{len(src_scope)} sources')
+            return None, None
+        return bin_scope, src_scope
+
+    @staticmethod
+    def merge_report(cache: Dict[str, List[str]], report: List[str],
+                     scope: Optional[Set[str]]) -> List[str]:
+        """Update the cached reports with a check of scope, return the report of all packages."""
+        if scope is None:
+            cache.clear()
+        else:
+            for name in scope:
+                cache.pop(name, None)
+        cache.update(split_report(report))
+        return [line for chunk in cache.values() for line in chunk]
+
+    def dose_commands(self, bin_scope: Optional[Set[str]],
+                      src_scope: Optional[Set[str]]) -> Tuple[List[List[str]], List[List[str]]]:
+        """dose-debcheck and dose-builddebcheck commands, one per --checkonly shard."""
+        common = ['--latest', '1', '--deb-native-arch=amd64', '-e', '-f']
+        jobs = self.args.jobs
+
+        def shards(scope: Optional[Set[str]], names: Iterable[str]) -> List[Optional[List[str]]]:
+            if jobs <= 1:
+                return [None if scope is None else sorted(scope)]
+            parts = shard(names if scope is None else scope, jobs)
+            if scope is None and (len(parts) == 1 or any(
+                    len(','.join(p)) * 2 > MAX_CHECKONLY_LENGTH for p in parts)):
+                return [None]
+            return list(parts)
+
+        debcheck_cmds = []
+        for part in shards(bin_scope, self.target_pkgs.latest_index):
+            extra = [] if part is None else ['--checkonly', ','.join(f'{b}:amd64' for b in part)]
+            debcheck_cmds.append(['dose-debcheck'] + extra + common + [self.packages_file])
+        builddebcheck_cmds = []
+        for part in shards(src_scope, self.target_srcs.latest_src):
+            extra = [] if part is None else ['--checkonly', ','.join(part)]
+            builddebcheck_cmds.append(['dose-builddebcheck'] + extra + common
+                                      + [self.packages_file, self.sources_file])
+        return debcheck_cmds, builddebcheck_cmds
+
+    @staticmethod
+    def _run_checker(cmd: List[str]) -> List[str]:
+        logging.info(f'Running: {" ".join(cmd)}')
+        return subprocess.run(cmd, stdout=subprocess.PIPE, text=True).stdout.splitlines(True)
+
+    def run_builtin(self, bin_scope: Optional[Set[str]],
+                    src_scope: Optional[Set[str]]) -> Tuple[List[str], List[str]]:
+        """Check the in-memory target with predose.solver, return dose-like reports."""
+        checker = Checker(self.target_pkgs)
+        debcheck = report_lines(checker.check_all(bin_scope), len(checker.depends))
+        builddebcheck: List[str] = []
+        if not self.args.binonly:
+            builddebcheck = report_lines(checker.check_sources(self.target_srcs, src_scope),
+                                         len(self.target_srcs.latest_src), source=True)
+        return debcheck, builddebcheck
+
+    def run_dose(self, bin_scope: Optional[Set[str]],
+                 src_scope: Optional[Set[str]]) -> Tuple[List[str], List[str]]:
+        """Run the shards of both checks in parallel, return the merged reports."""
+        if self.args.checker == 'builtin':
+            return self.run_builtin(bin_scope, src_scope)
+        debcheck_cmds, builddebcheck_cmds = self.dose_commands(bin_scope, src_scope)
+        if self.args.binonly:
+            builddebcheck_cmds = []
+        # Both checkers run at once even with --jobs 1, like backport.sh
+        with ThreadPoolExecutor(max_workers=max(2, self.args.jobs)) as pool:
+            reports = list(pool.map(self._run_checker, debcheck_cmds + builddebcheck_cmds))
+        debcheck = merge_reports(reports[:len(debcheck_cmds)])
+        builddebcheck = merge_reports(reports[len(debcheck_cmds):]) if builddebcheck_cmds else []
+        return debcheck, builddebcheck
+
+    def check(self, filename: str, bin_scope: Optional[Set[str]],
+              src_scope: Optional[Set[str]], cached: bool) -> Tuple[Set[str], Set[str], List[str], List[str]]:
+        """Run dose, return the packages for the next iteration and the reports."""
+        args = self.args
+        debcheck, builddebcheck = self.run_dose(bin_scope, src_scope)
+        print(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} {filename}: "
+              f"{summary(debcheck)} {summary(builddebcheck)}"
+              f"{'' if bin_scope is None else f' (checked {len(bin_scope)}/{len(src_scope or ())})'}",
+              flush=True)
+        with open(f'{self.base_name}.debcheck.log', 'a') as f:
+            f.writelines(debcheck)
+        with open(f'{self.base_name}.builddebcheck.log', 'a') as f:
+            f.writelines(builddebcheck)
+        if cached:
+            debcheck = self.merge_report(self.bin_reports, debcheck, bin_scope)
+            builddebcheck = self.merge_report(self.src_reports, builddebcheck, src_scope)
+
+        debcheck_pairs = sorted(set(unsat_pairs(debcheck)))
+        builddebcheck_pairs = sorted(set(unsat_pairs(builddebcheck)))
+        next_bins = unsat_names(debcheck_pairs, args.removeonly)
+        next_srcs: Set[str] = set()
+        if not args.nosrcfix:
+            next_bins |= unsat_names(builddebcheck_pairs, args.removeonly)
+        if not args.removeonly:
+            next_bins |= dependent_on_missing(debcheck_pairs, self.origin_names)
+            if not args.nosrcfix:
+                next_srcs |= dependent_on_missing(builddebcheck_pairs, self.origin_names)
+        return next_bins, next_srcs, debcheck, builddebcheck
+
+    def baseline(self) -> None:
+        print("")
+        if self.args.checker == 'builtin':
+            debcheck, builddebcheck = self.run_builtin(None, None)
+        else:
+            plain_packages = f'{self.base_name}.baseline_Packages'
+            plain_sources = f'{self.base_name}.baseline_Sources'
+            write_plain(self.older_packages, plain_packages)
+            write_plain(self.older_sources, plain_sources)
+            common = ['--latest', '1', '--deb-native-arch=amd64', '-e', '-f']
+            debcheck = subprocess.run(['dose-debcheck'] + common + [plain_packages],
+                                      stdout=subprocess.PIPE, text=True).stdout.splitlines()
+            builddebcheck = subprocess.run(['dose-builddebcheck'] + common + [plain_packages, plain_sources],
+                                           stdout=subprocess.PIPE, text=True).stdout.splitlines()
+            os.unlink(plain_packages)
+            os.unlink(plain_sources)
+        print("Baseline dose-debcheck:")
+        print(count_unsat(debcheck))
+        print("")
+        print("Baseline dose-builddebcheck:")
+        print(count_unsat(builddebcheck))
+        print("")
+
+    def write_list(self, counter: int, ext: str, names: Set[str]) -> None:
+        with open(f'{self.base_name}.{counter:03d}.{ext}', 'w') as f:
+            f.writelines(f'{n}\n' for n in sorted(names))
+
+    def run(self, input_names: Iterable[str]) -> int:
+        args = self.args
+        tools = ('dose-distcheck', 'dose-builddebcheck') if args.checker == 'dose' else ()
+        for tool in tools:
+            if shutil.which(tool) is None:
+                print(f"Warning: {tool} package is not installed. Exiting.")
+                return 1
+
+        self.prepare_metadata()
+        self.load()
+        if args.oneshot:
+            self.baseline()
+
+        bins = {n.strip() for n in input_names if n.strip() and not n.strip().startswith('#')}
+        srcs = self.resolve(self.newer_pkgs, 'resolve_src', bins)
+        print("")
+
+        try:
+            return self.iterate(bins, srcs)
+        finally:
+            if args.checker == 'builtin':
+                self.target_pkgs.write_blocks(self.packages_file)
+                self.target_srcs.write_blocks(self.sources_file)
+
+    def iterate(self, bins: Set[str], srcs: Set[str]) -> int:
+        args = self.args
+        counter = 0
+        all_bins: Set[str] = set()
+        all_srcs: Set[str] = set()
+
+        while True:
+            counter += 1
+            srcs |= self.resolve(self.newer_pkgs, 'resolve_src', bins)
+            srcs |= self.resolve(self.older_pkgs, 'resolve_src', bins)
+            self.write_list(counter - 1, 'bin', bins)
+            self.write_list(counter - 1, 'src', srcs)
+            all_bins |= bins
+            all_srcs |= srcs
+
+            changed_bins, changed_srcs = self.apply(bins, srcs)
+            if args.checker == 'dose':
+                self.target_pkgs.write_blocks(self.packages_file)
+                self.target_srcs.write_blocks(self.sources_file)
+
+            filename = f'{self.base_name}.{counter - 1:03d}'
+            every = args.full_check_every
+            if args.checkonly:
+                scope: Tuple[Optional[Set[str]], Optional[Set[str]]] = (all_bins, all_srcs)
+            elif every <= 0 or (counter - 1) % every == 0:
+                scope = (None, None)
+            else:
+                scope = self.check_scope(changed_bins, changed_srcs)
+            cached = not args.checkonly
+            next_bins, next_srcs, debcheck, builddebcheck = self.check(filename, *scope, cached)
+
+            if cached and scope != (None, None) and next_bins == bins and next_srcs == srcs:
+                logging.info('Converged on an incremental check, confirming with a full check')
+                next_bins, next_srcs, debcheck, builddebcheck = self.check(filename, None, None, cached)
+
+            if args.oneshot:
+                self.write_list(counter, 'bin', next_bins)
+                self.write_list(counter, 'src', next_srcs)
+                print("")
+                print("Regression dose-debcheck:")
+                print(count_unsat(debcheck))
+                print("")
+                print("Regression dose-builddebcheck:")
+                print(count_unsat(builddebcheck))
+                print("")
+                print("Only one iteration requested, exit")
+                return 0
+
+            if next_bins == bins and next_srcs == srcs:
+                self.write_list(counter, 'bin', next_bins)
+                self.write_list(counter, 'src', next_srcs)
+                print(f"Stopping: '{self.base_name}.{counter:03d}' has identical content to '{filename}'")
+                return 0
+
+            if counter >= MAX_ITERATIONS:
+                print("Iteration limit reached")
+                return 1
+
+            bins, srcs = next_bins, next_srcs
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Backport packages from a newer repository into an older one, '
+                    'package names are read from stdin.',
+        epilog='Example: echo gnome-core | backport gnome-core testing stable',
+    )
+    parser.add_argument('base_name', metavar='BASENAME', help='prefix of all output files')
+    parser.add_argument('newer', metavar='NEWERPREFIX',
+                        help='newerprefix_Packages and newerprefix_Sources, may be compressed')
+    parser.add_argument('older', metavar='OLDERPREFIX',
+                        help='olderprefix_Packages and olderprefix_Sources, may be compressed')
+    parser.add_argument('--checkonly', action='store_true',
+                        help='check only the packages handled so far')
+    parser.add_argument('--binonly', action='store_true',
+                        help='do not touch Sources and skip dose-builddebcheck')
+    parser.add_argument('--removeonly', action='store_true',
+                        help='only remove packages from the target')
+    parser.add_argument('--onlyunsat', action='store_true',
+                        help='do not implant all binaries of a source, only the unsatisfied ones')
+    parser.add_argument('--nosrcfix', action='store_true',
+                        help='ignore dose-builddebcheck results')
+    parser.add_argument('--full-check-every', type=int, default=10, metavar='N',
+                        help='check only packages affected by the last iteration, with a full check '
+                             'every N iterations; 0 always checks everything (default: 10)')
+    parser.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                        help='split the checked packages across N dose processes per checker, '
+                             '0 uses all CPUs (default: 1)')
+    parser.add_argument('--checker', choices=('dose', 'builtin'), default='dose',
+                        help='dose runs dose-debcheck/dose-builddebcheck on files written per iteration, '
+                             'builtin checks the in-memory metadata with predose.solver (default: dose)')
+    parser.add_argument('--oneshot', action='store_true',
+                        help='run a baseline check and a single iteration')
+    parser.add_argument('--metadata', metavar='FOLDER',
+                        help='read dists/<prefix>/ metadata under FOLDER, updated with distrotracker')
+    parser.add_argument('--shell', action='store_true',
+                        help='run the backport.sh implementation instead')
+    args = parser.parse_args(argv)
+    if args.jobs <= 0:
+        args.jobs = os.cpu_count() or 1
+    return args
+
+
+def main() -> None:
+    if '--shell' in sys.argv[1:]:
+        sys.exit(run_shell([a for a in sys.argv[1:] if a != '--shell']))
+    args = parse_args()
+    logging.basicConfig(
+        handlers=[logging.FileHandler(f'{args.base_name}.log')],
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s %(message)s',
+    )
+    sys.exit(BackportDriver(args).run(sys.stdin))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -14,8 +14,9 @@ if [ -z "$1" ] || [ "$1" = "--help" ] || [ "$1" = "-h" ]; then
     echo ""
     echo "The script backport expects to find the following metadata files in the current directory:"
     echo "newerprefix_Packages, newerprefix_Sources, olderprefix_Packages, olderprefix_Sources"
-    echo "If --metadata <folder> is given, these files are automatically generated by concatenating"
-    echo "all binary-amd64/Packages and source/Sources files under folder/dists/<prefix>/."
+    echo "Each of them may also be .xz, .gz, .bz2 or .zst compressed, e.g. newerprefix_Packages.xz."
+    echo "If --metadata <folder> is given, all binary-amd64/Packages and source/Sources files"
+    echo "under folder/dists/<prefix>/ are read directly, compressed or not."
     echo ""
     echo "Example: echo gnome-core | backport gnome-core testing stable"
     echo "Example: cat debootstrap.list | backport minimal sid empty"
@@ -83,8 +84,55 @@ if ! command -v dose-builddebcheck &> /dev/null; then
     exit 1
 fi
 
+# comma-separated list of metadata files, pre-dose reads compressed files directly
+find_metadata_files() {
+    local dir="$1"
+    local name="$2"
+    local files
+    files=$(find "$dir" -path "*/$name" -type f | sort | paste -sd,)
+    if [ -z "$files" ]; then
+        files=$(find "$dir" \( -path "*/$name.xz" -o -path "*/$name.gz" -o -path "*/$name.bz2" -o -path "*/$name.zst" \) \
+            -type f | sort | paste -sd,)
+    fi
+    echo "$files"
+}
+
+# metadata file for a prefix, e.g. testing_Packages or testing_Packages.xz
+metadata_for_prefix() {
+    local base="$1"
+    local ext
+    for ext in "" .xz .gz .bz2 .zst; do
+        if [ -f "$base$ext" ]; then
+            echo "$base$ext"
+            return
+        fi
+    done
+    echo "$base"
+}
+
+# stream one or more (compressed) metadata files for tools that read plain text
+catmetadata() {
+    local f
+    for f in ${1//,/ }; do
+        case "$f" in
+            *.gz) zcat "$f" ;;
+            *.xz) xzcat "$f" ;;
+            *.bz2) bzcat "$f" ;;
+            *.zst) zstdcat "$f" ;;
+            *) cat "$f" ;;
+        esac
+        echo ""
+    done
+}
+
+NEWER_PACKAGES=$(metadata_for_prefix "$2_Packages")
+NEWER_SOURCES=$(metadata_for_prefix "$2_Sources")
+OLDER_PACKAGES=$(metadata_for_prefix "$3_Packages")
+OLDER_SOURCES=$(metadata_for_prefix "$3_Sources")
+
 generate_metadata_for_suite() {
     local suite="$1"
+    local newer="$2"
     local suite_dir="$METADATA/dists/$suite"
 
     if [ ! -d "$suite_dir" ]; then
@@ -92,19 +140,29 @@ generate_metadata_for_suite() {
     fi
 
     # Packages (binary-amd64)
-    local packages_file="${suite}_Packages"
-    find "$suite_dir" -path "*/binary-amd64/Packages" -type f -exec cat {} \; > "$packages_file"
-    if [ ! -s "$packages_file" ]; then
+    local packages_files
+    packages_files=$(find_metadata_files "$suite_dir" "binary-amd64/Packages")
+    if [ -z "$packages_files" ]; then
         echo "Warning: No Packages files found for suite '$suite' under $suite_dir"
-        touch "$packages_file"
+        touch "${suite}_Packages"
+        packages_files="${suite}_Packages"
     fi
 
     # Sources
-    local sources_file="${suite}_Sources"
-    find "$suite_dir" -path "*/source/Sources" -type f -exec cat {} \; > "$sources_file"
-    if [ ! -s "$sources_file" ]; then
+    local sources_files
+    sources_files=$(find_metadata_files "$suite_dir" "source/Sources")
+    if [ -z "$sources_files" ]; then
         echo "Warning: No Sources files found for suite '$suite' under $suite_dir"
-        touch "$sources_file"
+        touch "${suite}_Sources"
+        sources_files="${suite}_Sources"
+    fi
+
+    if [ "$suite" = "$newer" ]; then
+        NEWER_PACKAGES="$packages_files"
+        NEWER_SOURCES="$sources_files"
+    else
+        OLDER_PACKAGES="$packages_files"
+        OLDER_SOURCES="$sources_files"
     fi
 }
 
@@ -118,7 +176,7 @@ if [ -n "$METADATA" ]; then
     distrotracker --local-dir "$METADATA" --dist "$2" "$3"
 
     for suite in "$2" "$3"; do
-        generate_metadata_for_suite "$suite" || exit 1
+        generate_metadata_for_suite "$suite" "$2" || exit 1
     done
 fi
 
@@ -146,11 +204,11 @@ if [ "$OPT_ONESHOT" = true ]; then
     echo ""
     echo "Baseline dose-debcheck:"
     dose-debcheck "${EXTRA_PARAMS[@]}" --latest 1 \
-        --deb-native-arch=amd64 -e -f $3_Packages | countgrepunsat | showhead || true
+        --deb-native-arch=amd64 -e -f <(catmetadata "$OLDER_PACKAGES") | countgrepunsat | showhead || true
     echo ""
     echo "Baseline dose-builddebcheck:"
     dose-builddebcheck "${EXTRA_PARAMS[@]}" --latest 1 \
-        --deb-native-arch=amd64 -e -f $3_Packages $3_Sources | countgrepunsat | showhead || true
+        --deb-native-arch=amd64 -e -f <(catmetadata "$OLDER_PACKAGES") <(catmetadata "$OLDER_SOURCES") | countgrepunsat | showhead || true
     echo ""
 fi
 
@@ -160,14 +218,29 @@ counter=0
 
 filename=$(printf "%s.%03d" "$base_name" $counter)
 
+# one pre-dose server keeps all metadata in memory for the whole run
+SOCKET="$(mktemp -u "${TMPDIR:-/tmp}/pre-dose.XXXXXX.sock")"
+python3 $SD/predose.py --log-file $base_name.log --serve "$SOCKET" &
+SERVER_PID=$!
+trap 'python3 $SD/client.py -t 1 "$SOCKET" shutdown > /dev/null 2>&1 || kill $SERVER_PID 2> /dev/null || true' EXIT
+
+pdc() {
+    python3 $SD/client.py "$SOCKET" "$@"
+}
+
+pdc load newer_packages -f "$NEWER_PACKAGES" -S -m -c
+pdc load older_packages -f "$OLDER_PACKAGES" -S -m -c
+pdc load newer_sources -f "$NEWER_SOURCES" -S -m -c
+pdc load target_packages -f "$OLDER_PACKAGES" -S -m -c
+pdc load target_sources -f "$OLDER_SOURCES" -S -m -c
+
 cat > "$filename.bin"
-cat $filename.bin \
-    | python3 $SD/predose.py --log-file $base_name.log --resolve-src -c $2_Packages > $filename.src
+cat $filename.bin | pdc resolve-src newer_packages > $filename.src
 
-echo "" | python3 $SD/predose.py --log-file $base_name.log -c $2_Packages $3_Packages > ${base_name}_Packages
-echo "" | python3 $SD/predose.py --log-file $base_name.log -c $2_Sources $3_Sources > ${base_name}_Sources
+pdc output target_packages --path ${base_name}_Packages
+pdc output target_sources --path ${base_name}_Sources
 
-grep-dctrl -s Package -n '' $2_Packages > ${base_name}.origin.list
+catmetadata "$NEWER_PACKAGES" | grep-dctrl -s Package -n '' > ${base_name}.origin.list
 
 cat -n > ${base_name}.builddebcheck.log.tmp
 
@@ -179,55 +252,42 @@ while true; do
     next_filename=$(printf "%s.%03d" "$base_name" $counter)
 
     # resolve to src on orig and target
-    cat $filename.bin \
-        | python3 $SD/predose.py --log-file $base_name.log --resolve-src -c $2_Packages >> $filename.src
-    cat $filename.bin \
-        | python3 $SD/predose.py --log-file $base_name.log --resolve-src -c $3_Packages >> $filename.src
+    cat $filename.bin | pdc resolve-src newer_packages >> $filename.src
+    cat $filename.bin | pdc resolve-src older_packages >> $filename.src
 
     if [ "$OPT_BINONLY" = false ]; then
     # resolve src to bins on target, remove from target bin
-    cat $filename.src \
-        | python3 $SD/predose.py --log-file $base_name.log --resolve-bin -c ${base_name}_Packages \
-        | python3 $SD/predose.py --log-file $base_name.log --remove -c ${base_name}_Packages > ${base_name}_Packages.tmp && \
-        mv -f ${base_name}_Packages.tmp ${base_name}_Packages
+    cat $filename.src | pdc resolve-bin target_packages | pdc remove target_packages -c
     fi
     # remove without resolve
-    cat $filename.bin \
-        | python3 $SD/predose.py --log-file $base_name.log --remove -c ${base_name}_Packages > ${base_name}_Packages.tmp && \
-        mv -f ${base_name}_Packages.tmp ${base_name}_Packages
+    cat $filename.bin | pdc remove target_packages -c
 
     if [ "$OPT_BINONLY" = false ]; then
-
     # resolve to src on orig, remove from target src
-    cat $filename.src \
-        | python3 $SD/predose.py --log-file $base_name.log --remove -c ${base_name}_Sources > ${base_name}_Sources.tmp && \
-        mv -f ${base_name}_Sources.tmp ${base_name}_Sources
+    cat $filename.src | pdc remove target_sources -c
     fi
 
     if [ "$OPT_REMOVEONLY" = false ]; then # skip all implantations if true
 
     # bin implantation
-    cat $filename.bin \
-        | python3 $SD/predose.py --log-file $base_name.log -c $2_Packages ${base_name}_Packages > ${base_name}_Packages.tmp && \
-        mv -f ${base_name}_Packages.tmp ${base_name}_Packages
+    cat $filename.bin | pdc backport target_packages -o newer_packages -c
 
     # all-bin implantation
     if [ "$OPT_ONLYUNSAT" = false ]; then
-    cat $filename.src \
-        | python3 $SD/predose.py --log-file $base_name.log --resolve-bin -c $2_Packages \
-        | python3 $SD/predose.py --log-file $base_name.log -c $2_Packages ${base_name}_Packages > ${base_name}_Packages.tmp && \
-        mv -f ${base_name}_Packages.tmp ${base_name}_Packages
+    cat $filename.src | pdc resolve-bin newer_packages | pdc backport target_packages -o newer_packages -c
     fi
 
     if [ "$OPT_BINONLY" = false ]; then
     # src implantation
-    cat $filename.src \
-        | python3 $SD/predose.py --log-file $base_name.log -c $2_Sources ${base_name}_Sources > ${base_name}_Sources.tmp && \
-        mv -f ${base_name}_Sources.tmp ${base_name}_Sources
+    cat $filename.src | pdc backport target_sources -o newer_sources -c
     fi
 
     fi # removeonly
 
+    # write only the files dose reads
+    pdc output target_packages --path ${base_name}_Packages
+    pdc output target_sources --path ${base_name}_Sources
+
     echo -n > $next_filename.bin
     echo -n > $next_filename.src
 
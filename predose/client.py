@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Thin client for a pre-dose server started with `pre-dose --serve SOCKET`.
+
+Only the standard library is imported, so a call costs interpreter startup
+and a round trip instead of an apt_pkg import and a metadata parse.
+
+Example:
+    pre-dose --serve /tmp/pd.sock &
+    predose-client /tmp/pd.sock load newer --files testing_Packages.xz --latest
+    echo bash | predose-client /tmp/pd.sock resolve-src newer
+"""
+
+import argparse
+import json
+import socket
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+# Operations that read package names from stdin
+PACKAGE_OPS = ('resolve-src', 'resolve-bin', 'resolve-group', 'remove', 'backport', 'toposort',
+               'depends', 'rdepends', 'add-version')
+
+
+def connect(socket_path: str, timeout: float = 30.0) -> socket.socket:
+    """Connect to the server, waiting up to timeout seconds for it to start."""
+    deadline = time.monotonic() + timeout
+    while True:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(socket_path)
+            return sock
+        except (FileNotFoundError, ConnectionRefusedError):
+            sock.close()
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.05)
+
+
+def request(socket_path: str, payload: Dict[str, Any], timeout: float = 30.0) -> Any:
+    """Send one request and return its result, raise RuntimeError on server errors."""
+    with connect(socket_path, timeout) as sock:
+        sock.sendall(json.dumps(payload).encode() + b'\n')
+        with sock.makefile('rb') as f:
+            line = f.readline()
+    if not line:
+        raise RuntimeError('Server closed the connection')
+    response = json.loads(line)
+    if not response.get('ok'):
+        raise RuntimeError(response.get('error', 'unknown error'))
+    return response.get('result')
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Send a request to a pre-dose server, package names are read from stdin.',
+    )
+    parser.add_argument('socket', metavar='SOCKET', help='server Unix socket')
+    parser.add_argument('op', choices=('load', 'drop', 'shutdown', 'output', 'build-order') + PACKAGE_OPS,
+                        help='operation')
+    parser.add_argument('set', metavar='SET', nargs='?',
+                        help='name of the metadata set, the target for backport')
+    parser.add_argument('-f', '--files',
+                        help='load: comma-separated metadata files')
+    parser.add_argument('-p', '--provide',
+                        help='load: binary Packages metadata for source implantation')
+    parser.add_argument('-o', '--origin', metavar='SET',
+                        help='backport: origin metadata set')
+    parser.add_argument('-c', '--latest', action='store_true',
+                        help='keep only the latest versions of packages')
+    parser.add_argument('-C', '--latest-src', action='store_true',
+                        help='load: keep only packages built from the latest source versions')
+    parser.add_argument('-m', '--mmap', action='store_true',
+                        help='load: keep stanza offsets instead of text')
+    parser.add_argument('-S', '--snapshot', action='store_true',
+                        help='load: use a binary snapshot next to the first file')
+    parser.add_argument('--profiles', metavar='LIST',
+                        help='load: comma-separated active build profiles (default: the server default)')
+    parser.add_argument('-a', '--add-version', action='store_true',
+                        help='resolve: add version to output')
+    parser.add_argument('-A', '--all-versions', action='store_true',
+                        help='add-version: print every version of the package')
+    parser.add_argument('-e', '--depth', type=int,
+                        help='depends, rdepends: dependency depth (default: 1)')
+    parser.add_argument('--with-depth', action='store_true',
+                        help='depends: print (depth, package) tuples')
+    parser.add_argument('--path',
+                        help='output: file to write the metadata set to')
+    parser.add_argument('-g', '--dot',
+                        help='toposort, build-order: save graph to dot file')
+    parser.add_argument('-t', '--timeout', type=float, default=30.0,
+                        help='seconds to wait for the server to accept connections (default: 30)')
+    args = parser.parse_args(argv)
+    if args.op not in ('shutdown',) and not args.set:
+        parser.error(f'{args.op} requires SET')
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    payload: Dict[str, Any] = {'op': args.op}
+    for key in ('set', 'files', 'provide', 'origin', 'latest', 'latest_src', 'mmap',
+                'snapshot', 'add_version', 'all_versions', 'depth', 'with_depth', 'path', 'dot'):
+        value = getattr(args, key)
+        if value:
+            payload[key] = value
+    if args.profiles is not None:
+        payload['profiles'] = [p for p in args.profiles.split(',') if p]
+    if args.op in PACKAGE_OPS:
+        payload['packages'] = [line.strip() for line in sys.stdin if line.strip()]
+
+    try:
+        result = request(args.socket, payload, args.timeout)
+    except (OSError, RuntimeError) as e:
+        print(f'predose-client: {args.op}: {e}', file=sys.stderr)
+        sys.exit(1)
+
+    if isinstance(result, list):
+        for line in result:
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,25 +2,121 @@
 
 import re
 import argparse
+import bz2
+import gzip
+import io
+import hashlib
+import json
+import lzma
+import mmap
+import os
+import pickle
+import socketserver
 import sys
 import logging
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple, Set, Any, NamedTuple
+from array import array
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import IO, BinaryIO, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Set, Any, NamedTuple, Union
 
 import apt_pkg
-from toposort import Node, StableTopoSort
+from toposort import StableTopoSort
 
 apt_pkg.init_system()
 
 
-@dataclass
+class MappedFile:
+    """Metadata file that is memory-mapped on first access to a stanza."""
+
+    def __init__(self, filepath: str) -> None:
+        self.filepath = filepath
+        self._mmap: Optional[mmap.mmap] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {'filepath': self.filepath, '_mmap': None}
+
+    def read(self, offset: int, length: int) -> bytes:
+        if self._mmap is None:
+            with open(self.filepath, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap[offset:offset + length]
+
+
+class StanzaRef(NamedTuple):
+    file: MappedFile
+    offset: int
+    length: int
+
+    def read(self) -> bytes:
+        return self.file.read(self.offset, self.length)
+
+
+class NameTable:
+    """Interned package names, shared by all Metadata objects of the process."""
+
+    def __init__(self) -> None:
+        self.names: List[str] = []
+        self.ids: Dict[str, int] = {}
+
+    def id(self, name: str) -> int:
+        i = self.ids.get(name)
+        if i is None:
+            i = len(self.names)
+            self.ids[name] = i
+            self.names.append(name)
+        return i
+
+    def intern(self, name: str) -> str:
+        return self.names[self.id(name)]
+
+    def merge(self, names: List[str]) -> Optional[array]:
+        """Adopt names of another table, return an id remap unless ids are unchanged."""
+        common = min(len(self.names), len(names))
+        if self.names[:common] == names[:common]:
+            for name in names[common:]:
+                self.ids[name] = len(self.names)
+                self.names.append(name)
+            return None
+        return array('i', (self.id(name) for name in names))
+
+
+NAMES = NameTable()
+
+
+@dataclass(slots=True)
 class PackageEntry:
     package: str
     version: str
-    block: str
-    depends: List[str]
+    block: Optional[str]
+    dep_ids: array
     source: str
     source_version: str
+    ref: Optional[StanzaRef] = None
+    # Relation fields encoded by _append_relations
+    rel_ids: array = field(default_factory=lambda: array('i'))
+
+    @property
+    def depends(self) -> List[str]:
+        names = NAMES.names
+        return [names[i] for i in self.dep_ids]
+
+    def relations(self, field_name: str) -> List[Tuple['Relation', ...]]:
+        """OR-groups of a relation field, e.g. relations('Depends'), parsed at load."""
+        wanted = RELATION_FIELDS.index(field_name)
+        for field_index, groups in decode_relations(self.rel_ids):
+            if field_index == wanted:
+                return groups
+        return []
+
+    def get_block(self) -> str:
+        if self.ref is not None:
+            return self.ref.read().decode('utf-8')
+        return self.block
+
+    def get_block_bytes(self) -> bytes:
+        if self.ref is not None:
+            return self.ref.read()
+        return self.block.encode('utf-8')
 
 
 class PkgKey(NamedTuple):
@@ -31,6 +127,318 @@ class PkgKey(NamedTuple):
         return f'{self.package}{"=" if self.version != "" else ""}{self.version}'
 
 
+def _open_zst(filepath: str) -> IO[str]:
+    try:
+        from compression import zstd  # Python 3.14+
+        return zstd.open(filepath, 'rt', encoding='utf-8')
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(f'Reading {filepath} requires Python 3.14+ or the zstandard module')
+    reader = zstandard.ZstdDecompressor().stream_reader(open(filepath, 'rb'), closefd=True)
+    return io.TextIOWrapper(reader, encoding='utf-8')
+
+
+_DECOMPRESSORS = {
+    '.gz': lambda p: gzip.open(p, 'rt', encoding='utf-8'),
+    '.xz': lambda p: lzma.open(p, 'rt', encoding='utf-8'),
+    '.bz2': lambda p: bz2.open(p, 'rt', encoding='utf-8'),
+    '.zst': _open_zst,
+}
+
+
+def is_compressed(filepath: str) -> bool:
+    return str(filepath).endswith(tuple(_DECOMPRESSORS))
+
+
+def open_metadata(filepath: str) -> IO[str]:
+    """Open a plain or compressed Packages/Sources file for streaming reads."""
+    filepath = str(filepath)
+    for ext, open_func in _DECOMPRESSORS.items():
+        if filepath.endswith(ext):
+            return open_func(filepath)
+    return open(filepath, 'rt', encoding='utf-8')
+
+
+def split_paths(value: str) -> List[str]:
+    """Split a comma-separated CLI list of metadata files."""
+    return [p for p in value.split(',') if p]
+
+
+def iter_stanzas(f: Iterable[str]) -> Iterator[str]:
+    """Yield deb822 stanzas one at a time, without holding the whole file."""
+    lines: List[str] = []
+    for line in f:
+        if line.strip():
+            lines.append(line)
+        elif lines:
+            yield ''.join(lines).rstrip('\n')
+            lines = []
+    if lines:
+        yield ''.join(lines).rstrip('\n')
+
+
+def iter_stanza_offsets(f: Iterable[bytes]) -> Iterator[Tuple[int, int, str]]:
+    """Yield (offset, length, text) of each stanza read from a binary file handle."""
+    lines: List[bytes] = []
+    pos = start = 0
+    for line in f:
+        if line.strip():
+            if not lines:
+                start = pos
+            lines.append(line)
+        elif lines:
+            data = b''.join(lines).rstrip(b'\n')
+            yield start, len(data), data.decode('utf-8')
+            lines = []
+        pos += len(line)
+    if lines:
+        data = b''.join(lines).rstrip(b'\n')
+        yield start, len(data), data.decode('utf-8')
+
+
+SNAPSHOT_SUFFIX = '.predose'
+SNAPSHOT_FORMAT = 4
+
+
+def _snapshot_path(filepaths: List[str], offsets: bool) -> str:
+    return f'{filepaths[0]}{".mmap" if offsets else ""}{SNAPSHOT_SUFFIX}'
+
+
+def _snapshot_key(filepaths: List[str], offsets: bool, profiles: Iterable[str] = (),
+                  parser: str = 'python') -> Dict[str, Any]:
+    files = []
+    for path in filepaths:
+        st = os.stat(path)
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            digest.update(f.read(65536))
+            if st.st_size > 65536:
+                f.seek(max(65536, st.st_size - 65536))
+                digest.update(f.read())
+        files.append((os.path.abspath(path), st.st_size, st.st_mtime_ns, digest.hexdigest()))
+    return {'format': SNAPSHOT_FORMAT, 'offsets': offsets, 'parser': parser, 'profiles': sorted(profiles),
+            'files': files}
+
+
+DEPENDS_FIELDS = ('Build-Depends', 'Build-Depends-Indep', 'Build-Depends-Arch', 'Depends', 'Pre-Depends')
+# Fields kept in PackageEntry.rel_ids
+RELATION_FIELDS = DEPENDS_FIELDS + ('Conflicts', 'Breaks', 'Build-Conflicts', 'Build-Conflicts-Indep',
+                                    'Build-Conflicts-Arch', 'Provides')
+# Build profiles active when dependencies are reduced to dep_ids: test and documentation
+# dependencies are left out of depends, rdepends and toposort
+DEFAULT_PROFILES = ('nocheck', 'nodoc')
+
+
+def split_fields(block: str) -> Dict[str, str]:
+    """Field values of a stanza, continuation lines are joined only after a trailing comma."""
+    fields: Dict[str, str] = {}
+    block_list: List[str] = []
+
+    for line in block.splitlines():
+        if block_list and block_list[-1].endswith(',') and line and line[0].isspace():
+            block_list[-1] += line.rstrip()
+        elif line:
+            block_list.append(line.rstrip())
+
+    for line in block_list:
+        if not line or line[0].isspace() or ':' not in line:
+            continue
+        key, value = line.split(':', 1)
+        fields[key] = value.strip()
+
+    return fields
+
+
+class Relation(NamedTuple):
+    """One alternative of a package relation, e.g. foo:any (>= 1.0) [amd64] <!nocheck>."""
+    name: str
+    arch_qualifier: str = ''
+    op: str = ''
+    version: str = ''
+    archs: Tuple[str, ...] = ()
+    profiles: Tuple[Tuple[str, ...], ...] = ()
+
+    def __str__(self) -> str:
+        out = self.name
+        if self.arch_qualifier:
+            out += f':{self.arch_qualifier}'
+        if self.op:
+            out += f' ({self.op} {self.version})'
+        if self.archs:
+            out += f' [{" ".join(self.archs)}]'
+        for terms in self.profiles:
+            out += f' <{" ".join(terms)}>'
+        return out
+
+
+_RELATION = re.compile(
+    r'^(?P<name>[^\s:(\[<]+)(?::(?P<qual>[^\s(\[<]+))?\s*'
+    r'(?:\(\s*(?P<op><<|<=|>=|>>|=|<|>)\s*(?P<version>[^\s)]+)\s*\))?\s*'
+    r'(?:\[(?P<archs>[^\]]*)\])?\s*(?P<profiles>(?:<[^>]*>\s*)*)$'
+)
+# Obsolete spellings of << and >>
+_LEGACY_OPS = {'<': '<=', '>': '>='}
+
+
+# Entries of the relation parse caches; they only speed up loading, the
+# parsed relations are kept encoded in PackageEntry.rel_ids
+PARSE_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_alternative(text: str) -> Optional[Relation]:
+    m = _RELATION.match(text)
+    if m is None:
+        return None
+    op = m.group('op') or ''
+    return Relation(
+        name=sys.intern(m.group('name')),
+        arch_qualifier=m.group('qual') or '',
+        op=_LEGACY_OPS.get(op, op),
+        version=m.group('version') or '',
+        archs=tuple(m.group('archs').split()) if m.group('archs') else (),
+        profiles=tuple(tuple(t.split()) for t in re.findall(r'<([^>]*)>', m.group('profiles'))),
+    )
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_group(text: str) -> Tuple[Relation, ...]:
+    alternatives = []
+    for alt in text.split('|'):
+        alt = alt.strip()
+        relation = _parse_alternative(alt)
+        if relation is None:
+            if alt:
+                logging.debug(f'Can not parse relation: {alt}')
+            continue
+        alternatives.append(relation)
+    return tuple(alternatives)
+
+
+def parse_relations(value: str) -> List[Tuple[Relation, ...]]:
+    """Parse a Depends-like field into OR-groups of relations."""
+    groups: List[Tuple[Relation, ...]] = []
+    for group in value.split(','):
+        alternatives = _parse_group(group.strip())
+        if alternatives:
+            groups.append(alternatives)
+    return groups
+
+
+# Interned version strings of relations, shared by all Metadata objects of the process
+VERSIONS = NameTable()
+# Interned (op, arch_qualifier, archs, profiles) of relations, most relations
+# share one of a few shapes; id 0 is a relation without any
+SHAPES = NameTable()
+SHAPES.id(('', '', (), ()))
+
+
+def _append_relations(out: array, field_index: int, groups: Sequence[Tuple[Relation, ...]]) -> None:
+    """Encode a field as its index, the group count, then per group the
+    number of alternatives followed by their name id in NAMES, version id
+    in VERSIONS and shape id in SHAPES."""
+    out.extend((field_index, len(groups)))
+    for group in groups:
+        out.append(len(group))
+        for r in group:
+            out.extend((NAMES.id(r.name), VERSIONS.id(r.version),
+                        SHAPES.id((r.op, r.arch_qualifier, r.archs, r.profiles))))
+
+
+def decode_relations(rel_ids: array) -> Iterator[Tuple[int, List[Tuple[Relation, ...]]]]:
+    """Yield (index into RELATION_FIELDS, OR-groups) of encoded relations."""
+    names, versions, shapes = NAMES.names, VERSIONS.names, SHAPES.names
+    i, n = 0, len(rel_ids)
+    while i < n:
+        field_index, count = rel_ids[i], rel_ids[i + 1]
+        i += 2
+        groups = []
+        for _ in range(count):
+            end = i + 1 + 3 * rel_ids[i]
+            group = []
+            for j in range(i + 1, end, 3):
+                op, qualifier, archs, profiles = shapes[rel_ids[j + 2]]
+                group.append(Relation(names[rel_ids[j]], qualifier, op, versions[rel_ids[j + 1]], archs, profiles))
+            groups.append(tuple(group))
+            i = end
+        yield field_index, groups
+
+
+def _remap_relations(rel_ids: array, remaps: Sequence[Optional[array]]) -> array:
+    """Apply the name, version and shape id remaps of NameTable.merge, None keeps the ids."""
+    out = array('i', rel_ids)
+    i, n = 0, len(out)
+    while i < n:
+        count = out[i + 1]
+        i += 2
+        for _ in range(count):
+            end = i + 1 + 3 * out[i]
+            for j in range(i + 1, end, 3):
+                for k, remap in enumerate(remaps):
+                    if remap is not None:
+                        out[j + k] = remap[out[j + k]]
+            i = end
+    return out
+
+
+def arch_matches(arch: str, pattern: str) -> bool:
+    """Debian architecture wildcard match, e.g. amd64 matches any, linux-any and any-amd64."""
+    if pattern in (arch, 'any', 'linux-any'):
+        return True
+    return pattern == f'any-{arch}'
+
+
+def relation_applies(relation: Relation, arch: Optional[str] = 'amd64', profiles: Iterable[str] = ()) -> bool:
+    """Whether architecture and build profile restrictions keep the relation, arch None ignores them."""
+    if relation.archs and arch is not None:
+        negated = [a[1:] for a in relation.archs if a.startswith('!')]
+        if negated:
+            if any(arch_matches(arch, a) for a in negated):
+                return False
+        elif not any(arch_matches(arch, a) for a in relation.archs):
+            return False
+    if relation.profiles:
+        active = set(profiles)
+        return any(all((t[1:] not in active) if t.startswith('!') else (t in active) for t in terms)
+                   for terms in relation.profiles)
+    return True
+
+
+def iter_tagfile(filepath: str) -> Iterator[Tuple[Any, str]]:
+    """Yield (fields, text) of each stanza parsed by the C++ apt_pkg.TagFile.
+
+    TagFile folds a line without a colon into the name of the next field,
+    so such a stanza gets its fields from split_fields instead.
+    """
+    os.stat(filepath)
+    for section in apt_pkg.TagFile(str(filepath)):
+        block = str(section).rstrip('\n')
+        if any('\n' in key for key in section.keys()):
+            logging.debug(f'Line without a colon, using the Python parser: {block.splitlines()[0]}')
+            yield split_fields(block), block
+        else:
+            yield section, block
+
+
+def has_tagfile() -> bool:
+    return hasattr(apt_pkg, 'TagFile')
+
+
+def _version_position(keys: Sequence[PkgKey], version: str) -> int:
+    """Leftmost position to insert version into keys sorted by Debian version."""
+    lo, hi = 0, len(keys)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if apt_pkg.version_compare(keys[mid].version, version) < 0:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
 def _format_key(key: PkgKey, add_version: bool = True) -> str:
     if not isinstance(key, PkgKey): return ""
     if add_version:
@@ -42,8 +450,15 @@ def _format_key(key: PkgKey, add_version: bool = True) -> str:
 class Metadata:
     """Parsed Debian repository metadata (Sources or Packages)."""
 
-    def __init__(self) -> None:
+    # Derived indexes built on first use; not stored in snapshots
+    _LAZY_INDEXES = ('_group_index', '_versions_index', '_rdepends_index')
+
+    def __init__(self, offsets: bool = False, parser: str = 'python',
+                 profiles: Iterable[str] = DEFAULT_PROFILES) -> None:
         self.filepath: str = ""
+        self.offsets: bool = offsets
+        self.parser: str = parser
+        self.profiles: Tuple[str, ...] = tuple(profiles)
         self.is_bin: bool = True
         self.packages: Dict[PkgKey, PackageEntry] = {}
         self.src_dict: Dict[str, PkgKey] = {}
@@ -51,124 +466,297 @@ class Metadata:
         self.prov_dict: Dict[str, str | None] = {}
         self.latest_index: Dict[str, PkgKey] = {}
         self.latest_src: Dict[str, PkgKey] = {}
+        self._group_index: Optional[Dict[PkgKey, List[PkgKey]]] = None
+        self._versions_index: Optional[Dict[str, List[PkgKey]]] = None
+        self._rdepends_index: Optional[Dict[int, List[PkgKey]]] = None
+        # Built on first use like the lazy indexes, but kept in snapshots and updated in place
+        self._source_graph: Optional[Dict[str, Set[str]]] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        for name in self._LAZY_INDEXES:
+            state.pop(name, None)
+        state['_names'] = NAMES.names
+        state['_versions'] = VERSIONS.names
+        state['_shapes'] = SHAPES.names
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        names = state.pop('_names')
+        versions = state.pop('_versions')
+        shapes = state.pop('_shapes')
+        self.__dict__.update(state)
+        for name in self._LAZY_INDEXES:
+            setattr(self, name, None)
+        remaps = (NAMES.merge(names), VERSIONS.merge(versions), SHAPES.merge(shapes))
+        if remaps[0] is not None:
+            for entry in self.packages.values():
+                entry.dep_ids = array('i', (remaps[0][i] for i in entry.dep_ids))
+        if remaps != (None, None, None):
+            for entry in self.packages.values():
+                entry.rel_ids = _remap_relations(entry.rel_ids, remaps)
 
     @classmethod
-    def from_file(cls, filepath: str) -> 'Metadata':
-        meta = cls()
-        meta._parse(filepath)
+    def from_file(cls, filepath: Union[str, Sequence[str]], offsets: bool = False,
+                  snapshot: bool = False, parser: str = 'python',
+                  profiles: Iterable[str] = DEFAULT_PROFILES) -> 'Metadata':
+        """Parse one file or several files that together form one repository.
+
+        With offsets=True entries keep the position of their stanza in the
+        (uncompressed) source file instead of its text, output_blocks copies
+        the bytes back from the memory-mapped file.
+
+        With snapshot=True the parsed result is pickled next to the first
+        file and reused while size, mtime and content hash of the files match.
+
+        The parser is 'python', 'apt' (apt_pkg.TagFile) or 'auto', which uses
+        apt_pkg.TagFile when available. Stanzas with a line without a colon
+        are parsed with Python either way. Offsets mode always uses Python.
+
+        Relations guarded by build profiles are left out of dep_ids unless
+        they apply with profiles active, entries keep all relations.
+        """
+        filepaths = [str(p) for p in filepath] if isinstance(filepath, (list, tuple)) else [str(filepath)]
+        profiles = tuple(profiles)
+        if snapshot:
+            key = _snapshot_key(filepaths, offsets, profiles, parser)
+            meta = cls._load_snapshot(_snapshot_path(filepaths, offsets), key)
+            if meta is not None:
+                return meta
+        meta = cls(offsets, parser, profiles)
+        for path in filepaths:
+            meta._parse(path)
+        meta.filepath = ','.join(filepaths)
+        if snapshot:
+            if not meta.is_bin:
+                meta.source_graph()
+            meta._save_snapshot(_snapshot_path(filepaths, offsets), key)
         return meta
 
-    def _parse(self, filepath: str) -> None:
-
-        with open(filepath, 'rt', encoding='utf-8') as f:
-            content = f.read()
-            blocks = re.split(r'\n\n+', content.strip())
-            self.filepath = filepath
+    @classmethod
+    def _load_snapshot(cls, snapshot_path: str, key: Dict[str, Any]) -> Optional['Metadata']:
+        try:
+            with open(snapshot_path, 'rb') as f:
+                if pickle.load(f) != key:
+                    logging.debug(f'Snapshot is outdated: {snapshot_path}')
+                    return None
+                meta = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+            logging.warning(f'Can not load snapshot {snapshot_path}: {e}')
+            return None
+        logging.debug(f'Loaded {len(meta.packages)} packages from snapshot {snapshot_path}')
+        return meta
 
-        for block in blocks:
-            if not block.strip():
-                continue
+    def _save_snapshot(self, snapshot_path: str, key: Dict[str, Any]) -> None:
+        tmp_path = f'{snapshot_path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(key, f, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, snapshot_path)
+            logging.debug(f'Saved snapshot {snapshot_path}')
+        except OSError as e:
+            logging.warning(f'Can not save snapshot {snapshot_path}: {e}')
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
 
-            package = version = source = source_version = ""
-            depends: List[str] = []
-            bin_pkgs: List[PkgKey] = []
-            block_list: List[str] = []
+    def _parse(self, filepath: str) -> None:
 
-            for line in block.splitlines():
-                if block_list and block_list[-1].endswith(',') and line and line[0].isspace():
-                    block_list[-1] += line.rstrip()
-                elif line:
-                    block_list.append(line.rstrip())
+        self.filepath = filepath
+        if self.offsets and not is_compressed(filepath):
+            mapped = MappedFile(os.path.abspath(filepath))
+            with open(filepath, 'rb') as f:
+                for offset, length, block in iter_stanza_offsets(f):
+                    self._add_block(block, StanzaRef(mapped, offset, length))
+        else:
+            if self.offsets:
+                logging.debug(f'Compressed file can not be memory-mapped, keeping stanza text: {filepath}')
+            if self.parser == 'apt' or (self.parser == 'auto' and has_tagfile()):
+                if has_tagfile():
+                    for fields, block in iter_tagfile(filepath):
+                        self._add_fields(fields, block)
+                    logging.debug(f'Parsed {len(self.packages)} packages from {filepath} with apt_pkg.TagFile')
+                    return
+                logging.warning('apt_pkg.TagFile is not available, using the Python parser')
+            with open_metadata(filepath) as f:
+                for block in iter_stanzas(f):
+                    self._add_block(block)
 
-            for line in block_list:
-                if not line or line[0].isspace() or ':' not in line:
-                    continue
+        logging.debug(f'Parsed {len(self.packages)} packages from {filepath}')
 
-                key, value = line.split(':', 1)
-                value = value.strip()
-
-                if key == 'Package':
-                    package = value
-                elif key == 'Binary':
-                    self.is_bin = False
-                    bin_pkgs = [PkgKey(p.strip(), '') for p in value.split(',')]
-                elif key == 'Source':
-                    source_line = value.strip().split()
-                    if len(source_line) > 0:
-                        source = source_line[0]
-                        if len(source_line) > 1: source_version = re.findall(r'\((.*?)\)', source_line[1])[0]
-                elif key == 'Provides':
-                    prov_pkgs = [p.strip().split()[0] for p in value.split(',')]
-                    for p in prov_pkgs:
-                        self.prov_dict[p] = package
-                elif key == 'Version':
-                    version = value
-                elif key in ('Build-Depends', 'Build-Depends-Indep', 'Build-Depends-Arch',
-                             'Depends', 'Pre-Depends'):
-                    deps_pkgs = [p.strip() for p in value.split(',') if p.strip()]
-                    for p in deps_pkgs:
-                        dep_name = p.split()[0].split(":")[0]
-                        if dep_name == package:
-                            logging.debug(
-                                f'Package depends on itself, excluded: {package}'
-                            )
-                            continue
-                        if any(profile in p for profile in ("<!nocheck>", "<!nodoc>")):
-                            logging.debug(
-                                f'Dependency with profiles, excluded: {package}: {p}'
-                            )
-                            continue
-                        depends.append(dep_name)
-
-            if not package:
+    def _add_block(self, block: str, ref: Optional[StanzaRef] = None) -> None:
+        self._add_fields(split_fields(block), block, ref)
+
+    def _add_fields(self, fields: Mapping[str, str], block: str, ref: Optional[StanzaRef] = None) -> None:
+        package = version = source = source_version = ""
+        depends: List[int] = []
+        bin_pkgs: List[PkgKey] = []
+
+        value = fields.get('Package')
+        if value:
+            package = NAMES.intern(value.strip())
+        value = fields.get('Version')
+        if value:
+            version = sys.intern(value.strip())
+        value = fields.get('Binary')
+        if value is not None:
+            self.is_bin = False
+            bin_pkgs = [PkgKey(NAMES.intern(p.strip()), '') for p in value.split(',')]
+        value = fields.get('Source')
+        if value:
+            source_line = value.strip().split()
+            if len(source_line) > 0:
+                source = NAMES.intern(source_line[0])
+                if len(source_line) > 1: source_version = sys.intern(re.findall(r'\((.*?)\)', source_line[1])[0])
+        value = fields.get('Provides')
+        if value:
+            prov_pkgs = [p.strip().split()[0] for p in value.split(',') if p.strip()]
+            for p in prov_pkgs:
+                self.prov_dict[NAMES.intern(p)] = package
+        rel_ids = array('i')
+        for field_index, name in enumerate(RELATION_FIELDS):
+            value = fields.get(name)
+            groups = parse_relations(value) if value else None
+            if not groups:
                 continue
-
-            if not source: source = package
-            if not source_version: source_version = version
-            pkg_key = PkgKey(package, version)
-            src_key = PkgKey(source, source_version)
-
-            if pkg_key in self.packages:
-                logging.warning(f'Duplicate package detected: {pkg_key}')
+            _append_relations(rel_ids, field_index, groups)
+            if name not in DEPENDS_FIELDS:
                 continue
+            for group in groups:
+                relation = group[0]
+                if relation.profiles or relation.archs:
+                    relation = next((r for r in group if relation_applies(r, None, self.profiles)), None)
+                if relation is None:
+                    logging.debug(f'Dependency with profiles, excluded: {package}: {" | ".join(map(str, group))}')
+                    continue
+                if relation.name == package:
+                    logging.debug(
+                        f'Package depends on itself, excluded: {package}'
+                    )
+                    continue
+                depends.append(NAMES.id(relation.name))
 
-            if self.is_bin:
-                bin_pkgs = [pkg_key]
-
-            if src_key not in self.bin_dict:
-                self.bin_dict[src_key] = bin_pkgs
-            else:
-                self.bin_dict[src_key].extend(bin_pkgs)
+        if not package:
+            return
 
-            for p in bin_pkgs:
-                self.src_dict[p] = src_key
+        if not source: source = package
+        if not source_version: source_version = version
+        pkg_key = PkgKey(package, version)
+        src_key = PkgKey(source, source_version)
 
-            self.packages[pkg_key] = PackageEntry(
-                package=package,
-                version=version,
-                block=block,
-                depends=depends,
-                source=source,
-                source_version=source_version,
-            )
+        if pkg_key in self.packages:
+            logging.warning(f'Duplicate package detected: {pkg_key}')
+            return
 
-            latest = self.latest_index.get(package)
-            if latest is None or apt_pkg.version_compare(version, latest.version) > 0:
-                self.latest_index[package] = pkg_key
+        if self.is_bin:
+            bin_pkgs = [pkg_key]
 
-            latest = self.latest_src.get(source)
-            if latest is None or apt_pkg.version_compare(source_version, latest.version) > 0:
-                self.latest_src[source] = src_key
+        if src_key not in self.bin_dict:
+            self.bin_dict[src_key] = bin_pkgs
+        else:
+            self.bin_dict[src_key].extend(bin_pkgs)
+
+        for p in bin_pkgs:
+            self.src_dict[p] = src_key
+
+        self.packages[pkg_key] = PackageEntry(
+            package=package,
+            version=version,
+            block=block if ref is None else None,
+            dep_ids=array('i', depends),
+            source=source,
+            source_version=source_version,
+            ref=ref,
+            rel_ids=rel_ids,
+        )
 
-        logging.debug(f'Parsed {len(self.packages)} packages from {filepath}')
+        latest = self.latest_index.get(package)
+        if latest is None or apt_pkg.version_compare(version, latest.version) > 0:
+            self.latest_index[package] = pkg_key
+
+        latest = self.latest_src.get(source)
+        if latest is None or apt_pkg.version_compare(source_version, latest.version) > 0:
+            self.latest_src[source] = src_key
+
+    def _link(self, pkg_key: PkgKey, entry: PackageEntry, bin_pkgs: Sequence[PkgKey] = ()) -> None:
+        """Register a new entry in src_dict, bin_dict and the lazy indexes."""
+        src_key = PkgKey(entry.source, entry.source_version)
+        if self._versions_index is not None:
+            keys = self._versions_index.setdefault(pkg_key.package, [])
+            keys.insert(_version_position(keys, pkg_key.version), pkg_key)
+        if self._rdepends_index is not None:
+            for dep_id in set(entry.dep_ids):
+                self._rdepends_index.setdefault(dep_id, []).append(pkg_key)
+        if self.is_bin:
+            bin_pkgs = [pkg_key]
+        group = self.bin_dict.setdefault(src_key, [])
+        for p in bin_pkgs:
+            if p in group:
+                continue
+            group.append(p)
+            self.src_dict[p] = src_key
+            if self._group_index is not None:
+                src_keys = self._group_index.setdefault(p, [])
+                if src_key not in src_keys:
+                    src_keys.append(src_key)
+
+    def _unlink(self, pkg_key: PkgKey, entry: PackageEntry) -> None:
+        """Drop a removed entry from src_dict, bin_dict, latest_index and the lazy indexes."""
+        src_key = PkgKey(entry.source, entry.source_version)
+        keys = self.versions_index().get(pkg_key.package, [])
+        if pkg_key in keys:
+            keys.remove(pkg_key)
+        if keys:
+            self.latest_index[pkg_key.package] = keys[-1]
+        else:
+            self.versions_index().pop(pkg_key.package, None)
+            self.latest_index.pop(pkg_key.package, None)
+        if self._rdepends_index is not None:
+            for dep_id in set(entry.dep_ids):
+                rdeps = self._rdepends_index.get(dep_id)
+                if rdeps and pkg_key in rdeps:
+                    rdeps.remove(pkg_key)
+        group = self.bin_dict.get(src_key)
+        if group is None:
+            return
+        if self.is_bin:
+            if pkg_key in group:
+                group.remove(pkg_key)
+            bin_pkgs = [pkg_key]
+            if not group:
+                del self.bin_dict[src_key]
+        else:
+            bin_pkgs = self.bin_dict.pop(src_key)
+        index = self.group_index()
+        for p in bin_pkgs:
+            src_keys = index.get(p, [])
+            if src_key in src_keys:
+                src_keys.remove(src_key)
+            if src_keys:
+                self.src_dict[p] = src_keys[-1]
+            else:
+                index.pop(p, None)
+                self.src_dict.pop(p, None)
+
+    def _drop(self, keys: List[PkgKey]) -> None:
+        if not keys:
+            return
+        # Rebuilding is cheaper than editing long reverse dependency lists one by one
+        self._rdepends_index = None
+        binaries = [b for k in keys for b in self._linked_binaries(k)]
+        for k in keys:
+            self._unlink(k, self.packages.pop(k))
+        self._update_source_graph({k.package for k in keys}, binaries)
 
     def keep_latest(self):
         latest_set = set(self.latest_index.values())
-        self.packages = {k: v for k, v in self.packages.items() if k in latest_set}
+        self._drop([k for k in self.packages if k not in latest_set])
 
     def keep_latest_src(self):
         latest_set = set(self.latest_src.values())
-        self.packages = {k: v for k, v in self.packages.items() if (v.source, v.source_version) in latest_set}
+        self._drop([k for k, v in self.packages.items() if (v.source, v.source_version) not in latest_set])
 
     def resolve_src(self, pkg_key: PkgKey, add_version: bool = False) -> str:
         if self.is_bin:
@@ -182,48 +770,156 @@ class Metadata:
         out = '\n'.join(_format_key(k, add_version) for k in self.bin_dict.get(pkg_key, []))
         return out
 
+    def group_index(self) -> Dict[PkgKey, List[PkgKey]]:
+        """Binary key -> source keys whose group lists it, in bin_dict order."""
+        if self._group_index is None:
+            index: Dict[PkgKey, List[PkgKey]] = {}
+            for src_key, bin_pkgs in self.bin_dict.items():
+                for p in bin_pkgs:
+                    src_keys = index.setdefault(p, [])
+                    if not src_keys or src_keys[-1] != src_key:
+                        src_keys.append(src_key)
+            self._group_index = index
+            logging.debug(f'Built group index for {len(index)} packages')
+        return self._group_index
+
     def resolve_group(self, pkg_key: PkgKey, add_version: bool = False) -> str:
         if self.is_bin:
             if not pkg_key.version:
                 pkg_key = self.latest_index.get(pkg_key.package, pkg_key)
-        for bin_pkgs in self.bin_dict.values():
-            if pkg_key in bin_pkgs:
-                return '\n'.join(_format_key(k, add_version) for k in bin_pkgs)
+        src_keys = self.group_index().get(pkg_key)
+        if src_keys:
+            return '\n'.join(_format_key(k, add_version) for k in self.bin_dict[src_keys[0]])
         return ""
 
-    def add_version(self, line_left_side: str) -> str:
+    def versions_index(self) -> Dict[str, List[PkgKey]]:
+        """Package name -> keys of all its versions, oldest first."""
+        if self._versions_index is None:
+            index: Dict[str, List[PkgKey]] = {}
+            for k in self.packages:
+                keys = index.setdefault(k.package, [])
+                keys.insert(_version_position(keys, k.version), k)
+            self._versions_index = index
+            logging.debug(f'Built versions index for {len(index)} packages')
+        return self._versions_index
+
+    def versions(self, name: str) -> List[PkgKey]:
+        return list(self.versions_index().get(name, []))
+
+    def find_version(self, name: str, version: str = '') -> Optional[PkgKey]:
+        """Latest version of name, or the exact version if given."""
+        keys = self.versions_index().get(name)
+        if not keys:
+            return None
+        if not version:
+            return keys[-1]
+        i = _version_position(keys, version)
+        # Equal Debian versions may differ in spelling (1.0 vs 1.0-0), prefer the exact one
+        while i < len(keys) and apt_pkg.version_compare(keys[i].version, version) == 0:
+            if keys[i].version == version:
+                return keys[i]
+            i += 1
+        return None
+
+    def add_version(self, line_left_side: str, all_versions: bool = False) -> str:
         parts = line_left_side.split('=')
         name = parts[0]
         ver = parts[1] if len(parts) > 1 else ''
-        for k, entry in self.packages.items():
-            if k.package == name:
-                if ver and k.version != ver:
-                    continue
-                return f'{k.package}={entry.version}'
-        logging.error(f'Package not found: {line_left_side}')
-        return ''
-
-    def depends(self, package: PkgKey, depth: int):
-        depends_set = set()
-        depends_set.add(package.package)
+        if all_versions and not ver:
+            keys = self.versions(name)
+        else:
+            found = self.find_version(name, ver)
+            keys = [found] if found else []
+        if not keys:
+            logging.error(f'Package not found: {line_left_side}')
+            return ''
+        return '\n'.join(_format_key(k) for k in keys)
+
+    def _dependency_key(self, name: str) -> Optional[PkgKey]:
+        """Latest key for a package name, or for its provider if the name is virtual."""
+        key = self.latest_index.get(name)
+        if key is None:
+            provider = self.prov_dict.get(name)
+            if provider:
+                key = self.latest_index.get(provider)
+        return key
+
+    def depends(self, package: PkgKey, depth: int, with_depth: bool = False) -> str:
+        levels: Dict[str, int] = {package.package: 0}
+        frontier = [package.package]
         for i in range(depth):
-            before = len(depends_set)
-            for d in [self.packages[self.latest_index[package]].depends for package in depends_set]:
-                depends_set.update(d)
-            if before == len(depends_set):
+            next_frontier: List[str] = []
+            for name in frontier:
+                key = self._dependency_key(name)
+                if key is None or key not in self.packages:
+                    logging.debug(f'Dependency is not in the repository: {name}')
+                    continue
+                names = self.packages[key].depends
+                if key.package != name:
+                    names = [key.package] + names
+                for d in names:
+                    if d not in levels:
+                        levels[d] = i + 1
+                        next_frontier.append(d)
+            if not next_frontier:
                 logging.info(f'Dependency search done at iteration {i + 1}')
                 break
+            frontier = next_frontier
         else:
             logging.warning(f'Dependency search did not reach leaves: {depth}')
 
-        return '\n'.join(depends_set)
+        if with_depth:
+            return '\n'.join(str((level, name)) for name, level in levels.items())
+        return '\n'.join(levels)
+
+    def rdepends_index(self) -> Dict[int, List[PkgKey]]:
+        """Dependency name id -> keys of packages depending on it, in file order."""
+        if self._rdepends_index is None:
+            index: Dict[int, List[PkgKey]] = {}
+            for k, entry in self.packages.items():
+                for dep_id in set(entry.dep_ids):
+                    index.setdefault(dep_id, []).append(k)
+            self._rdepends_index = index
+            logging.debug(f'Built reverse dependency index for {len(index)} names')
+        return self._rdepends_index
+
+    def _depended_names(self, key: PkgKey) -> List[str]:
+        """Names other packages use to depend on key; binaries of a source for Sources."""
+        if self.is_bin:
+            return [key.package]
+        return [b.package for b in self.bin_dict.get(key, [])]
 
-    def rdepends(self, package: str) -> str:
+    def rdepends_closure(self, packages: Iterable[str], depth: int) -> List[str]:
+        """Names of packages (transitively) depending on any of packages, breadth-first."""
+        index = self.rdepends_index()
         out: List[str] = []
-        for p in self.packages:
-            if package in self.packages[p].depends:
-                out.append(_format_key(p, False))
-        return '\n'.join(out)
+        frontier = list(dict.fromkeys(packages))
+        found: Set[str] = set(frontier)
+        expanded: Set[str] = set(frontier)
+        for i in range(depth):
+            next_frontier: List[str] = []
+            for name in frontier:
+                for p in index.get(NAMES.ids.get(name), []):
+                    if p.package not in found:
+                        found.add(p.package)
+                        out.append(p.package)
+                    for n in self._depended_names(p):
+                        if n not in expanded:
+                            expanded.add(n)
+                            next_frontier.append(n)
+            if not next_frontier:
+                logging.info(f'Reverse dependency search done at iteration {i + 1}')
+                break
+            frontier = next_frontier
+        else:
+            logging.warning(f'Reverse dependency search did not reach roots: {depth}')
+        return out
+
+    def rdepends(self, package: str, depth: int = 1) -> str:
+        if depth <= 1:
+            index = self.rdepends_index()
+            return '\n'.join(_format_key(p, False) for p in index.get(NAMES.ids.get(package), []))
+        return '\n'.join(self.rdepends_closure([package], depth))
 
     def remove(self, pkg_key: PkgKey) -> bool:
         key = pkg_key
@@ -231,7 +927,9 @@ class Metadata:
             key = self.latest_index.get(pkg_key.package)
         if key is not None:
             if key in self.packages:
-                del self.packages[key]
+                binaries = self._linked_binaries(key)
+                self._unlink(key, self.packages.pop(key))
+                self._update_source_graph([key.package], binaries)
                 logging.info(f'Removed: {key}')
                 return True
             else:
@@ -252,6 +950,9 @@ class Metadata:
             entry = self.packages[pkg_key]
             target.packages[pkg_key] = entry
             src_key = PkgKey(entry.source, entry.source_version)
+            if not self.is_bin:
+                target.is_bin = False
+            target._link(pkg_key, entry, self.bin_dict.get(src_key, ()))
 
             latest = target.latest_index.get(pkg_key.package)
             if latest is None:
@@ -273,51 +974,208 @@ class Metadata:
             else:
                 logging.debug(f'Latest source key {src_key} is not newer than existing {latest}')
 
+            target._update_source_graph([pkg_key.package], target._linked_binaries(pkg_key))
             return True
         return False
 
-    def output_blocks(self) -> None:
+    def output_blocks(self, out: Optional[BinaryIO] = None) -> None:
+        if out is None:
+            sys.stdout.flush()
+            out = sys.stdout.buffer
         for entry in self.packages.values():
-            print(entry.block)
-            print()
+            out.write(entry.get_block_bytes())
+            out.write(b'\n\n')
+        out.flush()
+
+    def write_blocks(self, path: str) -> None:
+        """Write all stanzas to path, replacing it atomically."""
+        if self.offsets and os.path.abspath(path) in {os.path.abspath(p) for p in self.filepath.split(',')}:
+            raise ValueError(f'Can not overwrite a memory-mapped source file: {path}')
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                self.output_blocks(f)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def _source_graph_row(self, name: str) -> Set[str]:
+        key = self.latest_index.get(name)
+        if key not in self.packages:
+            return set()
+        row = set()
+        for d in self.packages[key].depends:
+            src_key = self.src_dict.get(PkgKey(d, ''))
+            if src_key is not None:
+                row.add(src_key.package)
+        return row
+
+    def source_graph(self) -> Dict[str, Set[str]]:
+        """Latest package name -> names of the sources building its dependencies."""
+        if self._source_graph is None:
+            self._source_graph = {name: self._source_graph_row(name) for name in self.latest_index}
+            logging.debug(f'Built source graph for {len(self._source_graph)} packages')
+        return self._source_graph
+
+    def _linked_binaries(self, pkg_key: PkgKey) -> List[PkgKey]:
+        """Keys whose src_dict entry changes when pkg_key is linked or unlinked."""
+        if self.is_bin:
+            return [pkg_key]
+        entry = self.packages[pkg_key]
+        return list(self.bin_dict.get(PkgKey(entry.source, entry.source_version), ()))
+
+    def _update_source_graph(self, names: Iterable[str], binaries: Iterable[PkgKey]) -> None:
+        """Re-resolve the graph rows of names and of the latest packages depending on binaries."""
+        if self._source_graph is None:
+            return
+        names = set(names)
+        index = self.rdepends_index()
+        for b in binaries:
+            for k in index.get(NAMES.ids.get(b.package), []):
+                if self.latest_index.get(k.package) == k:
+                    names.add(k.package)
+        for name in names:
+            if name in self.latest_index:
+                self._source_graph[name] = self._source_graph_row(name)
+            else:
+                self._source_graph.pop(name, None)
 
     def toposort(self, packages_set: Set[PkgKey], dot_file: Optional[str] = None) -> str:
-        graph: Dict = {}
-        # Build dependency graph
+        source_graph = self.source_graph()
+        # Induced subgraph, edges point from a dependency to its dependents.
+        # Node order decides levels inside cycles, keep the order of discovery.
+        ids: Dict[str, int] = {}
+        edges: List[Tuple[int, int]] = []
         for p in packages_set:
-            if p.package not in graph: graph[p.package] = set()
+            i = ids.setdefault(p.package, len(ids))
             if self.latest_index.get(p.package) not in self.packages:
                 logging.warning(f'Package was not found in the latest versions index: {p.package}')
                 continue
-            for d in self.packages[self.latest_index.get(p.package)].depends:
-                package = self.src_dict.get(PkgKey(d, ""))
-                if package is None: continue
-                if PkgKey(package.package, '') in packages_set:
-                    graph[p.package].add(package.package)
-                    if package.package not in graph: graph[package.package] = set()
+            for d in source_graph[p.package]:
+                if PkgKey(d, '') in packages_set:
+                    edges.append((ids.setdefault(d, len(ids)), i))
+        names = list(ids)
+        rows: List[List[int]] = [[] for _ in names]
+        for d, i in edges:
+            rows[d].append(i)
         # Save graph to dot file
         if dot_file:
+            graph: Dict[PkgKey, Set[PkgKey]] = {PkgKey(name, ''): set() for name in names}
+            for i, row in enumerate(rows):
+                for j in row:
+                    graph[PkgKey(names[j], '')].add(PkgKey(names[i], ''))
             with open(dot_file, 'w') as f:
                 f.write(dict_to_dot(graph))
-        # Prepare graph for topological sort
-        graph_dict = reverse_graph(graph)
-        nodes = {name: Node(name) for name in graph_dict}
-        edges_counter = 0
-        for name, edges in graph_dict.items():
-            node = nodes[name]
-            edges_counter += len(edges)
-            for edge_name in edges:
-                node.edges.append(nodes[edge_name])
-        nodes = list(nodes.values())
-        logging.debug(f'Stable topological sort started, number of edges: {edges_counter}')
+        offsets = array('i', [0])
+        targets = array('i')
+        for row in rows:
+            targets.extend(row)
+            offsets.append(len(targets))
+        logging.debug(f'Stable topological sort started, number of edges: {len(targets)}')
         # Perform and output topological sort
-        sorted_nodes_with_levels = StableTopoSort.stable_topo_sort(nodes)
-        tl = []
-        for level, node in sorted_nodes_with_levels:
-            tl.append((level, node.name))
+        tl = [(level, names[i]) for level, i in StableTopoSort.stable_topo_sort_csr(offsets, targets)]
         output_lines = [str(t) for t in sorted(tl)]
         return '\n'.join(output_lines)
 
+    def _source_of(self, name: str) -> Optional[str]:
+        """Source package building a binary name, or its provider if the name is virtual."""
+        src_key = self.src_dict.get(PkgKey(name, ''))
+        if src_key is None and self.prov_dict.get(name):
+            src_key = self.src_dict.get(PkgKey(self.prov_dict[name], ''))
+        return src_key.package if src_key is not None else None
+
+    def build_order(self, dot_file: Optional[str] = None) -> str:
+        """Build order of all latest sources with strongly connected components condensed.
+
+        Every build dependency that applies without build profiles is an edge,
+        for alternatives the first one built in the archive. Sources of one
+        component share the level of the component, levels are batches that can
+        build in parallel. Cycles follow as comments with suggested break edges:
+        dependencies dropped by one of self.profiles, or with an alternative
+        built outside the cycle.
+        """
+        if self.is_bin:
+            raise ValueError('Build order requires Sources metadata')
+        names = sorted(self.latest_index)
+        ids = {name: i for i, name in enumerate(names)}
+        # (source, dependency source) -> [(group text, profiles dropping it, alternative sources)]
+        edges: Dict[Tuple[int, int], List[Tuple[str, Set[str], Set[int]]]] = {}
+        for i, name in enumerate(names):
+            entry = self.packages[self.latest_index[name]]
+            for field_name in ('Build-Depends', 'Build-Depends-Arch', 'Build-Depends-Indep'):
+                for group in entry.relations(field_name):
+                    resolved = []
+                    for r in group:
+                        dep = ids.get(self._source_of(r.name) or '')
+                        if dep is not None and relation_applies(r, None):
+                            resolved.append((r, dep))
+                    if not resolved or resolved[0][1] == i:
+                        continue
+                    r, dep = resolved[0]
+                    dropped = {p for p in self.profiles if not relation_applies(r, None, (p,))}
+                    alternatives = {d for _, d in resolved[1:]}
+                    edges.setdefault((i, dep), []).append((' | '.join(str(a) for a in group), dropped, alternatives))
+
+        if dot_file:
+            graph: Dict[PkgKey, Set[PkgKey]] = {PkgKey(name, ''): set() for name in names}
+            for i, dep in edges:
+                graph[PkgKey(names[i], '')].add(PkgKey(names[dep], ''))
+            with open(dot_file, 'w') as f:
+                f.write(dict_to_dot(graph))
+
+        # Edges point from a dependency to its dependents, as in toposort
+        rows: List[List[int]] = [[] for _ in names]
+        for i, dep in sorted(edges):
+            rows[dep].append(i)
+        offsets = [0]
+        targets: List[int] = []
+        for row in rows:
+            targets.extend(row)
+            offsets.append(len(targets))
+        rindex = StableTopoSort.pea_scc_csr(offsets, targets)
+
+        # Condense components, numbered in the order of their first source
+        comp_of: Dict[int, int] = {}
+        members: List[List[int]] = []
+        for i, r in enumerate(rindex):
+            if r not in comp_of:
+                comp_of[r] = len(members)
+                members.append([])
+            members[comp_of[r]].append(i)
+        comp_rows: List[Set[int]] = [set() for _ in members]
+        for i, dep in edges:
+            a, b = comp_of[rindex[dep]], comp_of[rindex[i]]
+            if a != b:
+                comp_rows[a].add(b)
+        comp_offsets = [0]
+        comp_targets: List[int] = []
+        for row in comp_rows:
+            comp_targets.extend(sorted(row))
+            comp_offsets.append(len(comp_targets))
+        levels = StableTopoSort.stable_topo_sort_csr(comp_offsets, comp_targets)
+        logging.debug(f'Build order: {len(names)} sources, {len(edges)} edges, {len(members)} components')
+
+        output_lines = [str(t) for t in sorted((level, names[i]) for level, c in levels for i in members[c])]
+        cycles = sorted((level, [names[i] for i in members[c]], c) for level, c in levels if len(members[c]) > 1)
+        for number, (level, cycle_names, c) in enumerate(cycles, 1):
+            output_lines.append(f'# cycle {number}, level {level}: {" ".join(cycle_names)}')
+            cycle = set(members[c])
+            suggested = 0
+            for (i, dep), records in sorted(edges.items()):
+                if i not in cycle or dep not in cycle:
+                    continue
+                reasons = sorted(set.intersection(*(dropped for _, dropped, _ in records)))
+                if all(alternatives - cycle for _, _, alternatives in records):
+                    reasons.append('alternative')
+                if reasons:
+                    relations = ', '.join(text for text, _, _ in records)
+                    output_lines.append(f'#   break {names[i]} -> {names[dep]} ({", ".join(reasons)}): {relations}')
+                    suggested += 1
+            if not suggested:
+                output_lines.append('#   no break edge found, a staged build is needed')
+        return '\n'.join(output_lines)
+
 def reverse_graph(graph: Dict) -> Dict:
     reversed_graph: Dict = {node: set() for node in graph}
     for node, neighbors in graph.items():
@@ -339,6 +1197,200 @@ def dict_to_dot(d: Dict, graph_name: str = 'G') -> str:
     return '\n'.join(lines)
 
 
+def parse_package_line(line: str) -> Optional[PkgKey]:
+    """PkgKey for an input line 'name' or 'name=version', None for blanks and comments."""
+    stripped = line.strip()
+    if not stripped or stripped.startswith('#'):
+        return None
+    parts = stripped.split('=')
+    return PkgKey(parts[0], parts[1] if len(parts) > 1 else '')
+
+
+class PreDoseSession:
+    """Named Metadata sets and the operations on them, see PreDoseServer and PreDoseBatch.
+
+    Each request is a mapping with an "op" field, package names are read from
+    its "packages" list.
+    """
+
+    def __init__(self, parser: str = 'python', profiles: Iterable[str] = DEFAULT_PROFILES) -> None:
+        self.sets: Dict[str, Metadata] = {}
+        self.parser = parser
+        self.profiles = tuple(profiles)
+        self.running = True
+
+    def get_set(self, request: Mapping[str, Any], field: str = 'set') -> Metadata:
+        name = request.get(field)
+        if name not in self.sets:
+            raise KeyError(f'Unknown metadata set: {name}')
+        return self.sets[name]
+
+    def dispatch(self, request: Mapping[str, Any]) -> Any:
+        op = request.get('op')
+        packages = [k for k in (parse_package_line(p) for p in request.get('packages', [])) if k is not None]
+        add_version = bool(request.get('add_version'))
+
+        if op == 'load':
+            files = request['files']
+            meta = Metadata.from_file(split_paths(files) if isinstance(files, str) else files,
+                                      bool(request.get('mmap')), bool(request.get('snapshot')), self.parser,
+                                      request.get('profiles', self.profiles))
+            if request.get('provide'):
+                meta.prov_dict = Metadata.from_file(split_paths(request['provide']), parser=self.parser).prov_dict
+            if request.get('latest'):
+                meta.keep_latest()
+            if request.get('latest_src'):
+                meta.keep_latest_src()
+            self.sets[request['set']] = meta
+            return len(meta.packages)
+        if op == 'drop':
+            return self.sets.pop(request['set'], None) is not None
+        if op == 'shutdown':
+            self.running = False
+            return True
+
+        meta = self.get_set(request)
+        if op in ('resolve-src', 'resolve-bin', 'resolve-group'):
+            resolve = {'resolve-src': meta.resolve_src, 'resolve-bin': meta.resolve_bin,
+                       'resolve-group': meta.resolve_group}[op]
+            return [line for k in packages for line in resolve(k, add_version).split('\n') if line]
+        if op == 'remove':
+            removed = sum(meta.remove(k) for k in packages)
+            if request.get('latest'):
+                meta.keep_latest()
+            return removed
+        if op == 'backport':
+            origin = self.get_set(request, 'origin')
+            if request.get('latest'):
+                meta.keep_latest()
+            added = sum(origin.backport(k, meta) for k in packages)
+            if request.get('latest'):
+                meta.keep_latest()
+            return added
+        if op == 'depends':
+            depth = int(request.get('depth', 1))
+            with_depth = bool(request.get('with_depth'))
+            return [line for k in packages for line in meta.depends(k, depth, with_depth).split('\n') if line]
+        if op == 'rdepends':
+            depth = int(request.get('depth', 1))
+            return [line for k in packages for line in meta.rdepends(k.package, depth).split('\n') if line]
+        if op == 'add-version':
+            all_versions = bool(request.get('all_versions'))
+            return [line for p in request.get('packages', []) if parse_package_line(p) is not None
+                    for line in meta.add_version(p.strip(), all_versions).split('\n') if line]
+        if op == 'toposort':
+            result = meta.toposort(set(packages), request.get('dot'))
+            return result.split('\n') if result else []
+        if op == 'build-order':
+            result = meta.build_order(request.get('dot'))
+            return result.split('\n') if result else []
+        if op == 'output':
+            meta.write_blocks(request['path'])
+            return len(meta.packages)
+        raise ValueError(f'Unknown operation: {op}')
+
+
+class PreDoseServer(PreDoseSession, socketserver.UnixStreamServer):
+    """Keeps named Metadata sets in memory and answers line-delimited JSON requests.
+
+    Each request is one JSON object with an "op" field, each response is one
+    JSON object {"ok": true, "result": ...} or {"ok": false, "error": "..."}.
+    Requests are handled one at a time, so operations on a set never overlap.
+    """
+
+    def __init__(self, socket_path: str, parser: str = 'python',
+                 profiles: Iterable[str] = DEFAULT_PROFILES) -> None:
+        PreDoseSession.__init__(self, parser, profiles)
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        socketserver.UnixStreamServer.__init__(self, socket_path, PreDoseRequestHandler)
+
+    def serve(self) -> None:
+        logging.info(f'Serving on {self.server_address}')
+        try:
+            while self.running:
+                self.handle_request()
+        finally:
+            self.server_close()
+            os.unlink(self.server_address)
+        logging.info('Server stopped')
+
+
+class PreDoseBatch(PreDoseSession):
+    """Runs the operations of a JSON lines file, one request per line.
+
+    Requests are those of PreDoseServer with three additions: "id" names the
+    result of an operation, "from" takes the packages from a named result
+    and "out" collects result lines in a file instead of printing them.
+    Metadata ("output") and result files are written once, after the last
+    operation succeeded, with the final content of their sets.
+    """
+
+    def __init__(self, parser: str = 'python', profiles: Iterable[str] = DEFAULT_PROFILES) -> None:
+        super().__init__(parser, profiles)
+        self.results: Dict[str, Any] = {}
+        self.outputs: Dict[str, Metadata] = {}
+        self.result_files: Dict[str, List[str]] = {}
+
+    def dispatch(self, request: Mapping[str, Any]) -> Any:
+        if 'from' in request:
+            if request['from'] not in self.results:
+                raise KeyError(f'Unknown result: {request["from"]}')
+            request = {**request, 'packages': self.results[request['from']]}
+        if request.get('op') == 'output':
+            meta = self.get_set(request)
+            if request['path'] in self.outputs:
+                logging.warning(f'Output requested more than once, last one wins: {request["path"]}')
+            self.outputs[request['path']] = meta
+            return len(meta.packages)
+        result = super().dispatch(request)
+        if 'id' in request:
+            self.results[request['id']] = result
+        if isinstance(result, list):
+            if request.get('out'):
+                self.result_files.setdefault(request['out'], []).extend(result)
+            elif result:
+                print('\n'.join(result))
+        return result
+
+    def run(self, lines: Iterable[str], name: str = '<ops>') -> None:
+        for n, line in enumerate(lines, 1):
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+            request = json.loads(line)
+            logging.debug(f'Operation {n}: {request.get("op")} {request.get("set", "")}')
+            try:
+                self.dispatch(request)
+            except Exception as e:
+                raise ValueError(f'{name}:{n}: {request.get("op")}: {e}') from e
+            if not self.running:
+                break
+        for path, meta in self.outputs.items():
+            if path == '-':
+                meta.output_blocks()
+            else:
+                meta.write_blocks(path)
+        for path, result in self.result_files.items():
+            with open(path, 'w') as f:
+                f.writelines(f'{line}\n' for line in result)
+
+
+class PreDoseRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                logging.debug(f'Request: {request.get("op")} {request.get("set", "")}')
+                response = {'ok': True, 'result': self.server.dispatch(request)}
+            except Exception as e:
+                logging.error(f'Request failed: {e!r}')
+                response = {'ok': False, 'error': str(e)}
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+            self.wfile.flush()
+
+
 class PreDoseApp:
     """Main application class for pre-dose."""
 
@@ -364,18 +1416,29 @@ class PreDoseApp:
             description='Pre-dose: targeted substitution of package information '
                         'from an origin repository to a target repository.',
         )
-        parser.add_argument('origin_repo', metavar='ORIGIN_REPO', nargs='?',
-                            help='newer repository Packages/Sources')
-        parser.add_argument('target_repo', metavar='TARGET_REPO',
-                            help='older repository Packages/Sources')
+        parser.add_argument('origin_repo', metavar='ORIGIN_REPO', nargs='?', type=split_paths,
+                            help='newer repository Packages/Sources, comma-separated files, '
+                                 'may be .gz, .xz, .bz2 or .zst compressed')
+        parser.add_argument('target_repo', metavar='TARGET_REPO', nargs='?', type=split_paths,
+                            help='older repository Packages/Sources, same format as ORIGIN_REPO')
+        parser.add_argument('--serve', metavar='SOCKET',
+                            help='load metadata sets on request and answer line-delimited JSON '
+                                 'requests on a Unix socket, see predose/client.py')
+        parser.add_argument('--ops', metavar='FILE',
+                            help='run the JSON lines operations of FILE (- for stdin) and write all '
+                                 'outputs at the end, see PreDoseBatch')
         parser.add_argument('-r', '--remove', action='store_true',
                             help='remove packages instead of replacing or adding')
-        parser.add_argument('-p', '--provide', type=str, metavar='PATH',
+        parser.add_argument('-p', '--provide', type=split_paths, metavar='PATH',
                             help='path to binary Packages metadata for source implantation')
         parser.add_argument('-e', '--depends', type=int, metavar='DEPTH',
                             help='print repository package dependencies and exit')
+        parser.add_argument('--with-depth', action='store_true',
+                            help='with --depends print (depth, package) tuples')
         parser.add_argument('-n', '--rdepends', action='store_true',
                             help='determine which package depends on a given dependency and exit')
+        parser.add_argument('--rdepends-depth', type=int, default=1, metavar='DEPTH',
+                            help='with --rdepends follow reverse dependencies transitively up to DEPTH (default: 1)')
         parser.add_argument('-s', '--resolve-src', action='store_true',
                             help='resolve source code package names and exit')
         parser.add_argument('-b', '--resolve-bin', action='store_true',
@@ -384,6 +1447,20 @@ class PreDoseApp:
                             help='resolve target binary group and exit')
         parser.add_argument('-t', '--topo-sort', action='store_true',
                             help='perform topological sort and exit')
+        parser.add_argument('--build-order', action='store_true',
+                            help='print the build order of all sources of TARGET_REPO with cycles and exit')
+        parser.add_argument('-m', '--mmap', action='store_true',
+                            help='keep stanza offsets instead of text, output from memory-mapped files')
+        parser.add_argument('--parser', default='python', choices=['auto', 'python', 'apt'],
+                            help='metadata parser, auto uses apt_pkg.TagFile when available (default: python)')
+        parser.add_argument('--profiles', default=','.join(DEFAULT_PROFILES), metavar='LIST',
+                            type=lambda value: [p for p in value.split(',') if p],
+                            help='comma-separated build profiles, dependencies they disable are ignored by '
+                                 'depends, rdepends and toposort, empty to keep all '
+                                 f'(default: {",".join(DEFAULT_PROFILES)})')
+        parser.add_argument('-S', '--snapshot', action='store_true',
+                            help='cache parsed ORIGIN_REPO and --provide metadata (TARGET_REPO for single repository '
+                                 'options) in a binary snapshot next to the first file')
         parser.add_argument('-c', '--latest', action='store_true',
                             help='keep only the latest versions of packages')
         parser.add_argument('-C', '--latest-src', action='store_true',
@@ -392,12 +1469,19 @@ class PreDoseApp:
                             help='save toposort graph to dot file')
         parser.add_argument('-a', '--add-version', action='store_true',
                             help='add version to output for resolve operations and exit')
+        parser.add_argument('-A', '--all-versions', action='store_true',
+                            help='with --add-version print every version of the package, oldest first')
         parser.add_argument('-l', '--log-level', default='INFO',
                             choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
                             help='set the logging level (default: INFO)')
         parser.add_argument('--log-file',
                             help='save logs to file (default: stderr)')
         self.args = parser.parse_args(argv)
+        # A single positional argument is the target repository
+        if self.args.target_repo is None and self.args.origin_repo is not None:
+            self.args.target_repo, self.args.origin_repo = self.args.origin_repo, None
+        if self.args.target_repo is None and not (self.args.serve or self.args.ops):
+            parser.error('the following arguments are required: TARGET_REPO')
         return self.args
 
     def _resolve_name(self, name: str) -> Optional[PkgKey]:
@@ -426,22 +1510,41 @@ class PreDoseApp:
         self.configure_logging()
         logging.info(f'Pre-dose started with args: {self.args}')
 
+        if self.args.serve:
+            PreDoseServer(self.args.serve, self.args.parser, self.args.profiles).serve()
+            return
+
+        if self.args.ops:
+            batch = PreDoseBatch(self.args.parser, self.args.profiles)
+            try:
+                if self.args.ops == '-':
+                    batch.run(sys.stdin, 'stdin')
+                else:
+                    with open(self.args.ops) as f:
+                        batch.run(f, self.args.ops)
+            except (OSError, ValueError) as e:
+                logging.error(e)
+                sys.exit(1)
+            return
+
         non_modifying_options = any((
             self.args.add_version, self.args.depends, self.args.resolve_src,
             self.args.resolve_bin, self.args.rdepends, self.args.resolve_group,
-            self.args.topo_sort
+            self.args.topo_sort, self.args.build_order
         ))
         one_repo_options = any((non_modifying_options, self.args.remove))
 
         if one_repo_options:
             if self.args.origin_repo is not None:
                 argparse.ArgumentParser().error("option does not require ORIGIN_REPO")
-            self.target_meta = Metadata.from_file(self.args.target_repo)
+            self.target_meta = Metadata.from_file(self.args.target_repo, self.args.mmap, self.args.snapshot,
+                                                  self.args.parser, self.args.profiles)
         else:
             if not (self.args.origin_repo and self.args.target_repo):
                 argparse.ArgumentParser().error("option requires ORIGIN_REPO and TARGET_REPO")
-            self.origin_meta = Metadata.from_file(self.args.origin_repo)
-            self.target_meta = Metadata.from_file(self.args.target_repo)
+            self.origin_meta = Metadata.from_file(self.args.origin_repo, self.args.mmap, self.args.snapshot,
+                                                  self.args.parser, self.args.profiles)
+            self.target_meta = Metadata.from_file(self.args.target_repo, self.args.mmap, profiles=self.args.profiles)
 
         if self.args.latest:
             self.target_meta.keep_latest()
@@ -450,9 +1553,17 @@ class PreDoseApp:
             self.target_meta.keep_latest_src()
 
         if self.args.provide:
-            provide_meta = Metadata.from_file(self.args.provide)
+            provide_meta = Metadata.from_file(self.args.provide, snapshot=self.args.snapshot, parser=self.args.parser)
             self.target_meta.prov_dict = provide_meta.prov_dict
 
+        if self.args.build_order:
+            try:
+                print(self.target_meta.build_order(self.args.dot))
+            except ValueError as e:
+                logging.error(e)
+                sys.exit(1)
+            return
+
         packages_set: Set[PkgKey] = set()
         input_lines: List[List[str]] = []
 
@@ -479,13 +1590,13 @@ class PreDoseApp:
             elif self.args.resolve_group:
                 result = self.target_meta.resolve_group(pkg_key, self.args.add_version)
             elif self.args.depends:
-                result = self.target_meta.depends(pkg_key, self.args.depends)
+                result = self.target_meta.depends(pkg_key, self.args.depends, self.args.with_depth)
             elif self.args.rdepends:
-                result = self.target_meta.rdepends(package)
+                result = self.target_meta.rdepends(package, self.args.rdepends_depth)
             elif self.args.remove:
                 self.target_meta.remove(pkg_key)
             elif self.args.add_version:
-                result = self.target_meta.add_version(parts[0])
+                result = self.target_meta.add_version(stripped, self.args.all_versions)
             elif self.args.topo_sort:
                 pass
             elif pkg_key is not None:
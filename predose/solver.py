@@ -0,0 +1,285 @@
+"""In-process installability checker for predose Metadata.
+
+Answers the question dose-debcheck and dose-builddebcheck answer: can a
+binary package (or the build dependencies of a source package) be installed
+from a Packages repository? Versioned Pre-Depends/Depends/Build-Depends with
+alternatives, versioned Provides, Conflicts/Breaks/Build-Conflicts and the
+implicit conflict between two versions of one package are honoured.
+
+Unsatisfied relations are returned as Reason objects; report_lines formats
+them like `dose-debcheck -e -f` so the backport driver can use either.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from functools import cmp_to_key
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import apt_pkg
+
+from predose.predose import Metadata, PackageEntry, PkgKey, Relation, relation_applies
+
+BIN_DEPENDS_FIELDS = ('Pre-Depends', 'Depends')
+BIN_CONFLICTS_FIELDS = ('Conflicts', 'Breaks')
+SRC_DEPENDS_FIELDS = ('Build-Depends', 'Build-Depends-Arch', 'Build-Depends-Indep')
+SRC_CONFLICTS_FIELDS = ('Build-Conflicts', 'Build-Conflicts-Arch', 'Build-Conflicts-Indep')
+
+# Search steps per package before giving up
+MAX_STEPS = 100000
+
+Group = Tuple[Relation, ...]
+
+_VERSION_KEY = cmp_to_key(lambda a, b: apt_pkg.version_compare(a.version, b.version))
+
+
+@dataclass
+class Reason:
+    """Why a package is not installable.
+
+    kind is 'missing' (no package satisfies relation of package),
+    'conflict' (package has relation conflicting with other) or 'limit'
+    (the search gave up, relation says so).
+    """
+    kind: str
+    package: PkgKey
+    relation: str
+    other: Optional[PkgKey] = None
+
+
+@dataclass
+class Result:
+    package: PkgKey
+    status: str  # 'ok', 'broken' or 'unknown' when the search limit was hit
+    reasons: List[Reason] = field(default_factory=list)
+
+    @property
+    def installable(self) -> bool:
+        return self.status == 'ok'
+
+
+def _relations(entry: PackageEntry, names: Sequence[str], arch: str,
+               profiles: Iterable[str]) -> List[Group]:
+    groups = []
+    for name in names:
+        for group in entry.relations(name):
+            group = tuple(r for r in group if relation_applies(r, arch, profiles))
+            if group:
+                groups.append(group)
+    return groups
+
+
+def _format_group(group: Group, arch: str) -> str:
+    """Relation as dose prints it: name:arch (op version) | ..."""
+    return ' | '.join(f'{r.name}:{arch}' + (f' ({r.op} {r.version})' if r.op else '') for r in group)
+
+
+class Checker:
+    """Installability of packages from one Packages repository."""
+
+    def __init__(self, packages: Metadata, arch: str = 'amd64', profiles: Iterable[str] = (),
+                 latest: bool = True) -> None:
+        self.meta = packages
+        self.arch = arch
+        self.profiles = frozenset(profiles)
+        keys = set(packages.latest_index.values()) if latest else set(packages.packages)
+        self.by_name: Dict[str, List[PkgKey]] = {}
+        self.provided: Dict[str, List[Tuple[PkgKey, str]]] = {}
+        self.depends: Dict[PkgKey, List[Group]] = {}
+        self.conflicts: Dict[PkgKey, List[Relation]] = {}
+        for key, entry in packages.packages.items():
+            if key not in keys:
+                continue
+            self.by_name.setdefault(key.package, []).append(key)
+            for group in entry.relations('Provides'):
+                for r in group:
+                    self.provided.setdefault(r.name, []).append((key, r.version if r.op == '=' else ''))
+            self.depends[key] = _relations(entry, BIN_DEPENDS_FIELDS, arch, self.profiles)
+            self.conflicts[key] = [r for g in _relations(entry, BIN_CONFLICTS_FIELDS, arch, self.profiles)
+                                   for r in g]
+        for keys_list in self.by_name.values():
+            keys_list.sort(key=_VERSION_KEY, reverse=True)
+        logging.debug(f'Checker universe: {len(self.depends)} packages, {len(self.provided)} virtual names')
+
+    def matching(self, relation: Relation) -> List[PkgKey]:
+        """Packages satisfying relation, real packages (newest first) before providers."""
+        out = []
+        for key in self.by_name.get(relation.name, []):
+            if not relation.op or apt_pkg.check_dep(key.version, relation.op, relation.version):
+                out.append(key)
+        for key, version in self.provided.get(relation.name, []):
+            if not relation.op or (version and apt_pkg.check_dep(version, relation.op, relation.version)):
+                out.append(key)
+        return out
+
+    def check(self, key: PkgKey) -> Result:
+        """Installability of a binary package of the universe."""
+        if key not in self.depends:
+            return Result(key, 'broken', [Reason('missing', key, key.package)])
+        return self._solve(key, None, [], [])
+
+    def check_source(self, sources: Metadata, key: PkgKey) -> Result:
+        """Installability of the build dependencies of a source package."""
+        entry = sources.packages[key]
+        groups = _relations(entry, SRC_DEPENDS_FIELDS, self.arch, self.profiles)
+        conflicts = [r for g in _relations(entry, SRC_CONFLICTS_FIELDS, self.arch, self.profiles) for r in g]
+        return self._solve(None, key, groups, conflicts)
+
+    def check_all(self, names: Optional[Iterable[str]] = None) -> List[Result]:
+        keys = sorted(self.depends) if names is None else \
+            [k for n in sorted(set(names)) for k in self.by_name.get(n, [])[:1]]
+        return [self.check(k) for k in keys]
+
+    def check_sources(self, sources: Metadata, names: Optional[Iterable[str]] = None) -> List[Result]:
+        latest = sources.latest_src if names is None else \
+            {n: sources.latest_src[n] for n in set(names) if n in sources.latest_src}
+        return [self.check_source(sources, k) for _, k in sorted(latest.items())]
+
+    def _solve(self, root: Optional[PkgKey], source: Optional[PkgKey],
+               root_groups: List[Group], root_conflicts: List[Relation]) -> Result:
+        """Depth-first search with backtracking over the alternatives of each OR-group."""
+        owner_key = root if root is not None else source
+        installed: Dict[PkgKey, None] = {}
+        by_name: Dict[str, PkgKey] = {}
+        # Package -> installed packages (or the source) conflicting with it and the relation
+        forbidden: Dict[PkgKey, List[Tuple[PkgKey, Relation]]] = {}
+        agenda: List[Tuple[PkgKey, Group]] = [(owner_key, g) for g in root_groups]
+        trail: List[PkgKey] = []
+        choices: List[Tuple[int, int, int, List[PkgKey], int]] = []
+        reasons: Dict[Tuple, Reason] = {}
+
+        for r in root_conflicts:
+            for k in self.matching(r):
+                forbidden.setdefault(k, []).append((owner_key, r))
+
+        def blocker(key: PkgKey) -> Optional[Tuple[PkgKey, Relation, PkgKey]]:
+            """(package, its conflicting relation, other package) preventing installation of key."""
+            if forbidden.get(key):
+                other, r = forbidden[key][0]
+                return other, r, key
+            other = by_name.get(key.package)
+            if other is not None and other != key:
+                return other, Relation(key.package), key
+            for r in self.conflicts[key]:
+                for k in self.matching(r):
+                    if k != key and k in installed:
+                        return key, r, k
+            return None
+
+        def install(key: PkgKey) -> None:
+            installed[key] = None
+            by_name[key.package] = key
+            trail.append(key)
+            for r in self.conflicts[key]:
+                for k in self.matching(r):
+                    if k != key:
+                        forbidden.setdefault(k, []).append((key, r))
+            agenda.extend((key, g) for g in self.depends[key])
+
+        def uninstall(key: PkgKey) -> None:
+            del installed[key]
+            del by_name[key.package]
+            # Packages are uninstalled in reverse order, their entries are the last ones
+            for r in self.conflicts[key]:
+                for k in self.matching(r):
+                    if k != key:
+                        forbidden[k].pop()
+
+        def viable(owner: PkgKey, group: Group) -> List[PkgKey]:
+            out: List[PkgKey] = []
+            for r in group:
+                for k in self.matching(r):
+                    if k in out:
+                        continue
+                    found = blocker(k)
+                    if found is None:
+                        out.append(k)
+                    else:
+                        pkg, relation, other = found
+                        reasons.setdefault(('conflict', pkg, other),
+                                           Reason('conflict', pkg, f'{relation.name}:{self.arch}'
+                                                  + (f' ({relation.op} {relation.version})' if relation.op else ''),
+                                                  other))
+            if not any(self.matching(r) for r in group):
+                reasons.setdefault(('missing', owner, group),
+                                   Reason('missing', owner, _format_group(group, self.arch)))
+            return out
+
+        if root is not None:
+            install(root)
+
+        pos = 0
+        steps = 0
+        while pos < len(agenda):
+            steps += 1
+            if steps > MAX_STEPS:
+                logging.warning(f'Search limit reached: {owner_key}')
+                return Result(owner_key, 'unknown',
+                              [Reason('limit', owner_key, f'search limit reached after {MAX_STEPS} steps')])
+            owner, group = agenda[pos]
+            if any(k in installed for r in group for k in self.matching(r)):
+                pos += 1
+                continue
+            candidates = viable(owner, group)
+            if candidates:
+                choices.append((pos, len(agenda), len(trail), candidates, 0))
+                install(candidates[0])
+                pos += 1
+                continue
+            # Backtrack to the last choice with untried alternatives
+            while choices:
+                c_pos, c_agenda, c_trail, c_candidates, c_index = choices.pop()
+                while len(trail) > c_trail:
+                    uninstall(trail.pop())
+                del agenda[c_agenda:]
+                c_index += 1
+                while c_index < len(c_candidates) and blocker(c_candidates[c_index]):
+                    c_index += 1
+                if c_index < len(c_candidates):
+                    choices.append((c_pos, c_agenda, c_trail, c_candidates, c_index))
+                    install(c_candidates[c_index])
+                    pos = c_pos + 1
+                    break
+            else:
+                return Result(owner_key, 'broken', list(reasons.values()))
+        return Result(owner_key, 'ok')
+
+
+def report_lines(results: Iterable[Result], total: int, arch: str = 'amd64', source: bool = False) -> List[str]:
+    """Broken packages in the YAML layout of `dose-debcheck -e -f`.
+
+    With source the results come from check_source and the checked packages
+    are printed as src:name like dose-builddebcheck does. Packages the search
+    gave up on are reported as broken with an unsat-limit reason.
+    """
+    lines = ['report:\n']
+    broken = 0
+    for result in results:
+        if result.status == 'ok':
+            continue
+        broken += 1
+        p = result.package
+
+        def name(key: PkgKey) -> str:
+            return f'src:{key.package}' if source and key == p else key.package
+
+        lines += [' -\n', f'  package: {name(p)}\n', f'  version: {p.version}\n',
+                  f'  architecture: {arch}\n', '  status: broken\n', '  reasons:\n']
+        for reason in result.reasons:
+            r = reason.package
+            if reason.kind == 'limit':
+                lines += ['   -\n', '    limit:\n', '     pkg:\n', f'      package: {name(r)}\n',
+                          f'      version: {r.version}\n', f'      architecture: {arch}\n',
+                          f'      unsat-limit: {reason.relation}\n']
+            elif reason.kind == 'missing':
+                lines += ['   -\n', '    missing:\n', '     pkg:\n', f'      package: {name(r)}\n',
+                          f'      version: {r.version}\n', f'      architecture: {arch}\n',
+                          f'      unsat-dependency: {reason.relation}\n']
+            else:
+                o = reason.other or r
+                lines += ['   -\n', '    conflict:\n', '     pkg1:\n', f'      package: {name(r)}\n',
+                          f'      version: {r.version}\n', f'      architecture: {arch}\n',
+                          f'      unsat-conflict: {reason.relation}\n', '     pkg2:\n',
+                          f'      package: {name(o)}\n', f'      version: {o.version}\n',
+                          f'      architecture: {arch}\n']
+    lines += [f'broken-packages: {broken}\n', f'total-packages: {total}\n']
+    return lines
@@ -2,6 +2,8 @@
 
 import argparse
 import logging
+import lzma
+import multiprocessing
 import os
 import glob
 import re
@@ -11,10 +13,25 @@ import sys
 import tempfile
 import urllib.parse
 import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import partial
 from pathlib import Path
 from urllib.parse import unquote
 
+# A line of pre-dose --topo-sort output: (level, 'name')
+LEVEL_LINE = re.compile(r"^\((\d+),\s*'([^']+)'\)$")
+
+# sbuild chroot of the current worker process in parallel mode
+_worker_chroot = None
+
+# apt source of the local repository, refreshed on its own after each build
+LOCAL_SOURCES_LIST = "/etc/apt/sources.list.d/simplebuilder.list"
+
+# How schroot sessions copy the pristine base chroot, 'none' builds in the base itself
+SNAPSHOT_MODES = ('overlay', 'tmpfs', 'tarball', 'none')
+TMPFS_OVERLAY_DIR = "/dev/shm/schroot/overlay"
+
 def run_command(cmd, cwd=None, env=None):
     """Run a shell command and return success status."""
     logging.debug(f"Running command: {cmd} in {cwd}")
@@ -39,28 +56,161 @@ def run_command(cmd, cwd=None, env=None):
             logging.warning(f"Command failed: {e}")
         return False
 
-def scan_and_upgrade_packages(repo_path):
-    """Run dpkg-scanpackages to update local repository."""
+def publish_index(repo_path, name):
+    """Swap in a freshly scanned index name.tmp, plain and xz-compressed, each with an atomic rename."""
+    tmp_path = os.path.join(repo_path, f"{name}.tmp")
+    with open(tmp_path, 'rb') as src, lzma.open(f"{tmp_path}.xz", 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(f"{tmp_path}.xz", os.path.join(repo_path, f"{name}.xz"))
+    os.replace(tmp_path, os.path.join(repo_path, name))
+
+def index_local_repo(repo_path):
+    """Rebuild Packages and Sources of the local repository.
+
+    apt-ftparchive keeps the control data and checksums of every scanned file
+    in a cache database, only new or changed files are read again.
+    """
     logging.info(f"Scanning packages in {repo_path}")
-    run_command("apt-ftparchive packages . > Packages & dpkg-scansources . > Sources & wait", cwd=repo_path)
+    if not run_command("(apt-ftparchive --db .packages.db packages . > Packages.tmp & p=$!; "
+                       "apt-ftparchive --db .sources.db sources . > Sources.tmp & s=$!; "
+                       "wait $p && wait $s)", cwd=repo_path):
+        logging.error(f"Failed to scan the local repository: {repo_path}")
+        return False
+    for name in ('Packages', 'Sources'):
+        publish_index(repo_path, name)
+    return True
+
+def installed_packages():
+    """Name -> version of the installed packages."""
+    result = subprocess.run(['dpkg-query', '-W', '-f=${db:Status-Abbrev} ${Package} ${Version}\n'],
+                            capture_output=True, text=True)
+    installed = {}
+    for line in result.stdout.splitlines():
+        fields = line.split()
+        if len(fields) == 3 and fields[0][1:2] == 'i':
+            installed[fields[1]] = fields[2]
+    return installed
+
+def superseded_packages(packages_path, installed):
+    """Installed packages with a newer version in the Packages index at packages_path."""
+    import apt_pkg
+    apt_pkg.init_system()
+
+    if not os.path.exists(packages_path):
+        return []
+    newer = set()
+    with open(packages_path) as f:
+        for stanza in f.read().split('\n\n'):
+            fields = dict(re.findall(r'^(Package|Version): (\S+)$', stanza, flags=re.MULTILINE))
+            name = fields.get('Package')
+            if name in installed and 'Version' in fields \
+                    and apt_pkg.version_compare(fields['Version'], installed[name]) > 0:
+                newer.add(name)
+    return sorted(newer)
+
+def scan_and_upgrade_packages(repo_path, refresh_all=False):
+    """Update the local repository indexes and upgrade from it.
+
+    Only the lists of the local repository are refreshed, and the system is
+    upgraded only when the repository has a newer version of an installed
+    package. With refresh_all every apt source is updated and the system is
+    upgraded.
+    """
+    index_local_repo(repo_path)
     logging.info("Update packages")
     env = os.environ.copy()
     env['DEBIAN_FRONTEND'] = 'noninteractive'
     env['NEEDRESTART_MODE'] = 'a'  # Auto restart mode
     env['DEBCONF_NOWARNINGS'] = 'yes'
-    run_command("apt-get update && apt-get -o Dpkg::Options::=--force-confold -o Dpkg::Options::=--force-confdef -y upgrade", env=env)
+    upgrade_cmd = "apt-get -o Dpkg::Options::=--force-confold -o Dpkg::Options::=--force-confdef -y upgrade"
+    if refresh_all:
+        run_command(f"apt-get update && {upgrade_cmd}", env=env)
+        return
+    run_command(f"apt-get update -o Dir::Etc::sourcelist={LOCAL_SOURCES_LIST} -o Dir::Etc::sourceparts=- "
+                f"-o APT::Get::List-Cleanup=0", env=env)
+    newer = superseded_packages(os.path.join(repo_path, 'Packages'), installed_packages())
+    if newer:
+        logging.info(f"Local repository supersedes installed packages: {' '.join(newer)}")
+        run_command(upgrade_cmd, env=env)
+    else:
+        logging.info("No installed package is superseded by the local repository, skip upgrade")
+
+def install_sbuild_tools():
+    """Install sbuild and the tools to create chroots, once per run."""
+    run_command("apt-get update")
+    run_command("apt-get install -y debootstrap schroot sbuild libwww-perl apt-utils")
 
-def setup_sbuild_chroot(dist, base_url, extra_repositories, keep_chroot=False, chroot_base="/srv/chroot"):
-    """Setup sbuild chroot for building."""
+def has_chroot_snapshots(chroot_name, config_dir="/etc/schroot/chroot.d"):
+    """Whether the sessions of chroot_name are throwaway copies, see configure_chroot_snapshots."""
+    for config in glob.glob(f"{config_dir}/{chroot_name}-*"):
+        settings = dict(l.split('=', 1) for l in Path(config).read_text().splitlines() if '=' in l)
+        if settings.get('type') == 'file' or settings.get('union-type', 'none') != 'none':
+            return True
+    return False
+
+def check_sbuild_chroot(chroot_name, config_dir="/etc/schroot/chroot.d"):
+    """Check that the chroot opens with a clean dpkg state, unmount its leftover sessions otherwise.
+
+    A chroot with snapshot sessions is repaired through its source chroot,
+    the changes made in a snapshot session are thrown away.
+    """
+    namespace = "source" if has_chroot_snapshots(chroot_name, config_dir) else "chroot"
+    cmd = f"schroot -c {namespace}:{chroot_name} -u root --directory=/ -- dpkg --configure -a"
+    if run_command(cmd):
+        return True
+    logging.warning("Force lazy umount")
+    lazy_unmount_all_schroot_mounts(chroot_name)
+    return run_command(cmd)
+
+def configure_chroot_snapshots(chroot_name, chroot_path, mode, config_dir="/etc/schroot/chroot.d"):
+    """Make every schroot session of chroot_name a throwaway copy of the base chroot.
+
+    overlay and tmpfs put an overlayfs over the base directory, tmpfs keeps
+    the upper layer in /dev/shm. tarball packs the base once and unpacks it
+    for each session. none restores sessions in the base directory itself.
+    """
+    if mode == 'none':
+        settings = {'type': 'directory', 'directory': str(chroot_path)}
+    elif mode == 'tarball':
+        tarball = f"{chroot_path}.tar.gz"
+        if not run_command(f"tar -C {chroot_path} -czf {tarball}.tmp . && mv {tarball}.tmp {tarball}"):
+            logging.error(f"Failed to pack chroot: {chroot_path}")
+            return False
+        settings = {'type': 'file', 'file': tarball}
+    else:
+        settings = {'type': 'directory', 'directory': str(chroot_path), 'union-type': 'overlay'}
+        if mode == 'tmpfs':
+            os.makedirs(TMPFS_OVERLAY_DIR, exist_ok=True)
+            settings['union-overlay-directory'] = TMPFS_OVERLAY_DIR
+
+    configs = glob.glob(f"{config_dir}/{chroot_name}-*")
+    if not configs:
+        if mode == 'none':
+            return True
+        logging.error(f"No schroot configuration found for {chroot_name}")
+        return False
+    replaced = ('type', 'directory', 'file', 'union-type', 'union-overlay-directory')
+    for config in configs:
+        lines = [l for l in Path(config).read_text().splitlines() if l.split('=', 1)[0].strip() not in replaced]
+        lines += [f"{key}={value}" for key, value in settings.items()]
+        Path(config).write_text('\n'.join(lines) + '\n')
+    if mode != 'none':
+        logging.info(f"Sessions of {chroot_name} use {mode} snapshots")
+    return True
+
+def setup_sbuild_chroot(dist, base_url, extra_repositories, keep_chroot=False, chroot_base="/srv/chroot", slot=None,
+                        snapshot='none'):
+    """Create and validate the sbuild chroot once per run, slot is one of the chroots of parallel builds.
+
+    The tools are expected to be installed with install_sbuild_tools. With a
+    snapshot mode builds never change the chroot, see configure_chroot_snapshots.
+    """
     logging.info(f"Setting up sbuild chroot for {dist}")
 
-    chroot_name = f"{dist}-amd64-sbuild"
+    chroot_prefix = dist if slot is None else f"{dist}-{slot}"
+    chroot_name = f"{chroot_prefix}-amd64-sbuild"
     chroot_path = Path(chroot_base) / chroot_name
 
-    # Install sbuild and dependencies
-    run_command("apt-get update")
-    run_command("apt-get install -y debootstrap schroot sbuild libwww-perl apt-utils")
-
     # Create debootstrap symlink if needed
     debootstrap_script = Path(f"/usr/share/debootstrap/scripts/{dist}")
     if not debootstrap_script.exists():
@@ -74,6 +224,8 @@ def setup_sbuild_chroot(dist, base_url, extra_repositories, keep_chroot=False, c
     if extra_repositories:
         for repo in extra_repositories:
             extra_repo_args += f" --extra-repository='{repo}'"
+    if slot is not None:
+        extra_repo_args += f" --chroot-prefix={chroot_prefix}"
 
     # Remove chroot
     if not keep_chroot:
@@ -109,13 +261,6 @@ def setup_sbuild_chroot(dist, base_url, extra_repositories, keep_chroot=False, c
             content += new_line
         fstab_path.write_text(content)
 
-    # Fix dpkg
-    cmd = f"schroot -c chroot:{chroot_name} -u root --directory=/ -- dpkg --configure -a"
-
-    if not run_command(cmd):
-        logging.warning("Force lazy umount")
-        lazy_unmount_all_schroot_mounts()
-
     # Disable HTTPS verification for local builds
     apt_conf_dir = chroot_path / "etc/apt/apt.conf.d"
     apt_conf_dir.mkdir(parents=True, exist_ok=True)
@@ -130,12 +275,21 @@ Acquire::https::Verify-Host "false";
     if dev_null.exists():
         dev_null.chmod(0o777)
 
-    # Add local repository to chroot
+    # Add local repository to chroot, a kept chroot has it already
     if os.environ.get('LOCAL_REPO_PATH'):
         sources_list = chroot_path / "etc/apt/sources.list"
         repo_line = f"deb [trusted=yes] file://{os.environ['LOCAL_REPO_PATH']} ./"
-        with sources_list.open('a') as f:
-            f.write(repo_line + '\n')
+        if not sources_list.exists() or repo_line not in sources_list.read_text().splitlines():
+            with sources_list.open('a') as f:
+                f.write(repo_line + '\n')
+
+    # Fix dpkg
+    if not check_sbuild_chroot(chroot_name):
+        logging.error(f"Sbuild chroot is not usable: {chroot_name}")
+        return None
+
+    if not configure_chroot_snapshots(chroot_name, chroot_path, snapshot):
+        return None
 
     logging.info(f"Sbuild chroot created: {chroot_name}")
     return chroot_name
@@ -159,7 +313,7 @@ def build_with_sbuild(dsc_url, dist, chroot_name, extra_repositories=None):
         dsc_file = dsc_files[0]
 
         # Build sbuild command
-        sbuild_cmd = f"sudo -u sbuild sbuild --chroot-mode=schroot -d {dist} {os.environ['SBUILD_EXTRA']}"
+        sbuild_cmd = f"sudo -u sbuild sbuild --chroot-mode=schroot -d {dist} --chroot={chroot_name} {os.environ['SBUILD_EXTRA']}"
 
         # Add extra repositories
         if extra_repositories:
@@ -189,10 +343,14 @@ def build_with_sbuild(dsc_url, dist, chroot_name, extra_repositories=None):
 
         return True
 
-def lazy_unmount_all_schroot_mounts():
+def lazy_unmount_all_schroot_mounts(chroot_name=None):
+    """Unmount leftover schroot sessions, only those of chroot_name if given."""
     schroot_mounts = "/run/schroot/mount/"
     if os.path.exists(schroot_mounts):
         for f in os.listdir(schroot_mounts):
+            # Session directories are named <chroot>-<uuid>
+            if chroot_name and not f.startswith(f"{chroot_name}-"):
+                continue
             mount = os.path.join(schroot_mounts, f)
             if os.path.isdir(mount):
                 subprocess.run(['umount','-l',mount])
@@ -260,6 +418,7 @@ def gbp_build_with_sbuild(repo_url, dist, chroot_name, extra_repositories=None):
             f"gbp buildpackage --git-no-pristine-tar --git-ignore-new --git-export-dir=../build-area "
             f"--git-builder=\"sbuild "
             f"--dist={dist} "
+            f"--chroot={chroot_name} "
             f"--chroot-mode=schroot "
             f"--source "
             f"--lintian-opts='{os.environ["LINTIAN_OPTIONS"]}'"
@@ -372,8 +531,13 @@ def copy_built_packages(source_dir, repo_dir):
         logging.warning("Since no deb files were found, only logs were copied to the repository")
     return moved
 
-def process_line(line, args):
-    """Process a single input line."""
+def process_line(line, args, chroot_name=None, publish=True):
+    """Process a single input line.
+
+    With chroot_name the sbuild chroot set up for the run is reused, a failed
+    build only rechecks its dpkg state unless builds run in snapshots. Without
+    publish the local repository is not rescanned after a successful build.
+    """
     line = line.strip()
     if not line or line.startswith('#'):
         return True  # Skip empty lines
@@ -410,27 +574,35 @@ def process_line(line, args):
         if url.endswith('.git'):
             # Git repository - clone and build with gbp-buildpackage
             if args.sbuild:
-                chroot_name = setup_sbuild_chroot(args.dist, args.base_url, args.extra_repository, args.keep_chroot)
+                if chroot_name is None:
+                    install_sbuild_tools()
+                    chroot_name = setup_sbuild_chroot(args.dist, args.base_url, args.extra_repository, args.keep_chroot,
+                                                      snapshot=args.chroot_snapshot)
                 if chroot_name:
                     success = gbp_build_with_sbuild(url, args.dist, chroot_name, args.extra_repository)
-                    if success:
-                        scan_and_upgrade_packages(args.repository)
-                    lazy_unmount_all_schroot_mounts()
+                    # Sessions of a snapshot chroot are discarded, other builds may share the chroot
+                    if args.chroot_snapshot == 'none':
+                        lazy_unmount_all_schroot_mounts(chroot_name)
+                        if not success:
+                            check_sbuild_chroot(chroot_name)
             else:
                 success = clone_and_build_gbp(url, args.build, args.repository)
-                if success:
-                    scan_and_upgrade_packages(args.repository)
 
         elif url.endswith('.dsc'):
             # Check if using sbuild backend
             if args.sbuild:
                 # Setup sbuild chroot
-                chroot_name = setup_sbuild_chroot(args.dist, args.base_url, args.extra_repository, args.keep_chroot)
+                if chroot_name is None:
+                    install_sbuild_tools()
+                    chroot_name = setup_sbuild_chroot(args.dist, args.base_url, args.extra_repository, args.keep_chroot,
+                                                      snapshot=args.chroot_snapshot)
                 if chroot_name:
                     success = build_with_sbuild(url, args.dist, chroot_name, args.extra_repository)
-                    if success:
-                        scan_and_upgrade_packages(args.repository)
-                    lazy_unmount_all_schroot_mounts()
+                    # Sessions of a snapshot chroot are discarded, other builds may share the chroot
+                    if args.chroot_snapshot == 'none':
+                        lazy_unmount_all_schroot_mounts(chroot_name)
+                        if not success:
+                            check_sbuild_chroot(chroot_name)
             else:
                 # Use traditional dpkg-buildpackage
                 match = re.match(r'.*/([^/]+)_(.+)\.dsc$', url)
@@ -449,19 +621,18 @@ def process_line(line, args):
                 rebuild = bin_exists
                 # Build or rebuild
                 success = download_and_build_dpkg(url, args.build, args.repository, rebuild)
-                if success:
-                    scan_and_upgrade_packages(args.repository)
 
         elif url.endswith('.deb'):
             # Binary package - copy to repository
             success = copy_to_repo(url, args.repository)
-            if success:
-                scan_and_upgrade_packages(args.repository)
 
         else:
             logging.warning(f"Unknown file type: {url}")
             return False
 
+        if success and publish:
+            scan_and_upgrade_packages(args.repository)
+
         if success:
             logging.info(f"Successfully processed: {url}")
         else:
@@ -473,6 +644,70 @@ def process_line(line, args):
         logging.error(f"Error processing {url}: {e}")
         return False
 
+def job_name(line):
+    """Source package name of a job line, None for binary packages."""
+    if '://' not in line:
+        return line
+    name = line.rstrip('/').split('/')[-1]
+    if name.endswith('.git'):
+        return name[:-len('.git')]
+    match = re.match(r'([^_]+)_.+\.dsc$', name)
+    return match.group(1) if match else None
+
+def compute_levels(names, sources):
+    """Build levels of source names, pre-dose topological sort over comma-separated Sources files.
+
+    Names missing from the Sources files get no level.
+    """
+    from predose.predose import Metadata, PkgKey
+
+    meta = Metadata.from_file(sources.split(','))
+    known = {name for name in names if name in meta.latest_index}
+    levels = {}
+    for line in meta.toposort({PkgKey(name, '') for name in known}).split('\n'):
+        match = LEVEL_LINE.match(line)
+        if match and match.group(2) in known:
+            levels[match.group(2)] = int(match.group(1))
+    return levels
+
+def schedule_lines(lines, sources=None):
+    """Group job lines into build levels, returns a list of (level, lines) in build order.
+
+    Lines of pre-dose --topo-sort output keep their level. Other lines get
+    the level computed from sources. Lines without a level, all of them
+    without sources, follow every other level one at a time in input order,
+    since their build dependencies are unknown.
+    """
+    jobs = []
+    plain = []
+    for line in lines:
+        match = LEVEL_LINE.match(line)
+        if match:
+            jobs.append((int(match.group(1)), match.group(2)))
+        else:
+            plain.append(line)
+    if plain and sources:
+        levels = compute_levels({job_name(line) for line in plain} - {None}, sources)
+        jobs.extend((levels[job_name(line)], line) for line in plain if job_name(line) in levels)
+        plain = [line for line in plain if job_name(line) not in levels]
+    offset = max((level for level, _ in jobs), default=-1) + 1
+    jobs.extend((offset + i, line) for i, line in enumerate(plain))
+    grouped = {}
+    for level, line in jobs:
+        grouped.setdefault(level, []).append(line)
+    return sorted(grouped.items())
+
+def init_build_worker(chroots):
+    """Give the worker process one of the prepared sbuild chroots for all its builds."""
+    global _worker_chroot
+    _worker_chroot = chroots.get()
+
+def build_job(line, args):
+    """Build one line in a worker process, the level is published by the scheduler."""
+    os.environ['LOG_FILE'] = args.repository + '/' + line.split('/')[-1] + '.log'
+    logging.info(f"Building {line} in {_worker_chroot}, log: {os.environ['LOG_FILE']}")
+    return process_line(line, args, chroot_name=_worker_chroot, publish=False)
+
 def deb_src_apt_sources():
     # Path to the sources.list.d directory
     sources_dir = '/etc/apt/sources.list.d/'
@@ -509,8 +744,7 @@ def add_local_repo_sources(repo_path):
 deb [trusted=yes] file://{os.path.abspath(repo_path)} ./
 deb-src [trusted=yes] file://{os.path.abspath(repo_path)} ./
     '''
-    sources_file = "/etc/apt/sources.list.d/simplebuilder.list"
-    with open(sources_file, 'w') as f:
+    with open(LOCAL_SOURCES_LIST, 'w') as f:
         f.write(repo_entry + '\n')
         logging.info("Successfully added local repository to sources")
 
@@ -535,8 +769,17 @@ def main():
                        help="Base Debian repository URL for sbuild (default: https://ftp.debian.org/debian)")
     parser.add_argument("--extra-repository", action="append",
                        help="Extra repositories for sbuild (can be specified multiple times)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                       help="Build the packages of one level in parallel in JOBS sbuild chroots (default: %(default)s)")
+    parser.add_argument("--chroot-snapshot", default="none", choices=SNAPSHOT_MODES,
+                       help="Build in a throwaway copy of the sbuild chroot: overlayfs, overlayfs in tmpfs, "
+                            "unpacked tarball or none (default: %(default)s)")
+    parser.add_argument("--sources",
+                       help="Comma-separated Sources files to compute the build levels of input lines with pre-dose")
 
     args = parser.parse_args()
+    if args.jobs > 1 and not args.sbuild:
+        parser.error("--jobs requires --sbuild, parallel builds need isolated chroots")
 
     # Create workspace directories
     os.makedirs(args.workspace, exist_ok=True)
@@ -564,7 +807,7 @@ def main():
 
     deb_src_apt_sources()
     add_local_repo_sources(args.repository)
-    scan_and_upgrade_packages(args.repository)
+    scan_and_upgrade_packages(args.repository, refresh_all=True)
 
     logging.info(f"Starting build process. Workspace: {args.workspace}, Repository: {args.repository}")
     if args.sbuild:
@@ -587,15 +830,11 @@ def main():
         if line:
             lines.append(line)
 
-    for line_num, line in enumerate(lines, 1):
-
-        logging.info(f"Processing line {line_num}: {line}")
-
-        os.environ['LOG_FILE'] = args.repository + '/' + line.split('/')[-1] + '.log'
-        logging.info(f"The build logs for a specific package: {os.environ['LOG_FILE']}")
-
-        result = process_line(line, args)
+    levels = schedule_lines(lines, args.sources)
+    lines = [line for _, level_lines in levels for line in level_lines]
 
+    def count(line, result):
+        nonlocal success_count, fail_count, skip_count
         if result is None:
             skip_count += 1
             skip_items.append(line.split('/')[-1])
@@ -606,19 +845,64 @@ def main():
             fail_count += 1
             fail_items.append(line.split('/')[-1])
 
-        # Remove temporary build-dependencies
-        env = os.environ.copy()
-        run_command("dpkg -l | grep 'build-dependencies for' | cut -f 3 -d ' ' | xargs -I {} dpkg -r {}", env=env)
+    # Chroots are created once per run, builds reuse them. Parallel builds
+    # share one base chroot when each build gets its own snapshot.
+    chroot_names = []
+    if args.sbuild and lines:
+        install_sbuild_tools()
+        slots = range(args.jobs) if args.jobs > 1 and args.chroot_snapshot == 'none' else [None]
+        for slot in slots:
+            chroot_name = setup_sbuild_chroot(args.dist, args.base_url, args.extra_repository, args.keep_chroot,
+                                              slot=slot, snapshot=args.chroot_snapshot)
+            if not chroot_name:
+                logging.error(f"Failed to set up sbuild chroot {slot}")
+                sys.exit(1)
+            chroot_names.append(chroot_name)
+
+    if args.jobs > 1:
+        chroots = multiprocessing.Queue()
+        for i in range(args.jobs):
+            chroots.put(chroot_names[i % len(chroot_names)])
+
+        done = 0
+        with ProcessPoolExecutor(args.jobs, initializer=init_build_worker, initargs=(chroots,)) as pool:
+            for level, level_lines in levels:
+                logging.info(f"Processing level {level}: {len(level_lines)} packages in {args.jobs} chroots")
+                built = success_count
+                for line, result in zip(level_lines, pool.map(partial(build_job, args=args), level_lines)):
+                    count(line, result)
+                done += len(level_lines)
+
+                # Publish the level before building the next one
+                os.environ['LOG_FILE'] = args.workspace + '/' + args.log_file
+                if success_count > built:
+                    scan_and_upgrade_packages(args.repository)
+
+                logging.info(f"Statistics on processed: successfully {success_count}, "
+                    f"unsuccessfully {fail_count}, skip {skip_count}, remaining {len(lines)-done}")
+    else:
+        for line_num, line in enumerate(lines, 1):
+
+            logging.info(f"Processing line {line_num}: {line}")
+
+            os.environ['LOG_FILE'] = args.repository + '/' + line.split('/')[-1] + '.log'
+            logging.info(f"The build logs for a specific package: {os.environ['LOG_FILE']}")
+
+            count(line, process_line(line, args, chroot_name=chroot_names[0] if chroot_names else None))
+
+            # Remove temporary build-dependencies
+            env = os.environ.copy()
+            run_command("dpkg -l | grep 'build-dependencies for' | cut -f 3 -d ' ' | xargs -I {} dpkg -r {}", env=env)
 
-        logging.info(f"Statistics on processed: successfully {success_count}, "
-            f"unsuccessfully {fail_count}, skip {skip_count}, remaining {len(lines)-line_num}")
+            logging.info(f"Statistics on processed: successfully {success_count}, "
+                f"unsuccessfully {fail_count}, skip {skip_count}, remaining {len(lines)-line_num}")
 
     logging.info(f"Build process completed. Success: {success_count}, Failed: {fail_count}, Skip: {skip_count}")
     logging.info(f"Success items: {success_items}")
     logging.warning(f"Failed items: {fail_items}")
     logging.warning(f"Skiped items: {skip_items}")
 
-    logging.info(f"Please note that the local repository remains connected: /etc/apt/sources.list.d/simplebuilder.list")
+    logging.info(f"Please note that the local repository remains connected: {LOCAL_SOURCES_LIST}")
 
     if fail_count > 0:
         sys.exit(1)
@@ -0,0 +1,17 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from predose import Metadata
+
+
+def metadata_from_text(text):
+    """Metadata parsed from stanza text written to a temporary file."""
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
+        f.write(text)
+        temp_file = f.name
+    meta = Metadata.from_file(temp_file)
+    os.unlink(temp_file)
+    return meta
@@ -0,0 +1,108 @@
+import pytest
+import tempfile
+import os
+import sys
+from io import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from predose import Metadata
+from predose.predose import PkgKey, PreDoseApp
+
+
+@pytest.fixture
+def binary_metadata():
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
+        f.write("""Package: libfoo1
+Version: 1.10-1
+Source: foo
+
+Package: libfoo1
+Version: 1.2-1
+Source: foo
+
+Package: libfoo1
+Version: 1.9~rc1-1
+Source: foo
+
+Package: bar
+Version: 2.0
+""")
+        temp_file = f.name
+    meta = Metadata.from_file(temp_file)
+    os.unlink(temp_file)
+    return meta
+
+
+def test_add_version_latest(binary_metadata):
+    assert binary_metadata.add_version("libfoo1") == "libfoo1=1.10-1"
+    assert binary_metadata.add_version("bar") == "bar=2.0"
+
+
+def test_add_version_exact(binary_metadata):
+    assert binary_metadata.add_version("libfoo1=1.2-1") == "libfoo1=1.2-1"
+    assert binary_metadata.add_version("libfoo1=1.3-1") == ""
+    assert binary_metadata.add_version("missing") == ""
+
+
+def test_add_version_all_versions(binary_metadata):
+    result = binary_metadata.add_version("libfoo1", all_versions=True)
+    assert result.split('\n') == ["libfoo1=1.2-1", "libfoo1=1.9~rc1-1", "libfoo1=1.10-1"]
+
+
+def test_versions_index_follows_remove_and_backport(binary_metadata):
+    meta = binary_metadata
+    assert meta.remove(PkgKey("libfoo1", ""))
+    assert meta.add_version("libfoo1") == "libfoo1=1.9~rc1-1"
+    assert meta.latest_index["libfoo1"] == PkgKey("libfoo1", "1.9~rc1-1")
+
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
+        f.write("Package: libfoo1\nVersion: 1.5-1\nSource: foo\n")
+        temp_file = f.name
+    origin = Metadata.from_file(temp_file)
+    os.unlink(temp_file)
+
+    assert origin.backport(PkgKey("libfoo1", ""), meta)
+    assert [k.version for k in meta.versions("libfoo1")] == ["1.2-1", "1.5-1", "1.9~rc1-1"]
+
+    assert meta.remove(PkgKey("bar", ""))
+    assert meta.add_version("bar") == ""
+    assert "bar" not in meta.latest_index
+
+
+class CountingDict(dict):
+    """dict that counts full scans through iteration"""
+    scans = 0
+
+    def __iter__(self):
+        self.scans += 1
+        return super().__iter__()
+
+
+def test_add_version_large_input_scans_once():
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
+        for i in range(5000):
+            f.write(f"Package: pkg{i}\nVersion: 1.{i % 7}\n\n")
+        temp_file = f.name
+    meta = Metadata.from_file(temp_file)
+    os.unlink(temp_file)
+
+    meta.packages = CountingDict(meta.packages)
+    for i in range(5000):
+        assert meta.add_version(f"pkg{i}") == f"pkg{i}=1.{i % 7}"
+    # The versions index is built once, not a packages scan per line
+    assert meta.packages.scans == 1
+
+
+def test_add_version_cli_exact_version(tmp_path, monkeypatch, capsys):
+    packages = tmp_path / "Packages"
+    packages.write_text("Package: libfoo1\nVersion: 1.10-1\n\nPackage: libfoo1\nVersion: 1.2-1\n")
+    monkeypatch.setattr(sys, "stdin", StringIO("libfoo1=1.2-1\nlibfoo1=1.3-1\nlibfoo1\n"))
+
+    PreDoseApp().run(["-a", str(packages)])
+
+    assert capsys.readouterr().out == "libfoo1=1.2-1\nlibfoo1=1.10-1\n"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,225 @@
+import argparse
+import bz2
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from predose import backport
+from predose.backport import (BackportDriver, count_unsat, dependent_on_missing, find_metadata_files, merge_reports,
+                              shard, unsat_names, unsat_pairs, write_plain)
+
+DATA_DIR = Path(__file__).parent / "data"
+
+REPORT = """report:
+ -
+  package: vim
+  version: 1
+  architecture: amd64
+  status: broken
+  reasons:
+   -
+    missing:
+     pkg:
+      package: vim
+      version: 1
+      architecture: amd64
+      unsat-dependency: vim-runtime:amd64 (= 2:9.2.0461-1) | foo-missing:amd64
+   -
+    conflict:
+     pkg1:
+      package: vim-tiny
+      version: 1
+      architecture: amd64
+      unsat-conflict: vim-common:amd64 (<< 2)
+     pkg2:
+      package: vim-common
+      version: 1
+      architecture: amd64
+broken-packages: 1
+total-packages: 10
+""".splitlines(True)
+
+
+def test_unsat_pairs():
+    pairs = unsat_pairs(REPORT)
+    assert pairs == [
+        "      package: vim\t      unsat-dependency: vim-runtime:amd64 (= 2:9.2.0461-1) | foo-missing:amd64",
+        "      package: vim-tiny\t      unsat-conflict: vim-common:amd64 (<< 2)",
+    ]
+
+
+def test_unsat_names():
+    pairs = unsat_pairs(REPORT)
+    assert unsat_names(pairs) == {"vim", "vim-runtime", "foo-missing"}
+    assert unsat_names(pairs, removeonly=True) == {"vim", "vim-common"}
+
+
+def test_dependent_on_missing():
+    pairs = unsat_pairs(REPORT)
+    assert dependent_on_missing(pairs, {"vim-runtime", "vim-common"}) == set()
+    assert dependent_on_missing(pairs, {"vim-common"}) == {"vim"}
+
+
+def test_count_unsat():
+    lines = count_unsat(REPORT + REPORT[5:14]).split('\n')
+    assert lines[0].split()[0] == "2"
+    assert lines[-1] == "Displaying all 2 lines"
+    assert count_unsat([]) == "No lines to display"
+
+
+def test_find_metadata_files_compressed(tmp_path):
+    for comp, data in (("main", b"Package: vim\n"), ("contrib", b"Package: foo\n")):
+        binary = tmp_path / "dists" / "testing" / comp / "binary-amd64"
+        binary.mkdir(parents=True)
+        (binary / "Packages.bz2").write_bytes(bz2.compress(data))
+    found = find_metadata_files(str(tmp_path), "binary-amd64/Packages")
+    assert [Path(p).relative_to(tmp_path).parts[2] for p in found] == ["contrib", "main"]
+    write_plain(found, str(tmp_path / "plain"))
+    assert (tmp_path / "plain").read_text() == "Package: foo\n\nPackage: vim\n\n"
+    # Uncompressed files are preferred
+    (tmp_path / "dists" / "testing" / "main" / "binary-amd64" / "Packages").write_text("Package: vim\n")
+    assert find_metadata_files(str(tmp_path), "binary-amd64/Packages") == [
+        str(tmp_path / "dists" / "testing" / "main" / "binary-amd64" / "Packages")]
+
+
+def driver_args(**kwargs):
+    args = dict(base_name="gc", newer="testing", older="stable", checkonly=False, binonly=False,
+                removeonly=False, onlyunsat=False, nosrcfix=False, oneshot=False, metadata=None, shell=False,
+                full_check_every=10, checker="dose", jobs=1)
+    args.update(kwargs)
+    return argparse.Namespace(**args)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    for src, dst in (("new_Packages", "testing_Packages"), ("new_Sources", "testing_Sources"),
+                     ("sample_Packages", "stable_Packages"), ("sample_Sources", "stable_Sources")):
+        shutil.copy(DATA_DIR / src, tmp_path / dst)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(backport.shutil, "which", lambda tool: f"/usr/bin/{tool}")
+    return tmp_path
+
+
+def test_driver_converges_in_memory(workdir, monkeypatch):
+    calls = []
+
+    def fake_dose(self, bin_scope, src_scope):
+        calls.append((bin_scope, src_scope))
+        return (REPORT if len(calls) == 1 else []), []
+
+    monkeypatch.setattr(BackportDriver, "run_dose", fake_dose)
+    assert BackportDriver(driver_args(onlyunsat=True)).run(["vim\n"]) == 0
+
+    assert (workdir / "gc.000.bin").read_text() == "vim\n"
+    assert (workdir / "gc.000.src").read_text() == "vim\n"
+    assert "Package: vim\nVersion: 2:9.2.0461-1" in (workdir / "gc_Packages").read_text()
+    vim_source = (workdir / "gc_Sources").read_text().split("Package: vim\n", 1)[1].split("\n\n", 1)[0]
+    assert "Version: 2:9.2.0461-1\n" in vim_source
+    assert (workdir / "gc.001.bin").read_text() == "foo-missing\nvim\nvim-runtime\n"
+    # Full first check, then the changed set, then a full check confirming convergence
+    assert calls[0] == (None, None)
+    assert "vim" in calls[1][0] and "vim" in calls[1][1]
+    assert calls[-1] == (None, None)
+    assert (workdir / "gc.003.bin").read_text() == ""
+
+
+def test_check_scope_follows_reverse_dependencies(workdir):
+    driver = BackportDriver(driver_args())
+    driver.load()
+    changed_bins, changed_srcs = driver.apply({"vim-common"}, {"vim"})
+    assert "vim-common" in changed_bins and changed_srcs == {"vim"}
+    bin_scope, src_scope = driver.check_scope(changed_bins, changed_srcs)
+    # vim depends on vim-common in the sample data
+    assert {"vim-common", "vim"} <= bin_scope
+    assert "vim" in src_scope
+
+
+def test_merge_report_keeps_unchecked_packages():
+    cache = {}
+    full = BackportDriver.merge_report(cache, REPORT, None)
+    assert set(cache) == {"vim"}
+    assert unsat_pairs(full) == unsat_pairs(REPORT)
+    # vim was not checked again, its report is kept
+    assert unsat_pairs(BackportDriver.merge_report(cache, [], {"other"})) == unsat_pairs(REPORT)
+    # vim was checked and is installable now
+    assert BackportDriver.merge_report(cache, [], {"vim"}) == []
+
+
+def test_driver_builtin_checker_runs_without_dose(workdir, monkeypatch):
+    monkeypatch.setattr(backport.shutil, "which", lambda tool: None)
+    result = BackportDriver(driver_args(checker="builtin", oneshot=True)).run(["vim\n"])
+    assert result == 0
+    assert (workdir / "gc.000.src").read_text() == "vim\n"
+    debcheck = (workdir / "gc.debcheck.log").read_text().splitlines(True)
+    builddebcheck = (workdir / "gc.builddebcheck.log").read_text().splitlines(True)
+    assert debcheck[0] == "report:\n" and debcheck[-1].startswith("total-packages: ")
+    assert "      package: src:vim\t      unsat-dependency: autoconf:amd64" in unsat_pairs(builddebcheck)
+    # The next iteration handles what the builtin report found
+    assert "autoconf" in (workdir / "gc.001.bin").read_text().split()
+    # Target metadata is written once, at the end of the run
+    assert "Version: 2:9.2.0461-1" in (workdir / "gc_Packages").read_text()
+
+
+def test_shard_splits_round_robin(monkeypatch):
+    monkeypatch.setattr(backport, "MIN_SHARD_SIZE", 2)
+    assert shard(["e", "d", "c", "b", "a"], 2) == [["a", "c", "e"], ["b", "d"]]
+    # Too few names for more shards
+    assert shard(["b", "a", "c"], 8) == [["a", "b", "c"]]
+    assert shard([], 4) == [[]]
+
+
+def test_merge_reports_dedupes_records():
+    other = """output-version: 1.2
+report:
+ -
+  package: gvim
+  version: 1
+  architecture: amd64
+  status: broken
+  reasons:
+   -
+    missing:
+     pkg:
+      package: gvim
+      version: 1
+      architecture: amd64
+      unsat-dependency: gtk:amd64
+broken-packages: 1
+total-packages: 10
+""".splitlines(True)
+    merged = merge_reports([["output-version: 1.2\n"] + REPORT, other, REPORT])
+    assert merged[:2] == ["output-version: 1.2\n", "report:\n"]
+    assert merged[-2:] == ["broken-packages: 2\n", "total-packages: 10\n"]
+    assert sorted(unsat_pairs(merged)) == sorted(unsat_pairs(REPORT) + unsat_pairs(other))
+    assert merge_reports([REPORT]) == REPORT
+
+
+def test_driver_shards_checkonly(workdir, monkeypatch):
+    monkeypatch.setattr(backport, "MIN_SHARD_SIZE", 1)
+    driver = BackportDriver(driver_args(jobs=3))
+    driver.load()
+    debcheck_cmds, builddebcheck_cmds = driver.dose_commands({"vim", "vim-common", "vim-tiny", "xxd"}, {"vim"})
+    assert len(debcheck_cmds) == 3 and len(builddebcheck_cmds) == 1
+    checked = [c[c.index("--checkonly") + 1] for c in debcheck_cmds]
+    assert sorted(",".join(checked).split(",")) == ["vim-common:amd64", "vim-tiny:amd64", "vim:amd64", "xxd:amd64"]
+
+    commands = []
+
+    def fake_checker(cmd):
+        commands.append(cmd)
+        return REPORT if cmd[0] == "dose-debcheck" and "vim:amd64" in cmd[2] else []
+
+    monkeypatch.setattr(driver, "_run_checker", fake_checker)
+    debcheck, builddebcheck = driver.run_dose({"vim", "vim-common", "vim-tiny", "xxd"}, {"vim"})
+    assert len(commands) == 4
+    assert unsat_pairs(debcheck) == unsat_pairs(REPORT)
+    assert builddebcheck == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
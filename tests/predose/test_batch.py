@@ -0,0 +1,71 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from predose.predose import PreDoseBatch
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+PREDOSE_SCRIPT = PROJECT_ROOT / "predose" / "predose.py"
+DATA_DIR = Path(__file__).parent / "data"
+
+
+def run_predose(args, input_data=""):
+    env = os.environ.copy()
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (str(PROJECT_ROOT), env.get("PYTHONPATH")) if p)
+    return subprocess.run([sys.executable, str(PREDOSE_SCRIPT)] + [str(a) for a in args],
+                          input=input_data, capture_output=True, text=True, env=env, timeout=30)
+
+
+def ops_lines(*ops):
+    return [json.dumps(op) + "\n" for op in ops]
+
+
+def test_batch_backport_matches_cli(tmp_path):
+    new, sample = DATA_DIR / "new_Packages", DATA_DIR / "sample_Packages"
+    out = tmp_path / "Packages"
+    ops = tmp_path / "ops.jsonl"
+    ops.write_text("".join(ops_lines(
+        {"op": "load", "set": "origin", "files": str(new), "latest": True},
+        {"op": "load", "set": "target", "files": str(sample), "latest": True},
+        {"op": "output", "set": "target", "path": str(out)},
+        {"op": "backport", "set": "target", "origin": "origin", "packages": ["vim", "vim-common"], "latest": True},
+    )))
+    result = run_predose(["--ops", ops])
+    assert result.returncode == 0, result.stderr
+    # Outputs are written at the end, with the final content of the set
+    assert out.read_text() == run_predose(["-c", new, sample], "vim\nvim-common\n").stdout
+
+
+def test_batch_chains_results(tmp_path, capsys):
+    batch = PreDoseBatch()
+    batch.run(ops_lines(
+        {"op": "load", "set": "sources", "files": str(DATA_DIR / "new_Sources")},
+        {"op": "load", "set": "target", "files": str(DATA_DIR / "sample_Packages"), "latest": True},
+        {"op": "resolve-src", "set": "sources", "packages": ["vim"], "id": "src"},
+        {"op": "resolve-bin", "set": "sources", "from": "src", "id": "bins", "out": str(tmp_path / "bins")},
+        {"op": "remove", "set": "target", "from": "bins", "latest": True},
+        {"op": "add-version", "set": "target", "packages": ["vim", "bash"]},
+    ))
+    bins = (tmp_path / "bins").read_text().split()
+    assert "vim-common" in bins and "xxd" in bins
+    assert "vim" not in batch.sets["target"].latest_index
+    # Only resolve-src has no "out", add-version finds neither package after the removal
+    assert capsys.readouterr().out == "vim\n"
+
+
+def test_batch_failure_writes_nothing(tmp_path):
+    out = tmp_path / "Packages"
+    batch = PreDoseBatch()
+    with pytest.raises(ValueError, match="ops.jsonl:3: backport"):
+        batch.run(ops_lines(
+            {"op": "load", "set": "target", "files": str(DATA_DIR / "sample_Packages")},
+            {"op": "output", "set": "target", "path": str(out)},
+            {"op": "backport", "set": "target", "origin": "missing", "packages": ["vim"]},
+        ), "ops.jsonl")
+    assert not out.exists()
@@ -0,0 +1,83 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from conftest import metadata_from_text
+
+SOURCES = """Package: base
+Binary: libbase1, libbase-dev
+Version: 1.0
+
+Package: tool
+Binary: tool
+Version: 2.0
+Build-Depends: libbase-dev, libsuite-dev <!nocheck>
+
+Package: suite
+Binary: libsuite-dev
+Version: 3.0
+Build-Depends: tool, libbase-dev
+
+Package: left
+Binary: left
+Version: 1.0
+Build-Depends: right
+
+Package: right
+Binary: right, virtual-left
+Version: 1.0
+Build-Depends: left | libbase-dev
+
+Package: stage
+Binary: stage
+Version: 1.0
+Build-Depends: stage-b
+
+Package: stage-b
+Binary: stage-b
+Version: 1.0
+Build-Depends: stage
+
+Package: app
+Binary: app
+Version: 1.0
+Build-Depends: tool, libsuite-dev, missing-pkg
+"""
+
+
+def test_build_order_levels():
+    lines = metadata_from_text(SOURCES).build_order().split('\n')
+    order = [line for line in lines if not line.startswith('#')]
+    assert order == [
+        "(0, 'base')", "(0, 'left')", "(0, 'right')", "(0, 'stage')", "(0, 'stage-b')",
+        "(1, 'suite')", "(1, 'tool')",
+        "(2, 'app')",
+    ]
+
+
+def test_build_order_cycles():
+    lines = metadata_from_text(SOURCES).build_order().split('\n')
+    cycles = [line for line in lines if line.startswith('#')]
+    assert cycles == [
+        "# cycle 1, level 0: left right",
+        "#   break right -> left (alternative): left | libbase-dev",
+        "# cycle 2, level 0: stage stage-b",
+        "#   no break edge found, a staged build is needed",
+        "# cycle 3, level 1: suite tool",
+        "#   break tool -> suite (nocheck): libsuite-dev <!nocheck>",
+    ]
+
+
+def test_build_order_dot(tmp_path):
+    dot = tmp_path / "order.dot"
+    metadata_from_text(SOURCES).build_order(str(dot))
+    assert '"app" -> "suite"' in dot.read_text()
+
+
+def test_build_order_requires_sources():
+    meta = metadata_from_text("Package: foo\nVersion: 1.0\nArchitecture: all\n")
+    with pytest.raises(ValueError):
+        meta.build_order()
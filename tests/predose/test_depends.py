@@ -0,0 +1,82 @@
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from conftest import metadata_from_text
+from predose.predose import PkgKey
+
+
+@pytest.fixture
+def binary_metadata():
+    return metadata_from_text("""Package: desktop
+Version: 1.0
+Depends: gui, mail-transport-agent, missing-pkg
+
+Package: gui
+Version: 1.0
+Depends: libgui1, libc6
+
+Package: libgui1
+Version: 1.0
+Depends: libc6
+
+Package: libc6
+Version: 2.36
+
+Package: postfix
+Version: 3.7
+Provides: mail-transport-agent
+Depends: libc6
+""")
+
+
+def test_depends_closure(binary_metadata):
+    result = binary_metadata.depends(PkgKey("desktop", ""), 10).split('\n')
+    assert result[0] == "desktop"
+    assert set(result) == {"desktop", "gui", "mail-transport-agent", "missing-pkg",
+                           "libgui1", "libc6", "postfix"}
+
+
+def test_depends_limited_depth(binary_metadata):
+    result = binary_metadata.depends(PkgKey("desktop", ""), 1).split('\n')
+    assert result == ["desktop", "gui", "mail-transport-agent", "missing-pkg"]
+
+
+def test_depends_with_depth(binary_metadata):
+    result = binary_metadata.depends(PkgKey("desktop", ""), 10, with_depth=True).split('\n')
+    assert "(0, 'desktop')" in result
+    assert "(1, 'gui')" in result
+    assert "(2, 'libgui1')" in result
+    assert "(2, 'postfix')" in result
+    assert "(2, 'libc6')" in result
+
+
+def test_depends_missing_root(binary_metadata):
+    assert binary_metadata.depends(PkgKey("nonexistent", ""), 5) == "nonexistent"
+
+
+class CountingDict(dict):
+    """dict that counts item lookups"""
+    lookups = 0
+
+    def __getitem__(self, key):
+        self.lookups += 1
+        return super().__getitem__(key)
+
+
+def test_depends_long_chain_expands_each_once():
+    lines = [f"Package: p{i}\nVersion: 1.0\nDepends: p{i + 1}, common\n" for i in range(3000)]
+    lines.append("Package: common\nVersion: 1.0\n")
+    meta = metadata_from_text('\n'.join(lines))
+
+    meta.packages = CountingDict(meta.packages)
+    result = meta.depends(PkgKey("p0", ""), 5000).split('\n')
+    assert len(result) == 3002
+    # Every package is expanded once, although all of them depend on common
+    assert meta.packages.lookups == 3001
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
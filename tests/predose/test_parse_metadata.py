@@ -1,9 +1,14 @@
 import pytest
 import os
 import re
+import bz2
+import gzip
+import lzma
 import logging
 from pathlib import Path
 from predose import Metadata
+from predose import predose
+from predose.predose import Relation, iter_stanzas, has_tagfile
 
 logging.basicConfig(level=logging.WARNING)
 
@@ -83,6 +88,232 @@ Version: 1.0
     assert ("test-package", "1.0") in meta.packages
     assert meta.packages[("test-package", "1.0")].version == "1.0"
 
+def test_iter_stanzas_streams_blocks():
+    """Test that stanzas are split on blank lines without reading ahead"""
+    lines = iter([
+        "Package: a\n", "Version: 1\n", "\n",
+        "Package: b\n", "\n", "\n", "Depends: c,\n", " d\n",
+    ])
+    stanzas = iter_stanzas(lines)
+
+    assert next(stanzas) == "Package: a\nVersion: 1"
+    assert next(lines) == "Package: b\n"
+    assert list(stanzas) == ["Depends: c,\n d"]
+
+def test_parse_metadata_matches_split_blocks():
+    """Test that streamed blocks equal the whole-file split"""
+    data_dir = Path(__file__).parent / "data"
+    packages_file = data_dir / "sample_Packages"
+
+    meta = Metadata.from_file(packages_file)
+    blocks = re.split(r'\n\n+', packages_file.read_text().strip())
+
+    assert [entry.block for entry in meta.packages.values()] == blocks
+
+@pytest.mark.parametrize("suffix, compress", [
+    (".gz", gzip.compress),
+    (".xz", lzma.compress),
+    (".bz2", bz2.compress),
+])
+def test_parse_metadata_compressed(tmp_path, suffix, compress):
+    """Test reading compressed Packages files directly"""
+    data_dir = Path(__file__).parent / "data"
+    packages_file = data_dir / "sample_Packages"
+    compressed_file = tmp_path / f"sample_Packages{suffix}"
+    compressed_file.write_bytes(compress(packages_file.read_bytes()))
+
+    meta = Metadata.from_file(compressed_file)
+
+    assert len(meta.packages) == 891
+
+def test_parse_metadata_several_files():
+    """Test that several files are parsed as one repository"""
+    data_dir = Path(__file__).parent / "data"
+
+    meta = Metadata.from_file([data_dir / "sample_Packages", data_dir / "new_Packages"])
+
+    assert ("vim", "2:9.2.0461-1") in meta.packages
+    assert ("0ad", "0.27.0-2+b1") in meta.packages
+    assert meta.latest_index["0ad"] == ("0ad", "0.28.0-3+b2")
+
+def test_parse_metadata_offsets():
+    """Test that offset mode references the same stanzas as text mode"""
+    data_dir = Path(__file__).parent / "data"
+    packages_file = data_dir / "sample_Packages"
+
+    meta = Metadata.from_file(packages_file)
+    mapped = Metadata.from_file(packages_file, offsets=True)
+
+    assert list(mapped.packages) == list(meta.packages)
+    for pkg_key, entry in mapped.packages.items():
+        assert entry.block is None
+        assert entry.ref is not None
+        assert entry.get_block() == meta.packages[pkg_key].block
+        assert entry.depends == meta.packages[pkg_key].depends
+
+def test_parse_metadata_interned_names():
+    """Test that names are shared objects and depends are name table ids"""
+    data_dir = Path(__file__).parent / "data"
+    meta = Metadata.from_file(data_dir / "sample_Sources")
+    packages_meta = Metadata.from_file(data_dir / "sample_Packages")
+
+    entry = packages_meta.packages[packages_meta.latest_index["0ad"]]
+    assert entry.package is packages_meta.latest_index["0ad"].package
+    assert entry.source is meta.latest_src["0ad"].package
+    assert all(isinstance(i, int) for i in entry.dep_ids)
+    assert "libc6" in entry.depends
+    assert not hasattr(entry, "__dict__")
+
+def test_parse_metadata_snapshot(tmp_path, monkeypatch):
+    """Test that a snapshot is written, reused and invalidated on change"""
+    data_dir = Path(__file__).parent / "data"
+    packages_file = tmp_path / "sample_Packages"
+    packages_file.write_bytes((data_dir / "sample_Packages").read_bytes())
+
+    meta = Metadata.from_file(packages_file, snapshot=True)
+    assert (tmp_path / "sample_Packages.predose").exists()
+
+    with monkeypatch.context() as m:
+        m.setattr(Metadata, "_parse", lambda self, filepath: pytest.fail("snapshot was not used"))
+        cached = Metadata.from_file(packages_file, snapshot=True)
+    assert list(cached.packages) == list(meta.packages)
+    assert cached.latest_index == meta.latest_index
+    for pkg_key, entry in cached.packages.items():
+        assert entry.depends == meta.packages[pkg_key].depends
+        assert entry.block == meta.packages[pkg_key].block
+
+    with monkeypatch.context() as m:
+        m.setattr(Metadata, "_parse", lambda self, filepath: self.packages.clear())
+        assert not Metadata.from_file(packages_file, snapshot=True, parser="auto").packages
+
+    with packages_file.open("a") as f:
+        f.write("\nPackage: appended\nVersion: 1.0\n")
+    updated = Metadata.from_file(packages_file, snapshot=True)
+    assert ("appended", "1.0") in updated.packages
+
+def test_parse_metadata_relations():
+    """Test that relation fields are kept with alternatives, versions and profiles"""
+    data_dir = Path(__file__).parent / "data"
+    meta = Metadata.from_file(data_dir / "sample_Packages")
+
+    entry = meta.packages[meta.latest_index["389-ds-base"]]
+    pre_depends = entry.relations("Pre-Depends")
+    assert [str(r) for r in pre_depends[0]] == ["debconf (>= 0.5)", "debconf-2.0"]
+    assert entry.relations("Depends")[0][0] == Relation("389-ds-base-libs", op="=", version="3.1.2+dfsg1-1")
+    assert entry.relations("Conflicts") == []
+    breaks = meta.packages[meta.latest_index["389-ds-base-libs"]].relations("Breaks")
+    assert breaks[0][0].op == "<<" and breaks[0][0].version == "1.3.6.7-5"
+
+def test_parse_metadata_profiles():
+    """Test that build profiles select the dependencies used for depends"""
+    data_dir = Path(__file__).parent / "data"
+    meta = Metadata.from_file(data_dir / "sample_Sources")
+    key = meta.latest_src["aiomysql"]
+    entry = meta.packages[key]
+    assert "python3-pytest" not in entry.depends
+    assert any(str(r) == "python3-pytest <pkg.aiomysql.integrationtests>"
+               for g in entry.relations("Build-Depends") for r in g)
+
+    all_profiles = Metadata.from_file(data_dir / "sample_Sources", profiles=["pkg.aiomysql.integrationtests"])
+    assert "python3-pytest" in all_profiles.packages[key].depends
+
+    apt = meta.packages[meta.latest_src["apt"]]
+    assert "doxygen" not in apt.depends
+    no_profiles = Metadata.from_file(data_dir / "sample_Sources", profiles=[])
+    assert "doxygen" in no_profiles.packages[meta.latest_src["apt"]].depends
+
+def test_parse_metadata_snapshot_relations(tmp_path):
+    """Test that relation ids are remapped when a snapshot is loaded into another table"""
+    data_dir = Path(__file__).parent / "data"
+    packages_file = tmp_path / "sample_Packages"
+    packages_file.write_bytes((data_dir / "sample_Packages").read_bytes())
+    meta = Metadata.from_file(packages_file, snapshot=True)
+    expected = {k: e.relations("Depends") for k, e in meta.packages.items()}
+
+    tables = (predose.VERSIONS, predose.SHAPES)
+    saved = [(t.names, t.ids) for t in tables]
+    for t in tables:
+        t.names, t.ids = [], {}
+    try:
+        predose.VERSIONS.id("0-unrelated")
+        predose.SHAPES.id((">>", "", (), ()))
+        cached = Metadata.from_file(packages_file, snapshot=True)
+        assert {k: e.relations("Depends") for k, e in cached.packages.items()} == expected
+    finally:
+        for t, (names, ids) in zip(tables, saved):
+            t.names, t.ids = names, ids
+
+def test_source_graph_snapshot(tmp_path, monkeypatch):
+    """Test that the source graph of Sources is stored in the snapshot"""
+    data_dir = Path(__file__).parent / "data"
+    sources_file = tmp_path / "sample_Sources"
+    sources_file.write_bytes((data_dir / "sample_Sources").read_bytes())
+    expected = Metadata.from_file(sources_file, snapshot=True).source_graph()
+    assert expected["ant"] == {"antlr", "apache-log4j1.2"}
+
+    with monkeypatch.context() as m:
+        m.setattr(Metadata, "_source_graph_row", lambda self, name: pytest.fail("graph was rebuilt"))
+        cached = Metadata.from_file(sources_file, snapshot=True)
+        assert cached.source_graph() == expected
+
+
+def test_source_graph_incremental():
+    """Test that backport, remove and keep_latest update the source graph in place"""
+    data_dir = Path(__file__).parent / "data"
+    origin = Metadata.from_file(data_dir / "new_Sources")
+    target = Metadata.from_file(data_dir / "sample_Sources")
+    graph = target.source_graph()
+    for key in list(origin.latest_index.values())[::3]:
+        origin.backport(key, target)
+    for name in list(target.latest_index)[::7]:
+        target.remove(predose.PkgKey(name, ''))
+    target.keep_latest()
+    assert target.source_graph() is graph
+
+    target._source_graph = None
+    assert graph == target.source_graph()
+
+
+@pytest.mark.skipif(not has_tagfile(), reason="apt_pkg.TagFile is not available")
+@pytest.mark.parametrize("name", ["sample_Packages", "sample_Sources"])
+def test_parse_metadata_tagfile_matches_python(name):
+    """Test that the apt_pkg.TagFile parser gives the same result"""
+    data_dir = Path(__file__).parent / "data"
+
+    meta = Metadata.from_file(data_dir / name, parser="python")
+    tagfile_meta = Metadata.from_file(data_dir / name, parser="apt")
+
+    assert tagfile_meta.packages == meta.packages
+    assert tagfile_meta.src_dict == meta.src_dict
+    assert tagfile_meta.bin_dict == meta.bin_dict
+    assert tagfile_meta.prov_dict == meta.prov_dict
+    assert tagfile_meta.latest_index == meta.latest_index
+
+MALFORMED = """Package: test-package
+Malformed line without colon
+Version: 1.0
+
+Package: other
+Version: 2.0
+"""
+
+@pytest.mark.skipif(not has_tagfile(), reason="apt_pkg.TagFile is not available")
+def test_parse_metadata_tagfile_matches_python_malformed(tmp_path):
+    """Test that apt_pkg.TagFile falls back to Python on a line without a colon"""
+    malformed_file = tmp_path / "malformed_file"
+    malformed_file.write_text(MALFORMED)
+
+    meta = Metadata.from_file(malformed_file, parser="python")
+    tagfile_meta = Metadata.from_file(malformed_file, parser="apt")
+
+    assert ("test-package", "1.0") in tagfile_meta.packages
+    assert tagfile_meta.packages == meta.packages
+    assert tagfile_meta.latest_index == meta.latest_index
+
+def test_parse_metadata_default_parser():
+    """Test that the Python parser is the default"""
+    assert Metadata().parser == "python"
+
 def test_package_specific_fields():
     """Test specific fields in parsed package data"""
     data_dir = Path(__file__).parent / "data"
@@ -0,0 +1,77 @@
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from conftest import metadata_from_text
+from predose.predose import PkgKey
+
+
+@pytest.fixture
+def binary_metadata():
+    return metadata_from_text("""Package: libfoo1
+Version: 1.0
+
+Package: foo-utils
+Version: 1.0
+Depends: libfoo1 (>= 1.0), libc6
+
+Package: foo-gui
+Version: 1.0
+Depends: foo-utils, libfoo1
+
+Package: foo-meta
+Version: 1.0
+Depends: foo-gui
+
+Package: unrelated
+Version: 1.0
+Depends: libc6
+""")
+
+
+def test_rdepends_direct(binary_metadata):
+    assert binary_metadata.rdepends("libfoo1").split('\n') == ["foo-utils", "foo-gui"]
+    assert binary_metadata.rdepends("missing") == ""
+
+
+def test_rdepends_transitive(binary_metadata):
+    assert binary_metadata.rdepends("foo-utils", 1).split('\n') == ["foo-gui"]
+    assert binary_metadata.rdepends("foo-utils", 2).split('\n') == ["foo-gui", "foo-meta"]
+    assert binary_metadata.rdepends("libfoo1", 2).split('\n') == ["foo-utils", "foo-gui", "foo-meta"]
+    assert binary_metadata.rdepends("libfoo1", 10).split('\n') == ["foo-utils", "foo-gui", "foo-meta"]
+
+
+def test_rdepends_follows_remove_and_backport(binary_metadata):
+    meta = binary_metadata
+    meta.rdepends("libfoo1")
+    assert meta.remove(PkgKey("foo-utils", ""))
+    assert meta.rdepends("libfoo1").split('\n') == ["foo-gui"]
+
+    origin = metadata_from_text("Package: foo-extra\nVersion: 2.0\nDepends: libfoo1\n")
+    assert origin.backport(PkgKey("foo-extra", ""), meta)
+    assert meta.rdepends("libfoo1").split('\n') == ["foo-gui", "foo-extra"]
+
+
+def test_rdepends_transitive_sources():
+    meta = metadata_from_text("""Package: foo
+Version: 1.0
+Binary: libfoo1, libfoo-dev
+Build-Depends: libbar-dev
+
+Package: baz
+Version: 1.0
+Binary: baz
+Build-Depends: libfoo-dev
+
+Package: bar
+Version: 1.0
+Binary: libbar-dev
+""")
+    assert meta.rdepends("libbar-dev") == "foo"
+    assert meta.rdepends("libbar-dev", 2).split('\n') == ["foo", "baz"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
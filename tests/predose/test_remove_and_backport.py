@@ -388,6 +388,14 @@ def test_backport_sources_without_version_resolves(temp_new_sources, temp_sample
     assert remaining_count == original_count + 3
 
 
+def test_backport_mmap_output_matches_text(temp_new_packages, temp_sample_packages):
+    """Offsets mode (-m) must emit byte-identical stanzas, implanted ones included."""
+    expected = _get_backport_output(temp_new_packages, temp_sample_packages, ALL_NEW_PACKAGES)
+    result = run_predose([temp_new_packages, temp_sample_packages], ["--mmap"], input_data=ALL_NEW_PACKAGES)
+    assert result.returncode == 0, f"Error: {result.stderr}"
+    assert result.stdout == expected
+
+
 def test_backport_sources_duplicate_version_no_growth(temp_new_sources, temp_sample_sources):
     """Re-implanting same package should not increase count."""
     output1 = _get_backport_output(temp_new_sources, temp_sample_sources,
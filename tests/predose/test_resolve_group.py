@@ -155,5 +155,82 @@ Source: linux
     assert 'linux-firmware' in names
 
 
+def test_resolve_group_follows_remove_and_backport(setup_target_metadata):
+    meta = setup_target_metadata
+    assert 'linux-headers' in meta.resolve_group(make_pkg_key("linux-image")).split('\n')
+
+    assert meta.remove(make_pkg_key("linux-headers"))
+    names = meta.resolve_group(make_pkg_key("linux-image")).split('\n')
+    assert names == ['linux-image', 'linux-libc-dev']
+    assert meta.resolve_group(make_pkg_key("linux-headers", "5.10.0-1")) == ""
+
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
+        f.write("""Package: linux-headers
+Version: 5.10.0-2
+Source: linux (5.10.0-2)
+
+Package: linux-image
+Version: 5.10.0-2
+Source: linux (5.10.0-2)
+""")
+        temp_file = f.name
+    origin = Metadata.from_file(temp_file)
+    os.unlink(temp_file)
+
+    assert origin.backport(make_pkg_key("linux-headers"), meta)
+    assert meta.resolve_group(make_pkg_key("linux-headers")) == 'linux-headers'
+    assert origin.backport(make_pkg_key("linux-image", "5.10.0-2"), meta)
+    names = meta.resolve_group(make_pkg_key("linux-image")).split('\n')
+    assert names == ['linux-headers', 'linux-image']
+    assert meta.resolve_src(make_pkg_key("linux-image")) == 'linux'
+
+
+def test_resolve_group_sources_remove_restores_older_source():
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
+        f.write("""Package: foo
+Version: 1.0-1
+Binary: libfoo1, foo-tools
+
+Package: foo
+Version: 2.0-1
+Binary: libfoo2, foo-tools
+""")
+        temp_file = f.name
+    meta = Metadata.from_file(temp_file)
+    os.unlink(temp_file)
+
+    assert meta.resolve_group(make_pkg_key("foo-tools")) == 'libfoo1\nfoo-tools'
+    assert meta.remove(make_pkg_key("foo", "1.0-1"))
+    assert meta.resolve_group(make_pkg_key("foo-tools")) == 'libfoo2\nfoo-tools'
+    assert meta.resolve_group(make_pkg_key("libfoo1")) == ""
+    assert meta.resolve_src(make_pkg_key("foo-tools")) == 'foo'
+
+
+class CountingDict(dict):
+    """dict that counts full scans through items()"""
+    scans = 0
+
+    def items(self):
+        self.scans += 1
+        return super().items()
+
+
+def test_resolve_group_large_input_scans_once():
+    lines = []
+    for i in range(5000):
+        lines.append(f"Package: bin{i}\nVersion: 1.0\nSource: src{i // 5} (1.0)\n")
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
+        f.write('\n'.join(lines))
+        temp_file = f.name
+    meta = Metadata.from_file(temp_file)
+    os.unlink(temp_file)
+
+    meta.bin_dict = CountingDict(meta.bin_dict)
+    for i in range(5000):
+        assert f'bin{i}' in meta.resolve_group(make_pkg_key(f'bin{i}')).split('\n')
+    # The group index is built once, not a bin_dict scan per lookup
+    assert meta.bin_dict.scans == 1
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,82 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from predose.predose import PreDoseServer
+from predose.client import request
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+PREDOSE_SCRIPT = PROJECT_ROOT / "predose" / "predose.py"
+DATA_DIR = Path(__file__).parent / "data"
+
+
+def run_predose(args, input_data=""):
+    env = os.environ.copy()
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (str(PROJECT_ROOT), env.get("PYTHONPATH")) if p)
+    result = subprocess.run([sys.executable, str(PREDOSE_SCRIPT)] + [str(a) for a in args],
+                            input=input_data, capture_output=True, text=True, env=env, timeout=30)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+@pytest.fixture
+def server():
+    with tempfile.TemporaryDirectory() as tmp:
+        socket_path = os.path.join(tmp, "pre-dose.sock")
+        srv = PreDoseServer(socket_path)
+        thread = threading.Thread(target=srv.serve)
+        thread.start()
+        yield socket_path, tmp
+        request(socket_path, {"op": "shutdown"})
+        thread.join(timeout=10)
+        assert not os.path.exists(socket_path)
+
+
+def test_server_resolve(server):
+    socket_path, _ = server
+    assert request(socket_path, {"op": "load", "set": "pkgs", "files": str(DATA_DIR / "new_Packages")}) > 0
+    result = request(socket_path, {"op": "resolve-src", "set": "pkgs", "packages": ["vim-common", "# comment"]})
+    assert result == run_predose(["--resolve-src", DATA_DIR / "new_Packages"], "vim-common\n").split()
+
+
+def test_server_backport_and_remove_match_cli(server):
+    socket_path, tmp = server
+    new, sample = DATA_DIR / "new_Packages", DATA_DIR / "sample_Packages"
+    request(socket_path, {"op": "load", "set": "origin", "files": str(new), "latest": True})
+    request(socket_path, {"op": "load", "set": "target", "files": str(sample), "mmap": True, "latest": True})
+
+    assert request(socket_path, {"op": "backport", "set": "target", "origin": "origin",
+                                 "packages": ["vim", "vim-common"], "latest": True}) == 2
+    out = os.path.join(tmp, "Packages")
+    request(socket_path, {"op": "output", "set": "target", "path": out})
+    expected = run_predose(["-c", new, sample], "vim\nvim-common\n")
+    assert Path(out).read_text() == expected
+
+    backported = os.path.join(tmp, "backported_Packages")
+    Path(backported).write_text(expected)
+    assert request(socket_path, {"op": "remove", "set": "target", "packages": ["vim"], "latest": True}) == 1
+    request(socket_path, {"op": "output", "set": "target", "path": out})
+    assert Path(out).read_text() == run_predose(["--remove", "-c", backported], "vim\n")
+
+
+def test_server_errors(server):
+    socket_path, _ = server
+    with pytest.raises(RuntimeError, match="Unknown metadata set"):
+        request(socket_path, {"op": "resolve-src", "set": "missing", "packages": ["vim"]})
+    request(socket_path, {"op": "load", "set": "pkgs", "files": str(DATA_DIR / "new_Packages")})
+    with pytest.raises(RuntimeError, match="Unknown operation"):
+        request(socket_path, {"op": "frobnicate", "set": "pkgs"})
+    request(socket_path, {"op": "load", "set": "mapped", "files": str(DATA_DIR / "new_Packages"), "mmap": True})
+    with pytest.raises(RuntimeError, match="memory-mapped"):
+        request(socket_path, {"op": "output", "set": "mapped", "path": str(DATA_DIR / "new_Packages")})
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,179 @@
+import pytest
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from conftest import metadata_from_text
+from predose import Metadata
+from predose.backport import unsat_pairs, unsat_names
+from predose.predose import PkgKey, Relation, parse_relations, relation_applies
+from predose import solver
+from predose.solver import Checker, report_lines
+
+DATA_DIR = Path(__file__).parent / "data"
+
+
+@pytest.fixture
+def checker():
+    return Checker(metadata_from_text("""Package: app
+Version: 1.0
+Depends: libfoo (>= 2), mta
+
+Package: libfoo
+Version: 1.5
+
+Package: libfoo
+Version: 2.1
+Depends: libc6
+
+Package: libc6
+Version: 2.36
+
+Package: postfix
+Version: 3.7
+Provides: mail-transport-agent, mta (= 1)
+Conflicts: exim4
+
+Package: exim4
+Version: 4.96
+Provides: mta
+
+Package: broken
+Version: 1.0
+Depends: libfoo (>= 3) | missing-pkg
+
+Package: versioned-provides
+Version: 1.0
+Depends: mta (>= 1)
+
+Package: both-mtas
+Version: 1.0
+Depends: postfix, exim4
+
+Package: needs-old-foo
+Version: 1.0
+Depends: libfoo (<< 2)
+
+Package: backtrack
+Version: 1.0
+Depends: mail-transport-agent | exim4, lib-breaks-postfix
+
+Package: lib-breaks-postfix
+Version: 1.0
+Breaks: postfix
+"""), latest=False)
+
+
+def test_parse_relations():
+    groups = parse_relations("libc6 (>= 2.34), python3:any, foo (> 1) | bar [!i386] <!nocheck> <cross>")
+    assert groups[0] == (Relation("libc6", op=">=", version="2.34"),)
+    assert groups[1] == (Relation("python3", arch_qualifier="any"),)
+    assert groups[2][0] == Relation("foo", op=">=", version="1")
+    assert groups[2][1].archs == ("!i386",) and groups[2][1].profiles == (("!nocheck",), ("cross",))
+    assert str(groups[2][1]) == "bar [!i386] <!nocheck> <cross>"
+
+
+def test_relation_applies():
+    rel = parse_relations("foo [amd64 arm64] <!nocheck>")[0][0]
+    assert relation_applies(rel, "amd64")
+    assert not relation_applies(rel, "i386")
+    assert not relation_applies(rel, "amd64", ["nocheck"])
+    assert relation_applies(parse_relations("foo [linux-any]")[0][0], "amd64")
+    assert not relation_applies(parse_relations("foo [!amd64]")[0][0], "amd64")
+
+
+def test_installable(checker):
+    assert checker.check(PkgKey("app", "1.0")).installable
+    assert checker.check(PkgKey("versioned-provides", "1.0")).installable
+
+
+def test_missing_dependency(checker):
+    result = checker.check(PkgKey("broken", "1.0"))
+    assert result.status == "broken"
+    assert result.reasons[0].kind == "missing"
+    assert result.reasons[0].relation == "libfoo:amd64 (>= 3) | missing-pkg:amd64"
+
+
+def test_conflict(checker):
+    result = checker.check(PkgKey("both-mtas", "1.0"))
+    assert not result.installable
+    conflict = [r for r in result.reasons if r.kind == "conflict"][0]
+    assert conflict.package == PkgKey("postfix", "3.7") and conflict.other == PkgKey("exim4", "4.96")
+
+
+def test_two_versions_of_one_package(checker):
+    checker_latest = Checker(checker.meta)
+    assert not checker_latest.check(PkgKey("needs-old-foo", "1.0")).installable
+    # The newest libfoo is preferred, the old one is picked when required
+    assert checker.check(PkgKey("needs-old-foo", "1.0")).installable
+
+
+def test_backtracks_over_alternatives(checker):
+    # postfix provides mail-transport-agent but is broken by lib-breaks-postfix
+    assert checker.check(PkgKey("backtrack", "1.0")).installable
+
+
+def test_build_dependencies():
+    packages = metadata_from_text("""Package: gcc
+Version: 14
+
+Package: debhelper
+Version: 13
+
+Package: check-tool
+Version: 1.0
+Depends: missing-pkg
+""")
+    sources = metadata_from_text("""Package: hello
+Version: 2.10
+Build-Depends: debhelper (>= 13), check-tool <!nocheck>
+Build-Depends-Arch: gcc
+
+Package: world
+Version: 1.0
+Build-Depends: debhelper
+Build-Conflicts: gcc
+""")
+    checker = Checker(packages)
+    assert not checker.check_source(sources, PkgKey("hello", "2.10")).installable
+    assert Checker(packages, profiles=["nocheck"]).check_source(sources, PkgKey("hello", "2.10")).installable
+    # A build conflict with a package that is not needed is not an error
+    assert checker.check_source(sources, PkgKey("world", "1.0")).installable
+
+
+def test_report_lines_parse_like_dose(checker):
+    results = checker.check_all()
+    report = report_lines(results, len(results))
+    assert report[-2:] == ["broken-packages: 2\n", f"total-packages: {len(results)}\n"]
+    pairs = unsat_pairs(report)
+    assert "      package: broken\t      unsat-dependency: libfoo:amd64 (>= 3) | missing-pkg:amd64" in pairs
+    assert unsat_names(pairs) >= {"libfoo", "missing-pkg"}
+
+
+
+def test_search_limit_is_reported_broken(checker, monkeypatch):
+    monkeypatch.setattr(solver, "MAX_STEPS", 0)
+    result = checker.check(PkgKey("app", "1.0"))
+    assert result.status == "unknown"
+    assert not result.installable
+
+    report = report_lines([result], 1)
+    assert report[-2:] == ["broken-packages: 1\n", "total-packages: 1\n"]
+    assert "      unsat-limit: search limit reached after 0 steps\n" in report
+    assert unsat_pairs(report) == ["      package: app\t      unsat-limit: search limit reached after 0 steps"]
+
+
+@pytest.mark.skipif(shutil.which("dose-debcheck") is None, reason="dose-debcheck is not installed")
+def test_same_broken_packages_as_dose_debcheck():
+    meta = Metadata.from_file(str(DATA_DIR / "sample_Packages"))
+    meta.keep_latest()
+    checker = Checker(meta)
+    ours = {r.package.package for r in checker.check_all() if not r.installable}
+    report = subprocess.run(["dose-debcheck", "--latest", "1", "--deb-native-arch=amd64", "-f",
+                             str(DATA_DIR / "sample_Packages")], stdout=subprocess.PIPE, text=True).stdout
+    theirs = {line.split(":", 1)[1].strip() for line in report.splitlines() if line.startswith("  package:")}
+    assert ours == theirs
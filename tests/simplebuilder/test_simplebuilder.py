@@ -0,0 +1,90 @@
+import lzma
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from simplebuilder.simplebuilder import (configure_chroot_snapshots, has_chroot_snapshots, job_name, publish_index,
+                                         schedule_lines, superseded_packages)
+
+SOURCES = Path(__file__).parent.parent / "predose" / "data" / "sample_Sources"
+
+
+def test_job_name():
+    assert job_name("vim") == "vim"
+    assert job_name("http://deb.debian.org/debian/pool/main/h/hello/hello_2.10-3.dsc") == "hello"
+    assert job_name("https://salsa.debian.org/debian/runit.git") == "runit"
+    assert job_name("http://ftp.debian.org/debian/pool/main/libs/libsepol/libsepol2_3.8.1-1_amd64.deb") is None
+
+
+def test_schedule_topo_sort_output():
+    lines = ["(0, 'antlr')", "(1, 'ant')", "(0, 'base-files')", "(2, 'apache-log4j1.2')"]
+    assert schedule_lines(lines) == [(0, ["antlr", "base-files"]), (1, ["ant"]), (2, ["apache-log4j1.2"])]
+
+
+def test_schedule_plain_lines_keep_order():
+    lines = ["(0, 'antlr')", "hello", "http://example.com/vim_9.1-1.dsc"]
+    assert schedule_lines(lines) == [(0, ["antlr"]), (1, ["hello"]), (2, ["http://example.com/vim_9.1-1.dsc"])]
+
+
+def test_schedule_computes_levels_from_sources():
+    levels = dict(schedule_lines(["ant", "http://example.com/pool/a/antlr/antlr_2.7.7+dfsg-13.dsc"], str(SOURCES)))
+    assert levels == {0: ["http://example.com/pool/a/antlr/antlr_2.7.7+dfsg-13.dsc"], 1: ["ant"]}
+
+
+def test_schedule_unknown_names_follow_known_levels():
+    lines = ["not-in-sources", "ant", "http://example.com/pool/h/hello/hello_2.10-3.dsc", "antlr"]
+    assert schedule_lines(lines, str(SOURCES)) == [
+        (0, ["antlr"]), (1, ["ant"]), (2, ["not-in-sources"]), (3, ["http://example.com/pool/h/hello/hello_2.10-3.dsc"])]
+
+
+def test_configure_chroot_snapshots(tmp_path):
+    config = tmp_path / "trixie-amd64-sbuild-Xyz1"
+    config.write_text("[trixie-amd64-sbuild]\nprofile=sbuild\ntype=directory\n"
+                      "directory=/srv/chroot/trixie-amd64-sbuild\nunion-type=none\n")
+    assert configure_chroot_snapshots("trixie-amd64-sbuild", "/srv/chroot/trixie-amd64-sbuild", "overlay", str(tmp_path))
+    assert config.read_text() == ("[trixie-amd64-sbuild]\nprofile=sbuild\ntype=directory\n"
+                                  "directory=/srv/chroot/trixie-amd64-sbuild\nunion-type=overlay\n")
+    assert not configure_chroot_snapshots("sid-amd64-sbuild", "/srv/chroot/sid-amd64-sbuild", "overlay", str(tmp_path))
+
+
+def test_configure_chroot_snapshots_none_restores_directory(tmp_path):
+    config = tmp_path / "trixie-amd64-sbuild-Xyz1"
+    config.write_text("[trixie-amd64-sbuild]\nprofile=sbuild\ntype=file\n"
+                      "file=/srv/chroot/trixie-amd64-sbuild.tar.gz\n")
+    assert configure_chroot_snapshots("trixie-amd64-sbuild", "/srv/chroot/trixie-amd64-sbuild", "none", str(tmp_path))
+    assert config.read_text() == ("[trixie-amd64-sbuild]\nprofile=sbuild\ntype=directory\n"
+                                  "directory=/srv/chroot/trixie-amd64-sbuild\n")
+    assert configure_chroot_snapshots("trixie-amd64-sbuild", "/srv/chroot/trixie-amd64-sbuild", "overlay", str(tmp_path))
+    assert configure_chroot_snapshots("trixie-amd64-sbuild", "/srv/chroot/trixie-amd64-sbuild", "none", str(tmp_path))
+    assert not has_chroot_snapshots("trixie-amd64-sbuild", str(tmp_path))
+    assert configure_chroot_snapshots("sid-amd64-sbuild", "/srv/chroot/sid-amd64-sbuild", "none", str(tmp_path))
+
+
+def test_has_chroot_snapshots(tmp_path):
+    config = tmp_path / "trixie-amd64-sbuild-Xyz1"
+    config.write_text("[trixie-amd64-sbuild]\ntype=directory\ndirectory=/srv/chroot/trixie-amd64-sbuild\n")
+    assert not has_chroot_snapshots("trixie-amd64-sbuild", str(tmp_path))
+    assert configure_chroot_snapshots("trixie-amd64-sbuild", "/srv/chroot/trixie-amd64-sbuild", "overlay", str(tmp_path))
+    assert has_chroot_snapshots("trixie-amd64-sbuild", str(tmp_path))
+    assert not has_chroot_snapshots("sid-amd64-sbuild", str(tmp_path))
+
+
+def test_publish_index(tmp_path):
+    (tmp_path / "Packages").write_text("Package: old\n")
+    (tmp_path / "Packages.tmp").write_text("Package: hello\nVersion: 2.10-3\n")
+    publish_index(str(tmp_path), "Packages")
+    assert (tmp_path / "Packages").read_text() == "Package: hello\nVersion: 2.10-3\n"
+    assert lzma.decompress((tmp_path / "Packages.xz").read_bytes()) == b"Package: hello\nVersion: 2.10-3\n"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["Packages", "Packages.xz"]
+
+
+def test_superseded_packages(tmp_path):
+    packages = tmp_path / "Packages"
+    packages.write_text("Package: hello\nVersion: 2.10-3+local1\n\n"
+                        "Package: vim\nVersion: 2:9.1.0-1\n\n"
+                        "Package: not-installed\nVersion: 1.0\n")
+    installed = {"hello": "2.10-3", "vim": "2:9.1.1-1"}
+    assert superseded_packages(str(packages), installed) == ["hello"]
+    assert superseded_packages(str(tmp_path / "missing"), installed) == []
@@ -131,3 +131,30 @@ def test_toposort():
     for s, e in zip(sorted(tl), expected):
         assert s == e
         # print(f"Level {level}: Node {node.name}")
+
+def node_sort(graph):
+    return [(level, node.name) for level, node in StableTopoSort.stable_topo_sort(create_node_list(graph))]
+
+def csr_sort(graph):
+    names, offsets, targets = StableTopoSort.csr_from_graph(graph)
+    return [(level, names[i]) for level, i in StableTopoSort.stable_topo_sort_csr(offsets, targets)]
+
+def test_toposort_csr_matches_nodes():
+    r_graph = reverse_graph(graph_dict)
+    assert csr_sort(r_graph) == node_sort(r_graph)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_toposort_csr_matches_nodes_with_cycles(seed):
+    random.seed(seed)
+    graph = generate_random_graph(300, 4)
+    # Self-loops and duplicate edges are kept by both implementations
+    graph = {name: list(edges) + ([name] if i % 7 == 0 else []) + list(edges)[:1]
+             for i, (name, edges) in enumerate(graph.items())}
+    assert csr_sort(graph) == node_sort(graph)
+
+def test_toposort_csr_numpy():
+    np = pytest.importorskip("numpy")
+    r_graph = reverse_graph(graph_dict)
+    names, offsets, targets = StableTopoSort.csr_from_graph(r_graph)
+    result = StableTopoSort.stable_topo_sort_csr(np.array(offsets), np.array(targets))
+    assert [(level, names[i]) for level, i in result] == node_sort(r_graph)
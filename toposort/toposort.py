@@ -1,3 +1,7 @@
+import logging
+from array import array
+
+
 class Node:
     def __init__(self, name):
         self.name = name
@@ -18,7 +22,6 @@ class StableTopoSort:
         # 2. Perform Tarjan SCC
         scc = StableTopoSort.PeaSCC(nodes)
         scc.visit()
-        import logging
         logging.debug(f'Tarjan SCC cycles: {StableTopoSort.extract_cycles(nodes, scc.rindex)}')
 
         # 3. Perform *reverse* counting sort
@@ -35,6 +38,146 @@ class StableTopoSort:
         # 5. Pair each node with its level and return as list of tuples
         return [(levels[node.index], node) for node in nodes]
 
+    @staticmethod
+    def stable_topo_sort_csr(offsets, targets):
+        """stable_topo_sort on a graph in compressed sparse row form.
+
+        Node i has edges to targets[offsets[i]:offsets[i + 1]], offsets has
+        one entry more than there are nodes. Lists, array('i') and NumPy
+        arrays are accepted. Returns (level, node index) pairs in the order
+        stable_topo_sort returns the corresponding nodes.
+        """
+        offsets = StableTopoSort._as_list(offsets)
+        targets = StableTopoSort._as_list(targets)
+
+        # 1. Sort edges according to node indices
+        sorted_targets = []
+        for v in range(len(offsets) - 1):
+            sorted_targets.extend(sorted(targets[offsets[v]:offsets[v + 1]]))
+        targets = sorted_targets
+
+        # 2. Perform Tarjan SCC
+        rindex = StableTopoSort.pea_scc_csr(offsets, targets)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(f'Tarjan SCC cycles: {StableTopoSort.extract_cycles(range(len(rindex)), rindex)}')
+
+        # 3. Perform *reverse* counting sort
+        order = StableTopoSort.reverse_counting_sort_csr(rindex)
+
+        # 4. Compute levels for each node
+        levels = [0] * len(order)
+        for v in order:
+            for neighbor in targets[offsets[v]:offsets[v + 1]]:
+                if levels[neighbor] < levels[v] + 1:
+                    levels[neighbor] = levels[v] + 1
+
+        # 5. Pair each node with its level
+        return [(levels[v], v) for v in order]
+
+    @staticmethod
+    def csr_from_graph(graph):
+        """names, offsets and targets of a dict of node name -> iterable of node names."""
+        names = list(graph)
+        ids = {name: i for i, name in enumerate(names)}
+        offsets = array('i', [0])
+        targets = array('i')
+        for name in names:
+            targets.extend(ids[edge] for edge in graph[name])
+            offsets.append(len(targets))
+        return names, offsets, targets
+
+    @staticmethod
+    def pea_scc_csr(offsets, targets):
+        """PeaSCC.visit with the stacks and the graph in flat lists, returns rindex."""
+        n = len(offsets) - 1
+        rindex = [0] * n
+        root = [False] * n
+        index = 1
+        c = n - 1
+        # vS as in DoubleStack: front grows up from 0, back grows down from n
+        v_items = [0] * n
+        fp = 0
+        bp = n
+        i_stack = []
+
+        # Attn! We're walking nodes in reverse
+        for s in range(n - 1, -1, -1):
+            if rindex[s] != 0:
+                continue
+            v_items[fp] = s
+            fp += 1
+            i_stack.append(0)
+            root[s] = True
+            rindex[s] = index
+            index += 1
+
+            while fp:
+                v = v_items[fp - 1]
+                i = i_stack[-1]
+                start = offsets[v]
+                num_edges = offsets[v + 1] - start
+                descended = False
+                while i <= num_edges:
+                    if i > 0:
+                        # Finish the previously traversed out-edge
+                        w = targets[start + i - 1]
+                        if rindex[w] < rindex[v]:
+                            rindex[v] = rindex[w]
+                            root[v] = False
+                    if i < num_edges:
+                        w = targets[start + i]
+                        if rindex[w] == 0:
+                            i_stack[-1] = i + 1
+                            v_items[fp] = w
+                            fp += 1
+                            i_stack.append(0)
+                            root[w] = True
+                            rindex[w] = index
+                            index += 1
+                            descended = True
+                            break
+                    i += 1
+                if descended:
+                    continue
+
+                # Finished traversing out edges, update component info
+                fp -= 1
+                i_stack.pop()
+                if root[v]:
+                    index -= 1
+                    while bp != n and rindex[v] <= rindex[v_items[bp]]:
+                        w = v_items[bp]
+                        bp += 1
+                        rindex[w] = c
+                        index -= 1
+                    rindex[v] = c
+                    c -= 1
+                else:
+                    bp -= 1
+                    v_items[bp] = v
+        return rindex
+
+    @staticmethod
+    def reverse_counting_sort_csr(rindex):
+        """reverse_counting_sort returning node indices."""
+        n = len(rindex)
+        count = [0] * n
+        for r in rindex:
+            count[n - 1 - r] += 1
+        for i in range(1, n):
+            count[i] += count[i - 1]
+        output = [0] * n
+        for i in range(n):
+            cindex = n - 1 - rindex[i]
+            # Attn! We're sorting in reverse
+            output[n - count[cindex]] = i
+            count[cindex] -= 1
+        return output
+
+    @staticmethod
+    def _as_list(values):
+        return values.tolist() if hasattr(values, 'tolist') else list(values)
+
     class PeaSCC:
         def __init__(self, g):
             self.graph = g
@@ -150,7 +293,7 @@ class StableTopoSort:
             comp = rindex[i]
             if comp not in components:
                 components[comp] = []
-            components[comp].append(node.name)
+            components[comp].append(getattr(node, 'name', node))
 
         # Filter components with more than one node (these contain cycles)
         cycles = [comp for comp in components.values() if len(comp) > 1]